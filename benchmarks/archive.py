@@ -0,0 +1,116 @@
+''' Speed of archiving pages with utils.archive, reading them back by url
+and replaying the archive through the scraper with replay.py, against
+fetching them again at the politeness delay.
+
+    python -m benchmarks.archive --pages 5000 --hosts 32 --processes 1,4
+
+Pages of a SyntheticWeb are archived as Responses decoded from the same
+CBOR and pickle payloads the cache server sends, with gzip and, if the
+zstandard package is installed, zstd.
+'''
+import os
+import time
+import random
+import shutil
+import logging
+import tempfile
+import argparse
+
+import cbor
+
+from utils.response import Response
+from utils.archive import (
+    ResponseArchive, ArchiveReader, records, list_segments, zstandard)
+from benchmarks.cache_server import SyntheticWeb, make_response, subdomains
+from benchmarks.crawl import make_config
+
+
+def responses(web, rng):
+    ''' (url, Response) of every page of web, in a random order. '''
+    urls = [
+        web.url(host, number) for host in web.hosts
+        for number in range(web.pages_per_host)]
+    rng.shuffle(urls)
+    for url in urls:
+        yield url, Response(cbor.loads(make_response(url, *web.page(url))))
+
+
+def archive_size(directory):
+    return sum(
+        os.path.getsize(path)
+        for segment in list_segments(directory) for path in segment)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the response archive and replay.")
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--hosts", type=int, default=32)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--processes", default="1,4")
+    parser.add_argument("--politeness", type=float, default=0.5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    from replay import replay
+    rng = random.Random(221)
+    web = SyntheticWeb(args.pages, trap_rate=0.0, hosts=subdomains(args.hosts))
+    pages = list(responses(web, rng))
+    body_bytes = sum(len(resp.body) for _, resp in pages)
+    print(f"{len(pages)} pages, {body_bytes / 2**20:.1f} MiB of bodies; "
+          f"fetching them again at {args.politeness}s per host takes "
+          f"{len(pages) * args.politeness / args.hosts:.0f}s")
+
+    workdir = tempfile.mkdtemp(prefix="archive-bench-")
+    try:
+        compressions = ["gzip"] + (["zstd"] if zstandard is not None else [])
+        for compression in compressions:
+            directory = os.path.join(workdir, compression)
+            archive = ResponseArchive(
+                directory, compression=compression, segment_bytes=8 * 2**20)
+            start = time.perf_counter()
+            for url, resp in pages:
+                archive.append(url, resp)
+            archive.close()
+            written = time.perf_counter() - start
+            size = archive_size(directory)
+
+            start = time.perf_counter()
+            reader = ArchiveReader(directory)
+            loaded = time.perf_counter() - start
+            sample = rng.sample(pages, min(args.lookups, len(pages)))
+            start = time.perf_counter()
+            for url, resp in sample:
+                _, archived = reader.get(url)
+                assert bytes(archived.body) == bytes(resp.body)
+                assert archived.headers["Content-Type"] == \
+                    resp.headers["Content-Type"]
+            looked_up = time.perf_counter() - start
+            start = time.perf_counter()
+            count = sum(1 for _ in records(directory))
+            scanned = time.perf_counter() - start
+            assert count == len(pages)
+            print(f"{compression}: write {body_bytes / 2**20 / written:6.1f} "
+                  f"MiB/s, {size / body_bytes:5.1%} of the bodies, index "
+                  f"loaded in {loaded * 1000:.0f}ms, get "
+                  f"{looked_up / len(sample) * 1e6:.0f}us, read all "
+                  f"{count / scanned:.0f} pages/s")
+
+        config = make_config(
+            argparse.Namespace(politeness=args.politeness, threads=1,
+                               in_flight=1),
+            0, os.path.join(workdir, "frontier.shelve"))
+        out = os.path.join(workdir, "replay")
+        for processes in map(int, args.processes.split(",")):
+            start = time.perf_counter()
+            replayed = replay(config, os.path.join(workdir, "gzip"), out,
+                              processes)
+            elapsed = time.perf_counter() - start
+            assert replayed == len(pages)
+            print(f"replay with {processes} processes: {elapsed:.1f}s, "
+                  f"{replayed / elapsed:.0f} pages/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
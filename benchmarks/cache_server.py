@@ -0,0 +1,280 @@
+''' Local stand-in for the spacetime cache server.
+
+Answers GET /?q=<url>&u=<useragent> like utils.download expects: a CBOR dict
+with the url, the status and a pickled requests.Response as "response". The
+pages come from a deterministic synthetic web over the four seed domains.
+
+    python -m benchmarks.cache_server --port 9000 --pages 10000
+
+then point a crawler at it with benchmarks.crawl, or set HOST/PORT in a
+config and skip the registration step.
+'''
+import time
+import pickle
+import random
+import argparse
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cbor
+import requests
+from requests.structures import CaseInsensitiveDict
+
+HOSTS = [
+    "www.ics.uci.edu", "www.cs.uci.edu",
+    "www.informatics.uci.edu", "www.stat.uci.edu"]
+WORDS = [
+    "crawler", "frontier", "politeness", "research", "faculty", "students",
+    "graduate", "seminar", "informatics", "statistics", "computing",
+    "software", "systems", "machine", "learning", "theory", "algorithms",
+    "networks", "security", "databases", "vision", "language", "robotics",
+    "undergraduate", "courses", "lecture", "project", "department", "irvine",
+    "california", "publications", "awards", "news", "events", "alumni"]
+
+
+TRAPS = ("calendar", "repeat")
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+SITEMAP_SIZE = 1000
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def subdomains(count):
+    ''' count hosts under ics.uci.edu, for a web with more hosts. '''
+    return [f"site{n}.ics.uci.edu" for n in range(count)]
+
+
+def slug(number):
+    # Page numbers spelled in letters, so pages do not share a url pattern.
+    letters = ""
+    while True:
+        number, digit = divmod(number, len(LETTERS))
+        letters = LETTERS[digit] + letters
+        if not number:
+            return letters
+
+
+def unslug(letters):
+    number = 0
+    for letter in letters:
+        number = number * len(LETTERS) + LETTERS.index(letter)
+    return number
+
+
+class SyntheticWeb(object):
+    ''' pages pages spread over HOSTS, each linking to fanout random pages.
+
+    Page n of a host lives at https://<host>/p/<slug(n)>; the host root is
+    page 0. hosts replaces HOSTS, see subdomains().
+    A dup_rate share of the pages carry the text of an earlier page with a
+    few words changed. A trap_rate share of the pages also link into one of
+    the traps, endless url spaces of low value pages:
+        calendar: /events/<date>, each day linking to the next one.
+        repeat:   /p/<n>/more/more/..., one relative link deeper each time.
+    With robots, each host serves a robots.txt disallowing both traps and
+    naming a sitemap index at /sitemap.xml, whose sitemaps list every page
+    of the host, SITEMAP_SIZE per sitemap. Without it robots.txt is a 404.
+    Every page and its links are derived from seed and the url alone, so
+    the graph is the same on every run and in every process. '''
+    def __init__(self, pages=10000, fanout=10, seed=221, dup_rate=0.0,
+                 trap_rate=0.0, traps=TRAPS, robots=False, hosts=HOSTS):
+        self.hosts = tuple(hosts)
+        self.pages_per_host = max(1, pages // len(self.hosts))
+        self.fanout = fanout
+        self.seed = seed
+        self.dup_rate = dup_rate
+        self.trap_rate = trap_rate
+        self.traps = tuple(traps)
+        self.robots = robots
+
+    def url(self, host, number):
+        if number == 0:
+            return f"https://{host}"
+        return f"https://{host}/p/{slug(number)}"
+
+    def locate(self, url):
+        ''' (host, page number, trap path or None) for a url of the graph,
+        or None for a url outside it. '''
+        parsed = urlparse(url)
+        if parsed.hostname not in self.hosts:
+            return None
+        path = parsed.path.rstrip("/")
+        if not path:
+            return parsed.hostname, 0, None
+        if path.startswith("/events/"):
+            return parsed.hostname, 0, path
+        segments = path.split("/")
+        if (len(segments) >= 3 and segments[1] == "p"
+                and segments[2] and set(segments[2]) <= set(LETTERS)):
+            number = unslug(segments[2])
+            if number >= self.pages_per_host:
+                return None
+            if len(segments) == 3:
+                return parsed.hostname, number, None
+            if all(segment == "more" for segment in segments[3:]):
+                return parsed.hostname, number, path
+        return None
+
+    def links(self, host, number, rng):
+        return [
+            self.url(rng.choice(self.hosts), rng.randrange(self.pages_per_host))
+            for _ in range(self.fanout)]
+
+    def words(self, host, number, rng):
+        return [rng.choice(WORDS) for _ in range(rng.randint(80, 400))]
+
+    def trap_page(self, host, number, path):
+        # Unique text, so only the url pattern gives the trap away.
+        rng = random.Random(f"{self.seed}/{host}{path}")
+        if path.startswith("/events/"):
+            day = int(path.rsplit("/", 1)[1].replace("-", "") or 0)
+            links = [f"https://{host}/events/{day + 1:08d}"]
+        else:
+            links = ["more/"]
+        words = self.words(host, number, rng)
+        words.extend(f"{rng.getrandbits(32):x}" for _ in range(40))
+        return links, " ".join(words)
+
+    def robots_file(self, url):
+        ''' (status, content type, body) for robots.txt and the sitemaps,
+        or None for other urls. '''
+        parsed = urlparse(url)
+        host, path = parsed.hostname, parsed.path
+        if not self.robots or host not in self.hosts:
+            return None
+        if path == "/robots.txt":
+            body = (
+                f"User-agent: *\nDisallow: /events/\nDisallow: /p/*/more\n"
+                f"\nSitemap: https://{host}/sitemap.xml\n")
+            return 200, "text/plain", body.encode("utf-8")
+        if path == "/sitemap.xml":
+            sitemaps = "".join(
+                f"<sitemap><loc>https://{host}/sitemap-{n}.xml</loc></sitemap>"
+                for n in range(0, self.pages_per_host, SITEMAP_SIZE))
+            body = (f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex '
+                    f'xmlns="{SITEMAP_NS}">{sitemaps}</sitemapindex>')
+            return 200, "application/xml", body.encode("utf-8")
+        if path.startswith("/sitemap-") and path.endswith(".xml"):
+            first = int(path[len("/sitemap-"):-len(".xml")])
+            urls = "".join(
+                f"<url><loc>{self.url(host, n)}</loc></url>"
+                for n in range(first, min(first + SITEMAP_SIZE,
+                                           self.pages_per_host)))
+            body = (f'<?xml version="1.0" encoding="UTF-8"?><urlset '
+                    f'xmlns="{SITEMAP_NS}">{urls}</urlset>')
+            return 200, "application/xml", body.encode("utf-8")
+        return None
+
+    def page(self, url):
+        ''' (status, content type, body bytes) served for url. '''
+        served = self.robots_file(url)
+        if served is not None:
+            return served
+        location = self.locate(url)
+        if location is None:
+            return 404, "text/html", b"<html><body>Not found</body></html>"
+        host, number, trap = location
+        if trap:
+            links, text = self.trap_page(host, number, trap)
+        else:
+            rng = random.Random(f"{self.seed}/{host}/{number}")
+            links = self.links(host, number, rng)
+            if self.traps and rng.random() < self.trap_rate:
+                kind = rng.choice(self.traps)
+                links.append(
+                    f"https://{host}/events/20240101" if kind == "calendar"
+                    else f"{self.url(host, number)}/more/")
+            if number and rng.random() < self.dup_rate:
+                # Text of an earlier page of the host, a few words changed.
+                original = rng.randrange(number)
+                words = self.words(host, original, random.Random(
+                    f"{self.seed}/{host}/{original}"))
+                for _ in range(3):
+                    words[rng.randrange(len(words))] = rng.choice(WORDS)
+            else:
+                words = self.words(host, number, rng)
+            text = " ".join(words)
+        links = "".join(
+            f'<li><a href="{link}">{link}</a></li>' for link in links)
+        body = (
+            f"<html><head><title>{host} {number}</title></head><body>"
+            f"<p>{text}</p><ul>{links}</ul></body></html>")
+        return 200, "text/html; charset=utf-8", body.encode("utf-8")
+
+
+def make_response(url, status, content_type, body):
+    raw = requests.Response()
+    raw.status_code = status
+    raw._content = body
+    raw.url = url
+    raw.encoding = "utf-8"
+    raw.headers = CaseInsensitiveDict({
+        "Content-Type": content_type, "Content-Length": str(len(body))})
+    return cbor.dumps({
+        "url": url, "status": status, "response": pickle.dumps(raw)})
+
+
+def make_handler(web, latency):
+    class CacheHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # The headers and the body are written separately. On a kept-alive
+        # connection Nagle's algorithm holds the body back until the client
+        # acknowledges the headers, which a delayed ACK puts off ~40 ms.
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            url = query.get("q", [""])[0]
+            if latency:
+                time.sleep(latency)
+            payload = make_response(url, *web.page(url))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/cbor")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return CacheHandler
+
+
+def start_server(web, port=0, latency=0.0):
+    ''' Serves web on localhost from a daemon thread. Returns the server;
+    server.server_address[1] is the bound port. '''
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(web, latency))
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a synthetic web like the spacetime cache server.")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--dup-rate", type=float, default=0.0)
+    parser.add_argument("--trap-rate", type=float, default=0.0)
+    parser.add_argument("--traps", default=",".join(TRAPS))
+    parser.add_argument("--robots", action="store_true",
+                        help="Serve robots.txt and sitemaps")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every response")
+    args = parser.parse_args()
+    web = SyntheticWeb(
+        args.pages, args.fanout, dup_rate=args.dup_rate,
+        trap_rate=args.trap_rate, traps=args.traps.split(","),
+        robots=args.robots)
+    server = start_server(web, args.port, args.latency)
+    print(f"Serving {args.pages} pages on port {server.server_address[1]}.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
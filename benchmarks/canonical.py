@@ -0,0 +1,147 @@
+''' Checks utils.canonical against the url corpus, measures how many
+duplicate fetches it saves on generated spellings of the same pages, and
+times it.
+
+    python -m benchmarks.canonical --urls 20000
+'''
+import os
+import time
+import random
+import argparse
+from hashlib import sha256
+from urllib.parse import urljoin, urlparse
+
+from utils import get_urlhash
+from utils.canonical import canonicalize, canonicalize_many
+from benchmarks.cache_server import HOSTS
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      "canonical_corpus.txt")
+
+
+def legacy_urlhash(url):
+    # utils.normalize and get_urlhash before utils.canonical.
+    if url.endswith("/"):
+        url = url.rstrip("/")
+    parsed = urlparse(url)
+    return sha256(
+        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
+        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
+
+
+def read_corpus(path):
+    groups = [[]]
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if line.startswith("#"):
+                continue
+            if not line:
+                if groups[-1]:
+                    groups.append([])
+                continue
+            groups[-1].append(line)
+    return [group for group in groups if group]
+
+
+def page_url(url):
+    # The canonical url without the trailing slash a directory keeps,
+    # which get_urlhash ignores as well.
+    location, question, query = canonicalize(url).partition("?")
+    return location.rstrip("/") + question + query
+
+
+def check_corpus(groups):
+    failures = 0
+    canonical = dict()
+    for group in groups:
+        expected = page_url(group[0])
+        for url in group:
+            if page_url(url) != expected:
+                failures += 1
+                print(f"  {url} -> {canonicalize(url)}, expected {expected}")
+        if expected in canonical:
+            failures += 1
+            print(f"  {group[0]} and {canonical[expected]} collapsed")
+        canonical[expected] = group[0]
+    return failures
+
+
+def spellings(url, rng):
+    ''' A random way a page links to url. '''
+    scheme, _, rest = url.partition("://")
+    host, _, path = rest.partition("/")
+    path = "/" + path
+    choice = rng.randrange(9)
+    if choice == 0:
+        host = host.upper()
+    elif choice == 1:
+        host += ":443"
+    elif choice == 2:
+        path = path.rstrip("/") + "/"
+    elif choice == 3:
+        path = path.rstrip("/") + "/index.html"
+    elif choice == 4:
+        path = path.replace("~", "%7E")
+    elif choice == 5:
+        path += f"#section{rng.randrange(5)}"
+    elif choice == 6:
+        path = path.replace("/", "//", 1)
+    elif choice == 7:
+        path += f"?utm_source=feed{rng.randrange(3)}"
+    return f"{scheme}://{host}{path}"
+
+
+def timed(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return 1e6 * (time.perf_counter() - start) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark url canonicalization.")
+    parser.add_argument("--urls", type=int, default=20000,
+                        help="Distinct pages to spell in several ways")
+    parser.add_argument("--spellings", type=int, default=5,
+                        help="Links to each page")
+    args = parser.parse_args()
+    rng = random.Random(221)
+
+    groups = read_corpus(CORPUS)
+    failures = check_corpus(groups)
+    print(f"corpus:     {sum(map(len, groups))} urls in {len(groups)} "
+          f"groups, {failures} failures")
+
+    pages = [
+        f"https://{rng.choice(HOSTS)}/~user{i % 500}/page{i}"
+        for i in range(args.urls)]
+    links = [spellings(page, rng)
+             for page in pages for _ in range(args.spellings)]
+    legacy = len(set(map(legacy_urlhash, links)))
+    canonical = len(set(map(get_urlhash, links)))
+    print(f"fetches:    {legacy} before, {canonical} after "
+          f"for {args.urls} pages ({legacy - args.urls} and "
+          f"{canonical - args.urls} duplicates)")
+
+    print(f"fast path:  {timed(canonicalize, pages):8.2f} us/url")
+    print(f"slow path:  {timed(canonicalize, links):8.2f} us/url")
+    print(f"urlhash:    {timed(get_urlhash, links):8.2f} us/url, "
+          f"{timed(legacy_urlhash, links):.2f} before")
+
+    base = "https://www.ics.uci.edu/~user1/index.html"
+    page_hrefs = [
+        [rng.choice(["", "../", "/~user2/", "https://www.cs.uci.edu/"])
+         + f"page{rng.randrange(100)}" + rng.choice(["", "/", "#top"])
+         for _ in range(60)]
+        for _ in range(500)]
+    batch = timed(lambda hrefs: canonicalize_many(hrefs, base), page_hrefs)
+    before = timed(lambda hrefs: [
+        urljoin(base, href).split("#")[0] for href in hrefs], page_hrefs)
+    print(f"batch:      {batch:8.1f} us/page of 60 links, "
+          f"{before:.1f} us before (urljoin only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+''' Frontier restart time from a checkpoint against a full rescan of the
+save file.
+
+    python -m benchmarks.checkpoint --urls 1000000
+
+Builds a log save file of --urls urls, half of them completed, then times
+Frontier(config, restart=False) without a checkpoint, writing the
+checkpoint on close, and again with it.
+'''
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+from utils import get_urlhash
+from crawler.store import LogStore
+from benchmarks.cache_server import HOSTS
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark frontier restarts with and without checkpoint.")
+    parser.add_argument("--urls", type=int, default=1000000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="checkpoint-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from crawler.frontier import Frontier
+    from benchmarks.crawl import make_config
+    logging.disable(logging.INFO)
+    save_file = os.path.join(workdir, "frontier.save")
+    config = make_config(
+        argparse.Namespace(threads=1, in_flight=1, politeness=0.0),
+        1, save_file)
+
+    store = LogStore(save_file, batch_size=1 << 20)
+    for i in range(args.urls):
+        url = f"https://{HOSTS[i % len(HOSTS)]}/p/{i}"
+        store.discover(get_urlhash(url), url)
+        if i % 2:
+            store.complete(get_urlhash(url), url)
+    store.compact()
+    store.close()
+
+    _, elapsed = timed(lambda: LogStore(save_file).close())
+    print(f"save file load:       {elapsed:8.2f} s ({args.urls} urls)")
+    frontier, elapsed = timed(lambda: Frontier(config, False))
+    print(f"restart by rescan:    {elapsed:8.2f} s, {frontier.queued} queued")
+    _, elapsed = timed(frontier.checkpoint)
+    size = os.path.getsize(frontier.checkpoint_file)
+    print(f"checkpoint write:     {elapsed:8.2f} s, "
+          f"{size / 2**20:.1f} MiB ({size / args.urls:.1f} bytes/url)")
+    frontier.close()
+    frontier, elapsed = timed(lambda: Frontier(config, False))
+    print(f"restart by checkpoint:{elapsed:8.2f} s, {frontier.queued} queued")
+    frontier.close()
+
+
+if __name__ == "__main__":
+    main()
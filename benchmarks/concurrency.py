@@ -0,0 +1,159 @@
+''' Throughput and politeness of a crawl against a cache server that serves
+a few requests at a time and sheds the ones it could not start in time,
+where some hosts are slow to answer: with a fixed THREADCOUNT and the
+POLITENESS delay for every host, as before, and with the concurrency
+controller of crawler.controller and the host pacing of utils.pacing.
+
+    python -m benchmarks.concurrency --pages 1500 --hosts 64 --capacity 4
+
+The control interval and retry delays are scaled down from the config.ini
+defaults to fit the benchmark.
+'''
+import os
+import json
+import time
+import logging
+import tempfile
+import argparse
+import multiprocessing
+from threading import Lock, BoundedSemaphore
+from urllib.parse import urlparse
+
+from benchmarks.cache_server import SyntheticWeb, start_server, subdomains
+from benchmarks.crawl import make_config
+
+OVERLOADED = (502, "text/html", b"<html><body>Overloaded</body></html>")
+
+
+class LoadedWeb(SyntheticWeb):
+    ''' A SyntheticWeb behind a cache server that works on capacity
+    requests at once for service seconds each and answers 502 to those
+    that waited over shed_after seconds for their turn. Pages of the slow
+    hosts take slow_latency seconds more. Keeps when each host was asked
+    for a page and how long the requests took. '''
+    def __init__(self, pages, hosts, capacity, service, shed_after, slow,
+                 slow_latency, seed=221):
+        super().__init__(pages, trap_rate=0.0, hosts=hosts, seed=seed)
+        self.slots = BoundedSemaphore(capacity)
+        self.service = service
+        self.shed_after = shed_after
+        self.slow = set(self.hosts[:slow])
+        self.slow_latency = slow_latency
+        self.lock = Lock()
+        self.starts = dict()
+        self.latencies = list()
+        self.shed = 0
+
+    def page(self, url):
+        host = urlparse(url).hostname
+        start = time.monotonic()
+        with self.lock:
+            self.starts.setdefault(host, list()).append(start)
+        if not self.slots.acquire(timeout=self.shed_after):
+            with self.lock:
+                self.shed += 1
+            return OVERLOADED
+        try:
+            time.sleep(self.service)
+        finally:
+            self.slots.release()
+        if host in self.slow:
+            time.sleep(self.slow_latency)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        return super().page(url)
+
+    def gaps(self, hosts):
+        ''' Seconds between two requests in a row for a page of hosts. '''
+        return [
+            later - earlier for host in hosts
+            for earlier, later in zip(
+                sorted(self.starts.get(host, ())),
+                sorted(self.starts.get(host, ()))[1:])]
+
+
+def run_crawl(args, port, workdir, seeds, threads, max_threads, factor):
+    os.chdir(workdir)
+    logging.disable(logging.WARNING)
+    from crawler import Crawler
+    args.threads = threads
+    config = make_config(args, port, os.path.join(workdir, "frontier.shelve"))
+    config.seed_urls = seeds
+    config.metrics_interval = 0.5
+    config.max_threads = max_threads
+    config.control_interval = args.interval
+    config.host_latency_factor = factor
+    config.retry_delay = 0.1
+    config.retry_max_delay = 2.0
+    config.breaker_cooldown = 1.2
+    Crawler(config, True).start()
+
+
+def crawl(args, threads, max_threads, factor):
+    ''' (seconds, pages scraped with a 200, the LoadedWeb, metrics) of a
+    crawl of a fresh LoadedWeb. '''
+    from utils.records import read_records
+    web = LoadedWeb(
+        args.pages, subdomains(args.hosts), args.capacity, args.service,
+        args.shed_after, args.slow, args.slow_latency)
+    server = start_server(web)
+    workdir = tempfile.mkdtemp(prefix="crawl-bench-")
+    seeds = [web.url(host, 0) for host in web.hosts]
+    process = multiprocessing.Process(target=run_crawl, args=(
+        args, server.server_address[1], workdir, seeds, threads, max_threads,
+        factor))
+    start = time.perf_counter()
+    process.start()
+    process.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    pages = set(
+        record["url"] for record, _ in
+        read_records(os.path.join(workdir, "Logs", "crawl.jsonl"))
+        if record["status"] == 200)
+    with open(os.path.join(workdir, "Logs", "metrics.json")) as file:
+        report = json.load(file)
+    return elapsed, len(pages), web, report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the concurrency controller and host pacing.")
+    parser.add_argument("--pages", type=int, default=1500)
+    parser.add_argument("--hosts", type=int, default=64)
+    parser.add_argument("--capacity", type=int, default=4,
+                        help="Requests the cache server works on at once")
+    parser.add_argument("--service", type=float, default=0.05,
+                        help="Seconds the cache server takes per request")
+    parser.add_argument("--shed-after", type=float, default=0.5,
+                        help="Seconds a request waits before a 502")
+    parser.add_argument("--slow", type=int, default=4,
+                        help="Hosts whose pages take --slow-latency more")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--threads", default="2,32",
+                        help="Fixed THREADCOUNTs to compare")
+    parser.add_argument("--max-threads", type=int, default=32)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--in-flight", type=int, default=1)
+    parser.add_argument("--politeness", type=float, default=0.5)
+    args = parser.parse_args()
+
+    runs = [
+        (f"fixed {threads}", threads, 0, 0.0)
+        for threads in map(int, args.threads.split(","))]
+    runs.append(("adaptive", 2, args.max_threads, 1.0))
+    print(f"{'':10s} {'seconds':>8} {'pages/s':>8} {'latency':>8} "
+          f"{'shed':>6} {'min gap':>8} {'slow gap':>9} {'limit':>6}")
+    for name, threads, max_threads, factor in runs:
+        elapsed, pages, web, report = crawl(args, threads, max_threads, factor)
+        slow = web.gaps(web.slow)
+        latency = sum(web.latencies) / max(len(web.latencies), 1)
+        limit = report["gauges"].get("concurrency", "-")
+        print(f"{name:10s} {elapsed:8.1f} {pages / elapsed:8.1f} "
+              f"{latency:8.2f} {web.shed:6d} "
+              f"{min(web.gaps(web.hosts), default=0.0):8.2f} "
+              f"{sum(slow) / max(len(slow), 1):9.2f} {limit:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+''' End-to-end crawl benchmark against the local stand-in cache server.
+
+Runs the real Crawler, Frontier and Worker on a SyntheticWeb served from
+this process and reports pages/s, per-page latency percentiles, memory
+growth and the frontier size over time, and how many of the fetches were
+useful: unique pages that were not low value, duplicates or trap pages.
+
+    python -m benchmarks.crawl --pages 5000 --threads 4 --max-fetches 2000
+    python -m benchmarks.crawl --pages 5000 --processes 4
+    python -m benchmarks.crawl --pages 20000 --max-fetches 10000 --scorer lifo
+
+With --processes the crawl runs in a ShardedCrawler instead. Per-url
+latencies are then not collected and the queued column shows -1.
+
+The crawl runs in a temporary directory, so its save file and logs do not
+touch the working tree.
+'''
+import os
+import sys
+import time
+import logging
+import tempfile
+import argparse
+from threading import Thread, Lock
+from configparser import ConfigParser
+
+from benchmarks.cache_server import HOSTS, TRAPS, SyntheticWeb, start_server
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def make_config(args, port, save_file):
+    from utils.config import Config
+    cparser = ConfigParser()
+    cparser.read_dict({
+        "IDENTIFICATION": {"USERAGENT": "IR benchmark crawler"},
+        "CONNECTION": {"HOST": "127.0.0.1", "PORT": str(port)},
+        "CRAWLER": {
+            "SEEDURL": ",".join(f"https://{host}" for host in HOSTS),
+            "POLITENESS": str(args.politeness),
+            # Only POLITENESS between fetches, unless a benchmark paces.
+            "HOSTLATENCYFACTOR": str(getattr(args, "host_latency_factor", 0)),
+            "TRAPBUDGET": str(getattr(args, "trap_budget", 1000)),
+            "SCORER": getattr(args, "scorer", "default")},
+        "LOCAL PROPERTIES": {
+            "SAVE": save_file,
+            "QUEUEMEMORY": str(getattr(args, "queue_memory", 1000000)),
+            "THREADCOUNT": str(args.threads),
+            "INFLIGHT": str(args.in_flight)},
+    })
+    config = Config(cparser)
+    config.cache_server = ("127.0.0.1", port)
+    return config
+
+
+def timed_frontier(limit):
+    from crawler.frontier import Frontier
+
+    class TimedFrontier(Frontier):
+        ''' Frontier that stops after limit urls and times each one from
+        get_tbd_url to release_url. '''
+        def __init__(self, config, restart):
+            self.timing_lock = Lock()
+            self.started = dict()
+            self.latencies = list()
+            self.fetched = 0
+            super().__init__(config, restart)
+
+        def get_tbd_url(self, block=True):
+            with self.timing_lock:
+                if limit and self.fetched >= limit:
+                    return None
+            url = super().get_tbd_url(block)
+            if url:
+                with self.timing_lock:
+                    self.fetched += 1
+                    self.started[url] = time.perf_counter()
+            return url
+
+        def release_url(self, url):
+            with self.timing_lock:
+                start = self.started.pop(url, None)
+                if start is not None:
+                    self.latencies.append(time.perf_counter() - start)
+            super().release_url(url)
+
+    return TimedFrontier
+
+
+def useful_pages(web, path):
+    ''' The unique pages of the crawl records that were neither low value
+    nor part of a trap. '''
+    from utils.records import read_records
+    useful = set()
+    for record, _ in read_records(path):
+        if record["status"] != 200 or not record["words"]:
+            continue
+        location = web.locate(record["url"])
+        if location and not location[2]:
+            useful.add(location[:2])
+    return len(useful)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark a full crawl against a synthetic web.")
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--dup-rate", type=float, default=0.1)
+    parser.add_argument("--trap-rate", type=float, default=0.02)
+    parser.add_argument("--traps", default=",".join(TRAPS))
+    parser.add_argument("--robots", action="store_true",
+                        help="Serve robots.txt and sitemaps")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="Seconds the server adds to every response")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--in-flight", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Crawl processes, sharding the hosts")
+    parser.add_argument("--politeness", type=float, default=0.0,
+                        help="Per host delay, 0 measures raw throughput")
+    parser.add_argument("--trap-budget", type=int, default=1000)
+    parser.add_argument("--scorer", default="default",
+                        help="SCORER of the frontier, see crawler/scoring.py")
+    parser.add_argument("--queue-memory", type=int, default=1000000,
+                        help="Queued urls kept in memory before spilling")
+    parser.add_argument("--max-fetches", type=int, default=0,
+                        help="Stop after this many fetches, 0 for no limit")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Seconds between frontier/memory samples")
+    args = parser.parse_args()
+
+    web = SyntheticWeb(
+        args.pages, args.fanout, dup_rate=args.dup_rate,
+        trap_rate=args.trap_rate, traps=args.traps.split(","),
+        robots=args.robots)
+    server = start_server(web, latency=args.latency)
+    port = server.server_address[1]
+
+    workdir = tempfile.mkdtemp(prefix="crawl-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from crawler import Crawler
+    from crawler.shard import ShardedCrawler
+    logging.disable(logging.INFO)
+
+    config = make_config(args, port, os.path.join(workdir, "frontier.shelve"))
+    if args.processes > 1:
+        crawler = ShardedCrawler(config, True, args.processes)
+        coordinator = crawler.coordinator
+        latencies = list()
+
+        def progress():
+            fetched = coordinator.total_fetched()
+            if args.max_fetches and fetched >= args.max_fetches:
+                coordinator.done.set()
+            return fetched, -1
+    else:
+        crawler = Crawler(
+            config, True, frontier_factory=timed_frontier(args.max_fetches))
+        frontier = crawler.frontier
+        latencies = frontier.latencies
+
+        def progress():
+            return frontier.fetched, frontier.queued
+
+    samples = list()
+    done = False
+    start_rss = rss_bytes()
+    start = time.perf_counter()
+
+    def sample():
+        while not done:
+            samples.append(
+                (time.perf_counter() - start, *progress(), rss_bytes()))
+            time.sleep(args.interval)
+    sampler = Thread(target=sample, daemon=True)
+    sampler.start()
+
+    crawler.start()
+    elapsed = time.perf_counter() - start
+    done = True
+    server.shutdown()
+
+    fetched = progress()[0]
+    print(f"workdir:   {workdir}")
+    print(f"fetched:   {fetched} pages in {elapsed:.1f}s "
+          f"({fetched / elapsed:.1f} pages/s)")
+    useful = useful_pages(web, os.path.join(workdir, "Logs", "crawl.jsonl"))
+    print(f"useful:    {useful} pages, "
+          f"{10000 * useful / max(fetched, 1):.0f} per 10k fetches")
+    if latencies:
+        print(f"latency:   p50 {1000 * percentile(latencies, 0.5):.1f} ms, "
+              f"p99 {1000 * percentile(latencies, 0.99):.1f} ms")
+    if args.processes == 1:
+        from scraper import traps
+        for pattern, reason, _, fetched, low, rejected in traps.stats()[:5]:
+            print(f"throttled: {pattern} ({reason}), {fetched} fetched, "
+                  f"{low} low value, {rejected} rejected")
+        print(f"throttled: {traps.repeats} urls with repeated segments")
+        from utils.metrics import metrics
+        timers = metrics.snapshot()["timers"]
+        for name, timer in sorted(timers.items()):
+            print(f"stage:     {name:12} {timer['count']:7d} x "
+                  f"p50 {timer['p50_ms']:7.3f} ms, p99 {timer['p99_ms']:7.3f} ms")
+        robots = crawler.frontier.robots
+        print(f"robots:    {len(robots.hosts)} hosts, "
+              f"{robots.blocked} urls disallowed")
+    print(f"memory:    {start_rss / 2**20:.1f} MiB -> "
+          f"{rss_bytes() / 2**20:.1f} MiB")
+    print(f"{'time':>8} {'fetched':>8} {'queued':>8} {'rss MiB':>8}")
+    for at, fetched, queued, rss in samples:
+        print(f"{at:8.1f} {fetched:8d} {queued:8d} {rss / 2**20:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
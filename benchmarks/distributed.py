@@ -0,0 +1,93 @@
+''' Throughput of a distributed crawl with 1, 2 and 4 nodes on this machine.
+
+Each run serves a fresh dataframe and a SyntheticWeb over --hosts hosts
+from this process, then starts the nodes as processes, each a
+DistributedCrawler with --threads workers, and crawls the whole web. The
+latency of the stand-in cache stands in for the network, so a node is
+bound by its workers waiting on it, as against the real cache server,
+not by the CPU of this machine.
+
+    python -m benchmarks.distributed --nodes 1,2,4 --pages 1000 --hosts 128
+'''
+import os
+import time
+import logging
+import tempfile
+import argparse
+import multiprocessing
+from collections import Counter
+
+from benchmarks.cache_server import SyntheticWeb, start_server, subdomains
+from benchmarks.crawl import make_config
+
+
+def run_node(args, port, address, node_id, workdir, seeds):
+    os.chdir(workdir)
+    logging.disable(logging.INFO)
+    from crawler.distributed import DistributedCrawler
+    config = make_config(args, port, os.path.join(workdir, "frontier.shelve"))
+    config.seed_urls = seeds
+    DistributedCrawler(config, True, node_id, address).start()
+
+
+def crawl(args, nodes):
+    ''' (seconds, pages fetched, urls fetched more than once) of a crawl
+    of the whole web by nodes nodes. '''
+    from crawler.distributed import serve_dataframe
+    from utils.pcc_models import CrawlNode
+    from utils.records import read_records
+    web = SyntheticWeb(
+        args.pages, args.fanout, trap_rate=0.0, hosts=subdomains(args.hosts))
+    server = start_server(web, latency=args.latency)
+    dataframe = serve_dataframe(0, args.partitions)
+    workdir = tempfile.mkdtemp(prefix="crawl-bench-")
+    seeds = [web.url(host, 0) for host in web.hosts]
+    processes = [
+        multiprocessing.Process(target=run_node, args=(
+            args, server.server_address[1], dataframe.details,
+            f"node{n}", workdir, seeds))
+        for n in range(nodes)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    dataframe.checkout()
+    fetched = sum(node.fetched for node in dataframe.read_all(CrawlNode))
+    urls = Counter(
+        record["url"] for record, _ in
+        read_records(os.path.join(workdir, "Logs", "crawl.jsonl")))
+    return elapsed, fetched, sum(count - 1 for count in urls.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark a distributed crawl with more and more nodes.")
+    parser.add_argument("--nodes", default="1,2,4")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--hosts", type=int, default=128)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--partitions", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Seconds the server adds to every response")
+    parser.add_argument("--threads", type=int, default=2,
+                        help="Workers per node")
+    parser.add_argument("--in-flight", type=int, default=1)
+    parser.add_argument("--politeness", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>5} {'seconds':>8} {'fetched':>8} {'pages/s':>8} "
+          f"{'speedup':>8} {'refetched':>9}")
+    base = None
+    for nodes in map(int, args.nodes.split(",")):
+        elapsed, fetched, refetched = crawl(args, nodes)
+        rate = fetched / elapsed
+        base = base or rate / nodes
+        print(f"{nodes:5d} {elapsed:8.1f} {fetched:8d} {rate:8.1f} "
+              f"{rate / base:8.2f} {refetched:9d}")
+
+
+if __name__ == "__main__":
+    main()
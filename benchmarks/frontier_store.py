@@ -0,0 +1,43 @@
+''' Compares URLs/s of the frontier save formats.
+
+    python -m benchmarks.frontier_store --urls 20000
+'''
+import os
+import time
+import tempfile
+import argparse
+
+from utils import get_urlhash
+from crawler.store import ShelveStore, LogStore
+
+
+def run(store, urls):
+    start = time.perf_counter()
+    for url in urls:
+        store.discover(get_urlhash(url), url)
+    for url in urls:
+        store.complete(get_urlhash(url), url)
+    store.close()
+    return 2 * len(urls) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the shelve and log frontier save formats.")
+    parser.add_argument("--urls", type=int, default=20000)
+    args = parser.parse_args()
+
+    urls = [f"https://www.ics.uci.edu/page/{i}" for i in range(args.urls)]
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "shelve": lambda: ShelveStore(os.path.join(tmp, "bench.shelve")),
+            "log": lambda: LogStore(os.path.join(tmp, "bench.log")),
+        }
+        for name, factory in backends.items():
+            rate = run(factory(), urls)
+            print(f"{name:>8}: {rate:12.0f} events/s "
+                  f"({args.urls} discovered + {args.urls} completed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+''' CPU spent on a mixed-content corpus with every response parsed, as
+before utils.gate, and with the responses gated on status, headers and size
+first and the parsed bytes capped.
+
+    python -m benchmarks.gate --pages 400
+
+The corpus mixes HTML pages of the synthetic web with large HTML pages,
+PDFs and images served under extensionless urls, binaries without a
+Content-Type and error pages, all run through the same CBOR and pickle
+decoding as utils.download.
+'''
+import time
+import random
+import argparse
+from collections import Counter
+
+import cbor
+
+from utils.response import Response
+from utils.document import Document
+from utils.gate import ResponseGate
+from benchmarks.cache_server import HOSTS, SyntheticWeb, make_response
+
+
+def binary(rng, size, magic=b""):
+    return magic + rng.getrandbits(8 * size).to_bytes(size, "little")
+
+
+def large_html(web, rng, size):
+    # Real pages glued together until the body is size bytes.
+    parts = list()
+    total = 0
+    while total < size:
+        _, _, body = web.page(web.url(rng.choice(HOSTS), rng.randrange(1, 1000)))
+        parts.append(body)
+        total += len(body)
+    return b"".join(parts)
+
+
+def corpus(pages, seed=221):
+    ''' (kind, cbor payload) pairs, most of them ordinary pages. '''
+    rng = random.Random(seed)
+    web = SyntheticWeb(4000, 10)
+    payloads = list()
+    for n in range(pages):
+        url = f"https://{rng.choice(HOSTS)}/files/doc{n}"
+        choice = rng.random()
+        if choice < 0.70:
+            kind = "html"
+            page = web.url(rng.choice(HOSTS), rng.randrange(1, 1000))
+            status, content_type, body = web.page(page)
+            url = page
+        elif choice < 0.75:
+            kind, status, content_type = "large html", 200, "text/html"
+            body = large_html(web, rng, rng.randrange(2, 12) * 1024 * 1024)
+        elif choice < 0.85:
+            kind, status, content_type = "pdf", 200, "application/pdf"
+            body = binary(rng, rng.randrange(200, 4000) * 1024, b"%PDF-1.5\n")
+        elif choice < 0.90:
+            kind, status, content_type = "image", 200, "image/png"
+            body = binary(rng, rng.randrange(50, 800) * 1024, b"\x89PNG\r\n")
+        elif choice < 0.95:
+            kind, status, content_type = "untyped binary", 200, ""
+            body = binary(rng, rng.randrange(100, 2000) * 1024, b"PK\x03\x04")
+        else:
+            kind, status, content_type = "error", 404, "text/html"
+            body = b"<html><body>Not Found</body></html>"
+        payloads.append((kind, make_response(url, status, content_type, body)))
+    return payloads
+
+
+def scrape(doc):
+    # The views extract_next_links and is_resp_low_value use.
+    if doc.tree is None:
+        return 0
+    doc.text
+    doc.signature
+    doc.anchor_count
+    return len(doc.links)
+
+
+def ungated(payload):
+    resp = Response(cbor.loads(payload))
+    if resp.status != 200:
+        return 0
+    return scrape(Document(resp))
+
+
+def make_gated(gate):
+    def gated(payload):
+        resp = Response(cbor.loads(payload))
+        if gate.check(resp) is not None:
+            return 0
+        return scrape(Document(resp, gate.body(resp)))
+    return gated
+
+
+def timed(function, payloads):
+    per_kind = Counter()
+    links = 0
+    start = time.process_time()
+    for kind, payload in payloads:
+        before = time.process_time()
+        links += function(payload)
+        per_kind[kind] += time.process_time() - before
+    return time.process_time() - start, per_kind, links
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark gating responses before parsing.")
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--max-bytes", type=int, default=10 * 1024 * 1024)
+    parser.add_argument("--parse-bytes", type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    payloads = corpus(args.pages)
+    kinds = Counter(kind for kind, _ in payloads)
+    megabytes = sum(len(payload) for _, payload in payloads) / 2**20
+    print(f"corpus:   {len(payloads)} responses, {megabytes:.0f} MiB, "
+          + ", ".join(f"{count} {kind}" for kind, count in kinds.items()))
+
+    gate = ResponseGate(args.max_bytes, args.parse_bytes)
+    before, before_kinds, before_links = timed(ungated, payloads)
+    after, after_kinds, after_links = timed(make_gated(gate), payloads)
+    print(f"cpu:      {before:.2f}s parsing everything, {after:.2f}s gated "
+          f"({100 * (1 - after / before):.0f}% saved)")
+    for kind in kinds:
+        print(f"  {kind:15} {1000 * before_kinds[kind] / kinds[kind]:8.1f} "
+              f"-> {1000 * after_kinds[kind] / kinds[kind]:8.1f} ms/response")
+    print(f"links:    {before_links} before, {after_links} gated")
+    print("skipped:  " + ", ".join(
+        f"{count} {reason}" for reason, count in gate.stats()))
+
+
+if __name__ == "__main__":
+    main()
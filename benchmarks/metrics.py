@@ -0,0 +1,65 @@
+''' Cost of recording a metric from several threads: utils.metrics against
+one dict of counters and one of lists of timings behind a shared lock.
+
+    python -m benchmarks.metrics --threads 4 --calls 200000
+'''
+import time
+import argparse
+from threading import Thread, Lock
+
+from utils.metrics import Metrics
+
+
+class LockedMetrics(object):
+    def __init__(self):
+        self.lock = Lock()
+        self.counters = dict()
+        self.timings = dict()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.timings.setdefault(name, list()).append(seconds)
+
+
+def hammer(metrics, threads, calls):
+    ''' Nanoseconds per count() plus observe() pair, over all threads. '''
+    def work():
+        for _ in range(calls):
+            metrics.count("pages")
+            metrics.observe("download", 0.0123)
+    workers = [Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return 1e9 * (time.perf_counter() - start) / (threads * calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark recording metrics from threads.")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    per_thread = hammer(metrics, args.threads, args.calls)
+    start = time.perf_counter()
+    snapshot = metrics.snapshot()
+    merge = 1000 * (time.perf_counter() - start)
+    assert snapshot["counters"]["pages"] == args.threads * args.calls
+    locked = hammer(LockedMetrics(), args.threads, args.calls)
+    print(f"record:    {per_thread:.0f} ns per count+observe per thread, "
+          f"{locked:.0f} ns with a shared lock")
+    print(f"snapshot:  {merge:.2f} ms for {args.threads} threads")
+    print(f"download:  p50 {snapshot['timers']['download']['p50_ms']:.3f} ms "
+          f"for 12.3 ms observed")
+
+
+if __name__ == "__main__":
+    main()
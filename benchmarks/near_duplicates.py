@@ -0,0 +1,70 @@
+''' SimHash signature cost and NearDuplicateIndex lookup cost at scale.
+
+    python -m benchmarks.near_duplicates --docs 1000000
+'''
+import time
+import random
+import argparse
+import tracemalloc
+
+from utils.simhash import simhash, NearDuplicateIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark SimHash signatures and index lookups.")
+    parser.add_argument("--docs", type=int, default=1000000,
+                        help="Signatures stored in the index")
+    parser.add_argument("--pages", type=int, default=2000,
+                        help="Synthetic pages to sign")
+    parser.add_argument("--words", type=int, default=400,
+                        help="Distinct words per synthetic page")
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--threshold", type=int, default=3)
+    args = parser.parse_args()
+    rng = random.Random(221)
+
+    vocabulary = [f"word{i}" for i in range(50000)]
+    pages = [set(rng.sample(vocabulary, args.words)) for _ in range(args.pages)]
+    start = time.perf_counter()
+    signatures = [simhash(page) for page in pages]
+    elapsed = time.perf_counter() - start
+    print(f"signature: {1e6 * elapsed / args.pages:10.1f} us/page "
+          f"({args.words} words)")
+
+    # A page with a few words changed should stay within the threshold.
+    page = pages[0]
+    edited = set(list(page)[5:]) | set(rng.sample(vocabulary, 5))
+    print(f"edit distance of 5/{args.words} words: "
+          f"{bin(simhash(page) ^ simhash(edited)).count('1')} bits")
+
+    tracemalloc.start()
+    index = NearDuplicateIndex(threshold=args.threshold)
+    start = time.perf_counter()
+    for _ in range(args.docs):
+        index.add(rng.getrandbits(64))
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"insert:    {1e6 * elapsed / args.docs:10.2f} us/signature, "
+          f"{memory / args.docs:.0f} bytes/signature at {args.docs}")
+
+    queries = [rng.getrandbits(64) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for query in queries:
+        index.find(query)
+    elapsed = time.perf_counter() - start
+    print(f"lookup:    {1e6 * elapsed / args.lookups:10.2f} us/miss")
+
+    stored = [index.signatures[rng.randrange(len(index))]
+              for _ in range(args.lookups)]
+    near = [signature ^ (1 << rng.randrange(64)) for signature in stored]
+    start = time.perf_counter()
+    found = sum(index.find(query) is not None for query in near)
+    elapsed = time.perf_counter() - start
+    print(f"lookup:    {1e6 * elapsed / args.lookups:10.2f} us/near hit "
+          f"({found}/{args.lookups} found)")
+
+
+if __name__ == "__main__":
+    main()
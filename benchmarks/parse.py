@@ -0,0 +1,78 @@
+''' Per-page parse cost of the scraper checks, before and after sharing one
+parsed Document between them.
+
+    python -m benchmarks.parse path/to/saved/pages
+
+Every file in the directory is read as the body of a 200 response.
+'''
+import os
+import time
+import argparse
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from lxml import html
+
+from utils.document import Document
+from utils.tokenize import tokenize_from_text
+
+
+class SavedPage(object):
+    ''' Just enough of utils.response.Response for the scraper checks. '''
+    def __init__(self, url, content):
+        self.url = url
+        self.status = 200
+        self.error = None
+        self.raw_response = self
+        self.content = content
+        self.headers = dict()
+
+
+def three_parses(resp):
+    # extract_next_links, is_resp_low_value and get_number_of_words before
+    # the shared Document: one lxml and two BeautifulSoup parses.
+    tree = html.fromstring(resp.content)
+    links = [urljoin(resp.url, href).split("#")[0]
+             for href in tree.xpath("//a[@href]/@href")]
+    soup = BeautifulSoup(resp.content, "html.parser")
+    text = " ".join(soup.get_text().split())
+    anchors = len(soup.find_all("a"))
+    soup = BeautifulSoup(resp.content, "html.parser")
+    tokens = tokenize_from_text(soup.get_text().strip(), rtype="set")
+    return links, text, anchors, tokens
+
+
+def one_parse(resp):
+    doc = Document(resp)
+    return doc.links, doc.text, doc.anchor_count, doc.tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the per-page parse cost of the scraper.")
+    parser.add_argument("corpus", help="Directory of saved html pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = list()
+    for name in sorted(os.listdir(args.corpus)):
+        with open(os.path.join(args.corpus, name), "rb") as file:
+            pages.append(SavedPage(f"https://www.ics.uci.edu/{name}", file.read()))
+    if not pages:
+        print(f"No pages found in {args.corpus}.")
+        return
+
+    for name, check in (("before", three_parses), ("after", one_parse)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for page in pages:
+                check(page)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:>7}: {1000 * best / len(pages):8.3f} ms/page "
+              f"over {len(pages)} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+''' Allocation profile of decoding and scraping one response at a time, as a
+worker does, with the eager Response that unpickled every page on arrival
+and with the lazy utils.response.Response.
+
+    python -m benchmarks.response --pages 300
+
+Uses the mixed-content corpus of benchmarks.gate. The peak is what
+tracemalloc saw while one response went from its CBOR payload through
+utils.gate and the Document views extract_next_links uses.
+'''
+import time
+import pickle
+import argparse
+import tracemalloc
+from collections import defaultdict
+
+import cbor
+
+from utils.response import Response
+from utils.document import Document
+from utils.gate import ResponseGate
+from benchmarks.gate import corpus, scrape
+
+
+class EagerResponse(object):
+    ''' utils.response.Response before lazy decoding, with the accessors
+    the gate and the scraper use now. '''
+    def __init__(self, resp_dict):
+        self.url = resp_dict["url"]
+        self.status = resp_dict["status"]
+        self.error = resp_dict["error"] if "error" in resp_dict else None
+        try:
+            self.raw_response = (
+                pickle.loads(resp_dict["response"])
+                if "response" in resp_dict else
+                None)
+        except TypeError:
+            self.raw_response = None
+
+    @property
+    def headers(self):
+        return self.raw_response.headers if self.raw_response else {}
+
+    @property
+    def body(self):
+        return memoryview(self.content)
+
+    @property
+    def content(self):
+        return (self.raw_response.content or b"") if self.raw_response else b""
+
+
+def process(response_class, gate, payload):
+    resp = response_class(cbor.loads(payload))
+    if gate.check(resp) is None:
+        scrape(Document(resp, gate.body(resp)))
+
+
+def profile(response_class, payloads, gate):
+    ''' {kind: [peak bytes per response]} and the seconds taken. '''
+    peaks = defaultdict(list)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for kind, payload in payloads:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        process(response_class, gate, payload)
+        peaks[kind].append(tracemalloc.get_traced_memory()[1] - base)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return peaks, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Profile the memory of decoding responses.")
+    parser.add_argument("--pages", type=int, default=300)
+    args = parser.parse_args()
+
+    payloads = corpus(args.pages)
+    # The payloads themselves are not part of the profile.
+    before, before_time = profile(EagerResponse, payloads, ResponseGate())
+    after, after_time = profile(Response, payloads, ResponseGate())
+    worst_before = max(max(peaks) for peaks in before.values())
+    worst_after = max(max(peaks) for peaks in after.values())
+    print(f"peak per worker: {worst_before / 2**20:.1f} MiB eager, "
+          f"{worst_after / 2**20:.1f} MiB lazy")
+    print(f"time:            {before_time:.2f}s eager, {after_time:.2f}s lazy")
+    print(f"{'kind':15} {'responses':>9} {'mean peak KiB':>21} "
+          f"{'max peak KiB':>21}")
+    for kind in before:
+        mean_before = sum(before[kind]) / len(before[kind]) / 1024
+        mean_after = sum(after[kind]) / len(after[kind]) / 1024
+        print(f"{kind:15} {len(before[kind]):9d} "
+              f"{mean_before:9.0f} -> {mean_after:8.0f} "
+              f"{max(before[kind]) / 1024:9.0f} -> "
+              f"{max(after[kind]) / 1024:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+''' Pages recovered and fetches wasted on a web where some pages fail once
+or twice with a 503 and some hosts can never be downloaded by the cache
+server (601, robots.txt included), with the retries and host
+breakers of utils.retry and without them, as before they existed: every
+503 scraped once and completed.
+
+    python -m benchmarks.retry --pages 2000 --hosts 32 --dead 4
+
+The backoff and breaker times are scaled down from the config.ini
+defaults to fit the benchmark, in the same ratios.
+'''
+import os
+import json
+import time
+import random
+import logging
+import tempfile
+import argparse
+import multiprocessing
+from threading import Lock
+from urllib.parse import urlparse
+from collections import Counter
+
+from benchmarks.cache_server import SyntheticWeb, start_server, subdomains
+from benchmarks.crawl import make_config
+
+UNAVAILABLE = (503, "text/html", b"<html><body>Unavailable</body></html>")
+UNREACHABLE = (601, "text/html", b"")
+
+
+class FlakyWeb(SyntheticWeb):
+    ''' A SyntheticWeb whose dead hosts always fail with a 601, and where a
+    flaky_rate share of the other pages answer 503 to their first one or
+    two requests. Counts the requests per host. '''
+    def __init__(self, pages, dead, flaky_rate, hosts, seed=221):
+        super().__init__(pages, trap_rate=0.0, hosts=hosts, seed=seed)
+        self.dead = set(self.hosts[:dead])
+        self.flaky_rate = flaky_rate
+        self.lock = Lock()
+        self.requests = Counter()
+        self.hosts_requested = Counter()
+
+    def page(self, url):
+        host = urlparse(url).hostname
+        with self.lock:
+            self.requests[url] += 1
+            self.hosts_requested[host] += 1
+            attempt = self.requests[url]
+        if host in self.dead:
+            return UNREACHABLE
+        rng = random.Random(f"{self.seed}/flaky/{url}")
+        if rng.random() < self.flaky_rate and attempt <= rng.randint(1, 2):
+            return UNAVAILABLE
+        return super().page(url)
+
+
+def run_crawl(args, port, workdir, seeds, retries):
+    os.chdir(workdir)
+    logging.disable(logging.WARNING)
+    from crawler import Crawler
+    config = make_config(args, port, os.path.join(workdir, "frontier.shelve"))
+    config.seed_urls = seeds
+    config.metrics_interval = 0.5
+    if retries:
+        config.retry_delay = 0.1
+        config.retry_max_delay = 6.0
+        config.breaker_failures = 5
+        config.breaker_cooldown = 1.2
+        config.breaker_limit = 5
+    else:
+        config.max_retries = 0
+        config.breaker_failures = 0
+    Crawler(config, True).start()
+
+
+def crawl(args, retries):
+    ''' (seconds, requests, requests to dead hosts, pages scraped with a
+    200, metrics counters) of a crawl of a fresh FlakyWeb. '''
+    from utils.records import read_records
+    web = FlakyWeb(args.pages, args.dead, args.flaky_rate,
+                   subdomains(args.hosts))
+    server = start_server(web, latency=args.latency)
+    workdir = tempfile.mkdtemp(prefix="crawl-bench-")
+    seeds = [web.url(host, 0) for host in web.hosts]
+    process = multiprocessing.Process(target=run_crawl, args=(
+        args, server.server_address[1], workdir, seeds, retries))
+    start = time.perf_counter()
+    process.start()
+    process.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    pages = set(
+        record["url"] for record, _ in
+        read_records(os.path.join(workdir, "Logs", "crawl.jsonl"))
+        if record["status"] == 200)
+    with open(os.path.join(workdir, "Logs", "metrics.json")) as file:
+        counters = json.load(file)["counters"]
+    dead = sum(web.hosts_requested[host] for host in web.dead)
+    return (elapsed, sum(web.requests.values()), dead, len(pages), counters)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark retries and host circuit breakers.")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--hosts", type=int, default=32)
+    parser.add_argument("--dead", type=int, default=4,
+                        help="Hosts failing every request with a 601")
+    parser.add_argument("--flaky-rate", type=float, default=0.1,
+                        help="Share of the pages failing once or twice")
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--in-flight", type=int, default=1)
+    parser.add_argument("--politeness", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{'':8s} {'seconds':>8} {'requests':>8} {'to dead':>8} "
+          f"{'pages':>6} {'retries':>8} {'gave up':>8} {'dropped':>8}")
+    for name, retries in (("before", False), ("after", True)):
+        elapsed, requests, dead, pages, counters = crawl(args, retries)
+        print(f"{name:8s} {elapsed:8.1f} {requests:8d} {dead:8d} "
+              f"{pages:6d} {counters.get('retries', 0):8d} "
+              f"{counters.get('retries_exhausted', 0):8d} "
+              f"{counters.get('dropped_dead_host', 0):8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+''' Cost of the robots.txt check per url, against urllib.robotparser, and
+memory of streaming the urls out of a large sitemap.
+
+    python -m benchmarks.robots --urls 100000 --rules 60
+'''
+import time
+import random
+import argparse
+import tracemalloc
+from urllib.robotparser import RobotFileParser
+
+from utils.robots import RobotsRules, iter_sitemap, url_path
+from benchmarks.cache_server import SITEMAP_NS
+
+AGENT = "IR GW25 benchmark"
+
+
+def robots_txt(rules, rng):
+    lines = ["User-agent: *"]
+    for n in range(rules):
+        kind = rng.choice(["Disallow", "Disallow", "Allow"])
+        if n % 10 == 9:
+            lines.append(f"{kind}: /*/private{n}*.php$")
+        else:
+            lines.append(f"{kind}: /~user{n}/{rng.choice(['', 'tmp/', 'cgi-bin/'])}")
+    lines.append("Crawl-delay: 1")
+    return "\n".join(lines) + "\n"
+
+
+def timed(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return 1e6 * (time.perf_counter() - start) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark robots.txt checks and sitemap streaming.")
+    parser.add_argument("--urls", type=int, default=100000)
+    parser.add_argument("--rules", type=int, default=60)
+    parser.add_argument("--sitemap-urls", type=int, default=50000)
+    args = parser.parse_args()
+    rng = random.Random(221)
+
+    text = robots_txt(args.rules, rng)
+    rules = RobotsRules.parse(text, AGENT)
+    stdlib = RobotFileParser()
+    stdlib.parse(text.splitlines())
+    urls = [
+        f"https://www.ics.uci.edu/~user{rng.randrange(2 * args.rules)}/"
+        f"{rng.choice(['', 'tmp/', 'cgi-bin/', 'pub/'])}page{n}"
+        f"{rng.choice(['', '.php', '.html', '?id=3'])}"
+        for n in range(args.urls)]
+    disallowed = sum(not rules.allowed(url_path(url)) for url in urls)
+    print(f"rules:    {args.rules}, {disallowed} of {args.urls} urls "
+          f"disallowed")
+    print(f"check:    {timed(lambda url: rules.allowed(url_path(url)), urls):.2f}"
+          f" us/url, urllib.robotparser "
+          f"{timed(lambda url: stdlib.can_fetch(AGENT, url), urls):.2f} us/url")
+
+    body = (
+        f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">'
+        + "".join(
+            f"<url><loc>https://www.ics.uci.edu/p/{n}</loc>"
+            f"<lastmod>2024-01-01</lastmod></url>"
+            for n in range(args.sitemap_urls))
+        + "</urlset>").encode("utf-8")
+    view = memoryview(body)
+    start = time.perf_counter()
+    count = sum(1 for _ in iter_sitemap(view))
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    sum(1 for _ in iter_sitemap(view))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"sitemap:  {count} urls from {len(body) / 2**20:.1f} MiB in "
+          f"{elapsed:.2f}s, {peak / 2**10:.0f} KiB peak while streaming")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+''' Memory and lookup cost of SeenSet against a set of url strings, and its
+measured false-positive rates.
+
+    python -m benchmarks.seen --urls 1000000
+'''
+import io
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+from utils.seen import SeenSet, url_digest
+
+
+def make_urls(count, rng, prefix):
+    hosts = ["www.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu"]
+    return [
+        f"https://{rng.choice(hosts)}/{prefix}/{i}/{rng.getrandbits(32):x}"
+        for i in range(count)]
+
+
+def timed_lookups(container, urls):
+    start = time.perf_counter()
+    found = sum(url in container for url in urls)
+    return found, 1e6 * (time.perf_counter() - start) / len(urls)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the visited url set.")
+    parser.add_argument("--urls", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+    rng = random.Random(221)
+    urls = make_urls(args.urls, rng, "seen")
+    unseen = make_urls(args.lookups, rng, "unseen")
+
+    # The strings a set keeps alive count against it.
+    tracemalloc.start()
+    strings = set(urls)
+    strings_memory = tracemalloc.get_traced_memory()[0] + sum(
+        map(sys.getsizeof, urls))
+    tracemalloc.stop()
+    tracemalloc.start()
+    seen = SeenSet()
+    for url in urls:
+        seen.add(url)
+    seen_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    seen = SeenSet()
+    start = time.perf_counter()
+    for url in urls:
+        seen.add(url)
+    elapsed = time.perf_counter() - start
+    print(f"set of str: {strings_memory / args.urls:8.1f} bytes/url")
+    print(f"SeenSet:    {seen_memory / args.urls:8.1f} bytes/url measured, "
+          f"{seen.bytes_per_url():.1f} reported, "
+          f"{1e6 * elapsed / args.urls:.2f} us/insert")
+
+    # Share of unseen urls passing the Bloom filter, and reported as seen.
+    digests = [url_digest(url) for url in unseen]
+    passed = sum(seen._bloom_maybe(digest) for digest in digests)
+    bloom, collision = seen.false_positive_rate()
+    found, per_lookup = timed_lookups(seen, unseen)
+    print(f"bloom pass: {passed / len(unseen):8.4%} measured, "
+          f"{bloom:.4%} expected")
+    print(f"false seen: {found}/{len(unseen)} measured, "
+          f"{collision:.2e} expected")
+    print(f"lookup:     {per_lookup:8.2f} us/miss SeenSet, "
+          f"{timed_lookups(strings, unseen)[1]:.2f} us/miss set")
+    sample = rng.sample(urls, min(len(urls), args.lookups))
+    found, per_lookup = timed_lookups(seen, sample)
+    print(f"lookup:     {per_lookup:8.2f} us/hit ({found}/{len(sample)} found)")
+
+    # As the checkpoint writes and reads it.
+    buffer = io.BytesIO()
+    start = time.perf_counter()
+    seen.write(buffer)
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    restored, size = SeenSet.from_buffer(buffer.getbuffer())
+    read = time.perf_counter() - start
+    found, per_lookup = timed_lookups(restored, sample)
+    print(f"checkpoint: write {written:.3f}s, read {read:.4f}s, "
+          f"{size / args.urls:.1f} bytes/url, "
+          f"{per_lookup:.2f} us/hit ({found}/{len(sample)} found)")
+
+
+if __name__ == "__main__":
+    main()
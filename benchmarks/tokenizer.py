@@ -0,0 +1,125 @@
+''' Time and peak memory of counting the tokens of a large text with
+utils.tokenize.Tokenizer against tokenize_from_text and
+computeWordFrequencies, which lowercase the whole text and list every
+token first, and of the batch modes against one call per document.
+
+    python -m benchmarks.tokenizer --megabytes 20 --documents 10000
+'''
+import os
+import re
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter
+
+from utils.tokenize import (
+    Tokenizer, tokenize, tokenize_from_text, computeWordFrequencies,
+    word_frequencies, load_stopwords)
+
+STOPWORDS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "stopword.txt")
+
+
+def corpus(megabytes, rng):
+    ''' Zipf distributed words, some capitalized, some Greek, with
+    punctuation and line breaks, in megabytes of text. '''
+    vocabulary = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz")
+                for _ in range(rng.randint(2, 10)))
+        for _ in range(50000)]
+    vocabulary += ["the", "of", "and", "ΟΔΟΣ", "Σίσυφος", "naïve", "x_1"]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    rng.shuffle(weights)
+    words = rng.choices(vocabulary, weights, k=megabytes * 2**20 // 6)
+    separators = rng.choices(
+        [" ", " ", " ", ", ", ". ", "\n", "-", "'s "], k=len(words))
+    return "".join(
+        (word.title() if n % 7 == 0 else word) + separator
+        for n, (word, separator) in enumerate(zip(words, separators)))
+
+
+def measure(function, *args):
+    ''' (seconds, peak bytes, result) of function(*args). '''
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def line(name, old, new):
+    print(f"{name:10s}{old[0]:6.2f}s {old[1] / 2**20:7.1f} MiB -> "
+          f"{new[0]:6.2f}s {new[1] / 2**20:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the streaming tokenizer.")
+    parser.add_argument("--megabytes", type=int, default=20)
+    parser.add_argument("--documents", type=int, default=10000)
+    args = parser.parse_args()
+    rng = random.Random(221)
+    tokenizer = Tokenizer()
+
+    text = corpus(args.megabytes, rng)
+    print(f"text:     {len(text) / 2**20:.0f} MiB")
+    old = measure(lambda: computeWordFrequencies(tokenize_from_text(text)))
+    new = measure(lambda: dict(tokenizer.counts(text)))
+    assert list(old[2].items()) == list(new[2].items())
+    line("counts:", old, new)
+    old = measure(lambda: set(re.findall(r'\b\w+\b', text.lower())))
+    new = measure(lambda: tokenize_from_text(text, rtype="set"))
+    assert old[2] == new[2]
+    line("set:", old, new)
+
+    with tempfile.NamedTemporaryFile(
+            "w", encoding="utf8", suffix=".txt", delete=False) as file:
+        file.write(text)
+    try:
+        old = measure(lambda: computeWordFrequencies(tokenize(file.name)))
+        new = measure(lambda: word_frequencies(file.name))
+        assert list(old[2].items()) == list(new[2].items())
+        line("file:", old, new)
+    finally:
+        os.remove(file.name)
+
+    # Page sized documents, stopwords left out as the analytics do.
+    stopwords = load_stopwords(STOPWORDS)
+    filtered = Tokenizer(stopwords)
+    step = max(1, len(text) // args.documents)
+    documents = [text[n:n + step] for n in range(0, len(text), step)]
+
+    def one_by_one():
+        counts = Counter()
+        for document in documents:
+            counts.update(
+                token for token in tokenize_from_text(document)
+                if token not in stopwords)
+        return counts
+
+    def pages_one_by_one():
+        counts = Counter()
+        for document in documents:
+            counts.update(
+                token for token in set(tokenize_from_text(document))
+                if token not in stopwords)
+        return counts
+
+    old = measure(one_by_one)
+    new = measure(filtered.count_many, documents)
+    assert old[2] == new[2]
+    line("batch:", old, new)
+    old = measure(pages_one_by_one)
+    new = measure(filtered.document_counts, documents)
+    assert old[2] == new[2]
+    line("pages:", old, new)
+    print(f"          {len(documents)} documents, {len(new[2])} words")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+''' Times scraper.is_valid against the regex loop it replaced, and checks
+that both make the same decision on every url.
+
+    python -m benchmarks.url_filter [--urls-file FILE] [--count N]
+
+Without --urls-file a synthetic mix of crawlable, trap and off-domain urls
+is generated. The only expected disagreements are listed in
+intended_difference(). The old endswith domain check let look-alike hosts
+such as physics.uci.edu through and rejected hosts spelled in upper case,
+and the old year path segment rule is gone.
+'''
+import re
+import sys
+import time
+import random
+import argparse
+from urllib.parse import urlparse
+
+import tldextract
+
+import scraper
+
+# The year path segment rule of the old code, dropped from URL_FILTER.
+YEAR_SEGMENT = re.compile(r"/(202\d|199\d|20\d{2})/")
+
+# The domains the old code matched with endswith.
+LEGACY_DOMAINS = (
+    "ics.uci.edu", "cs.uci.edu", "informatics.uci.edu", "stat.uci.edu")
+
+# The old code used tldextract.extract, which tries to download the suffix
+# list first; the bundled snapshot gives the same answers offline.
+extract = tldextract.TLDExtract(suffix_list_urls=())
+
+
+def legacy_full_domain(url):
+    extracted = extract(url)
+    return ".".join(part for part in (
+        extracted.subdomain, extracted.domain, extracted.suffix) if part)
+
+
+def legacy_is_valid(url):
+    # scraper.is_valid as it was before the compiled UrlFilter.
+    BLOCKLIST_PATTERNS = [
+        r".*[\?&]page=.*",
+        r".*[\?&]sort=.*",
+        r".*[\?&](sessionid|sid|phpsessid)=.*",
+        r".*\.(mp3|mp4|avi|wmv|flv|doc|docx|ppt|pptx|xls|xlsx)$",
+        r".*\/(assets|static|public|dist)\/.*",
+        r"^mailto:.*",
+        r"^tel:.*",
+        r".*[\?&](search|query|q|term)=.*",
+        r".*[\?&](comment|replytocom)=.*",
+        r".*\/(202\d|199\d|20\d{2})\/.*",
+        r".*[\?&](token|auth|key)=.*",
+        r".*\.(rss|xml|atom)$",
+        r".*[\?&]lang=.*",
+        r".*\/(en|fr|de|es|jp)\/.*",
+        r".*[\?&](affiliate|partner|ref)=.*",
+        r".*[\?&](debug|test)=.*",
+        r".*\/(api|v1|json|graphql)\/.*",
+        r".*\/(status|heartbeat|healthcheck)\/.*",
+    ]
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    for pattern in BLOCKLIST_PATTERNS:
+        if re.match(pattern, url, re.IGNORECASE):
+            return False
+    full_domain = legacy_full_domain(url)
+    if full_domain == "today.uci.edu":
+        allowed = parsed.path.startswith(
+            "/department/information_computer_sciences/")
+    else:
+        allowed = any(
+            full_domain.endswith(domain) for domain in LEGACY_DOMAINS)
+    if not allowed:
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+
+
+def intended_difference(url, before, after):
+    ''' Why the old is_valid deciding before and UrlFilter deciding after
+    on url disagree on purpose, or None if they should agree. '''
+    if before == after:
+        return None
+    if before and scraper.is_valid_reason(url) == "domain":
+        # Look-alike host, physics.uci.edu for cs.uci.edu: it ends with an
+        # allowed domain, but not at a dot.
+        domain = legacy_full_domain(url)
+        if any(domain.endswith(allowed) and domain != allowed
+               and not domain.endswith(f".{allowed}")
+               for allowed in LEGACY_DOMAINS):
+            return "look-alike host"
+    if after and not before:
+        # The old endswith check was case sensitive: the host as written,
+        # without userinfo and port, differs from an allowed one only in
+        # letter case.
+        host = urlparse(url).netloc.rpartition("@")[2]
+        if not host.startswith("["):
+            host = host.split(":")[0]
+            if host != host.lower() and any(
+                    host.lower().endswith(allowed)
+                    and not host.endswith(allowed)
+                    for allowed in LEGACY_DOMAINS):
+                return "upper case host"
+    if after and YEAR_SEGMENT.search(url):
+        # Rejected every url with a year segment, legitimate ones too.
+        return "year segment"
+    return None
+
+
+def synthetic_urls(count, seed=221):
+    rng = random.Random(seed)
+    schemes = ["https", "http", "https", "ftp", "mailto"]
+    hosts = [
+        "www.ics.uci.edu", "vision.ics.uci.edu", "www.cs.uci.edu",
+        "www.informatics.uci.edu", "www.stat.uci.edu", "today.uci.edu",
+        "WWW.ICS.UCI.EDU", "www.ics.uci.edu:8080", "physics.uci.edu",
+        "www.uci.edu", "example.com", "economics.uci.edu"]
+    segments = [
+        "people", "faculty", "research", "about", "2019", "1997", "events",
+        "static", "Assets", "en", "api", "status", "wiki", "doku.php",
+        "department", "information_computer_sciences", "~eppstein", "pubs"]
+    leaves = [
+        "", "index.html", "paper.pdf", "slides.PPTX", "data.csv", "feed.xml",
+        "style.css", "photo.JPEG", "talk.mp4", "archive.tar.gz", "page.php"]
+    queries = [
+        "", "", "", "id=3", "page=2", "sort=asc", "q=crawler", "lang=en",
+        "do=edit", "ical=1", "tab_details=1&replytocom=9", "ref=home"]
+    urls = list()
+    for _ in range(count):
+        path = "/".join(rng.choice(segments) for _ in range(rng.randint(0, 4)))
+        url = f"{rng.choice(schemes)}://{rng.choice(hosts)}/{path}"
+        leaf = rng.choice(leaves)
+        if leaf:
+            url = f"{url.rstrip('/')}/{leaf}"
+        query = rng.choice(queries)
+        if query:
+            url = f"{url}?{query}"
+        urls.append(url)
+    return urls
+
+
+def timed(check, urls):
+    start = time.perf_counter()
+    decisions = [check(url) for url in urls]
+    return decisions, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark and cross-check scraper.is_valid.")
+    parser.add_argument("--urls-file", help="File with one url per line")
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.urls_file:
+        with open(args.urls_file, "r", encoding="utf-8") as file:
+            urls = [line.strip() for line in file if line.strip()]
+    else:
+        urls = synthetic_urls(args.count)
+
+    old, old_time = timed(legacy_is_valid, urls)
+    new, new_time = timed(scraper.is_valid, urls)
+    print(f"legacy: {len(urls) / old_time:12.0f} urls/s")
+    print(f"filter: {len(urls) / new_time:12.0f} urls/s "
+          f"({old_time / new_time:.1f}x)")
+
+    unexpected = 0
+    for url, before, after in zip(urls, old, new):
+        if before == after or intended_difference(url, before, after):
+            continue
+        unexpected += 1
+        print(f"mismatch: {url} legacy={before} filter={after} "
+              f"({scraper.is_valid_reason(url)})")
+    print(f"{unexpected} unexpected mismatches over {len(urls)} urls")
+    sys.exit(1 if unexpected else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 from utils import get_logger
+from utils.metrics import metrics, MetricsExporter
+import scraper
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from crawler.controller import ConcurrencyController
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
@@ -9,18 +12,41 @@ class Crawler(object):
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
+        self.controller = None
+        self.exporter = MetricsExporter(
+            metrics, config.metrics_file, config.metrics_interval,
+            config.metrics_port)
 
     def start_async(self):
+        self.exporter.start()
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier)
-            for worker_id in range(self.config.threads_count)]
+            for worker_id in range(
+                max(self.config.threads_count, self.config.max_threads))]
+        if self.config.max_threads:
+            # Only as many of them download at once as the controller lets.
+            self.controller = ConcurrencyController(self.frontier, self.config)
+            self.controller.start()
         for worker in self.workers:
             worker.start()
 
     def start(self):
         self.start_async()
-        self.join()
+        try:
+            self.join()
+        except KeyboardInterrupt:
+            # The workers are daemon threads and die with the process, the
+            # urls they were fetching are in the checkpoint to fetch again.
+            self.logger.info("Interrupted, writing the checkpoint.")
+            self.frontier.close()
+            raise
 
     def join(self):
         for worker in self.workers:
             worker.join()
+        if self.controller is not None:
+            self.controller.stop()
+        self.frontier.close()
+        scraper.word_stats.close()
+        scraper.crawl_records.close()
+        self.exporter.stop()
@@ -0,0 +1,94 @@
+import os
+import struct
+from io import BytesIO
+from zlib import crc32
+from array import array
+from collections import namedtuple
+
+from utils.seen import SeenSet
+
+# magic, urls in the save file, completed urls, save log generation and
+# events, hosts with pending urls
+HEADER = struct.Struct("<8sQQQQQ")
+FOOTER = struct.Struct("<I")
+MAGIC = b"CRAWLCK2"
+
+# discovered and completed are the save file counts the checkpoint matches,
+# position the save's position() when it was taken, so the events saved
+# after it can be replayed. pending lists (host, urls) for the urls still to
+# download, handed out ones first, so restoring needs no urlparse. seen is
+# the frontier's SeenSet, visited the one of scraper.visited_urls.
+Checkpoint = namedtuple(
+    "Checkpoint",
+    ["discovered", "completed", "position", "pending", "seen", "visited"])
+
+
+def write_checkpoint(path, checkpoint):
+    ''' Writes checkpoint to path atomically, followed by a CRC32 of it. '''
+    buffer = BytesIO()
+    # Each host followed by its urls, one length per string.
+    strings = list()
+    for host, urls in checkpoint.pending:
+        strings.append(host)
+        strings.extend(urls)
+    encoded = [string.encode("utf-8", "surrogatepass") for string in strings]
+    buffer.write(HEADER.pack(
+        MAGIC, checkpoint.discovered, checkpoint.completed,
+        *checkpoint.position, len(checkpoint.pending)))
+    buffer.write(
+        array("I", (len(urls) for _, urls in checkpoint.pending)).tobytes())
+    buffer.write(array("I", map(len, encoded)).tobytes())
+    buffer.write(b"".join(encoded))
+    checkpoint.seen.write(buffer)
+    checkpoint.visited.write(buffer)
+    data = buffer.getbuffer()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as file:
+        file.write(data)
+        file.write(FOOTER.pack(crc32(data)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path):
+    ''' The Checkpoint at path in one sequential read, or None if there is
+    none or it is damaged. '''
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        data = file.read()
+    body = memoryview(data)[:-FOOTER.size]
+    if (len(data) < HEADER.size + FOOTER.size
+            or FOOTER.unpack_from(data, len(body))[0] != crc32(body)):
+        return None
+    try:
+        (magic, discovered, completed, generation, events,
+         count) = HEADER.unpack_from(body)
+        if magic != MAGIC:
+            return None
+        offset = HEADER.size
+        counts = array("I")
+        counts.frombytes(body[offset:offset + counts.itemsize * count])
+        offset += counts.itemsize * count
+        lengths = array("I")
+        total = count + sum(counts)
+        lengths.frombytes(body[offset:offset + lengths.itemsize * total])
+        offset += lengths.itemsize * total
+        strings = list()
+        for length in lengths:
+            strings.append(str(
+                body[offset:offset + length], "utf-8", "surrogatepass"))
+            offset += length
+        pending = list()
+        start = 0
+        for urls in counts:
+            pending.append(
+                (strings[start], strings[start + 1:start + 1 + urls]))
+            start += 1 + urls
+        seen, offset = SeenSet.from_buffer(body, offset)
+        visited, offset = SeenSet.from_buffer(body, offset)
+    except ValueError:
+        return None
+    return Checkpoint(
+        discovered, completed, (generation, events), pending, seen, visited)
@@ -0,0 +1,92 @@
+import os
+import time
+from threading import Thread, Event
+
+from utils import get_logger
+from utils.metrics import metrics
+
+# Over SLOWED_SHARE of the fetches slowed down compared to their host's
+# fastest (see utils.pacing) means the cache server is overloaded, a
+# process using over CPU_BUSY of a core means the workers wait on the GIL,
+# not on downloads. Either halves the limit.
+SLOWED_SHARE = 0.5
+CPU_BUSY = 0.9
+DECREASE = 0.5
+
+
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system
+
+
+class ConcurrencyController(Thread):
+    ''' Sets how many downloads the frontier lets run at once, from
+    THREADCOUNT * INFLIGHT at the start up to MAXTHREADS * INFLIGHT, with
+    additive increase and multiplicative decrease.
+
+    Every control_interval seconds it looks at how many fetches took
+    much longer than usual for their host, the CPU the process used and
+    the hosts past their politeness delay that no worker was free to
+    fetch. Slow hosts alone do not count against the cache server. The
+    limit drops by half when most fetches were slowed down or the process
+    is CPU bound, and grows by one when the limit held back downloads
+    while hosts were waiting. After a decrease it waits an interval for
+    the downloads over the new limit to finish. '''
+    def __init__(self, frontier, config):
+        self.logger = get_logger("CONTROLLER")
+        self.frontier = frontier
+        self.interval = config.control_interval
+        self.limit = max(1, config.max_threads * config.max_in_flight)
+        self.stopped = Event()
+        frontier.concurrency = max(
+            1, min(self.limit, config.threads_count * config.max_in_flight))
+        metrics.gauge("concurrency", lambda: self.frontier.concurrency)
+        super().__init__(daemon=True, name="Controller")
+
+    def _counts(self):
+        frontier = self.frontier
+        with frontier.lock:
+            return (frontier.fetches, frontier.slowed_fetches,
+                    frontier.throttled)
+
+    def run(self):
+        counts = self._counts()
+        cpu, wall = cpu_seconds(), time.monotonic()
+        hold = False
+        while not self.stopped.wait(self.interval):
+            now_counts = self._counts()
+            now_cpu, now_wall = cpu_seconds(), time.monotonic()
+            signals = [now - then for now, then in zip(now_counts, counts)]
+            signals += [
+                (now_cpu - cpu) / max(now_wall - wall, 1e-9),
+                self.frontier.ready_backlog()]
+            counts, cpu, wall = now_counts, now_cpu, now_wall
+            if hold:
+                hold = False
+                continue
+            current = self.frontier.concurrency
+            limit = self.adjust(current, *signals)
+            if limit != current:
+                self.logger.info(
+                    f"{'Raised' if limit > current else 'Lowered'} the "
+                    f"downloads at once from {current} to {limit}.")
+                self.frontier.set_concurrency(limit)
+                hold = limit < current
+
+    def adjust(self, current, fetches, slowed, throttled, cpu, backlog):
+        ''' The limit following current, given the downloads timed in the
+        last interval and how many of them were slowed down, how often the
+        limit held back a download, the share of a core used and the hosts
+        waiting for a worker. '''
+        if not fetches:
+            return current
+        if slowed > SLOWED_SHARE * fetches or cpu > CPU_BUSY:
+            metrics.count("concurrency_decreases")
+            return max(1, int(current * DECREASE))
+        if throttled and backlog:
+            return min(self.limit, current + 1)
+        return current
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
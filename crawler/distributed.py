@@ -0,0 +1,449 @@
+import time
+import heapq
+from zlib import crc32
+from threading import Thread, Event
+from argparse import ArgumentParser
+
+from spacetime import Dataframe
+
+from utils import get_logger, get_urlhash, normalize
+from utils.seen import SeenSet
+from utils.metrics import metrics
+from utils.pcc_models import CrawlNode, HostPartition, UrlBatch
+from crawler import Crawler
+from crawler.frontier import Frontier
+from crawler.shard import shard_of
+import scraper
+
+TYPES = [CrawlNode, HostPartition, UrlBatch]
+# Host partitions of a new dataframe, a few per node so they can be spread
+# evenly, and seconds between two syncs of a node with the dataframe. Each
+# pull and push copies the whole state a few times, so syncs are kept rare.
+PARTITIONS = 64
+SYNC_INTERVAL = 1.0
+# Seconds a lease or a heartbeat lasts without being renewed. A node not
+# heard from for that long counts as dead and its partitions as free.
+# Leases are renewed once half of it is left.
+LEASE = 10.0
+# Seconds a claim of a partition has to stand before its hosts are fetched.
+# A claim counts only if it was pushed within CLAIM_WAIT / 2 of the pull
+# that showed the partition free, so any other claim made at the same time
+# has landed by then.
+CLAIM_WAIT = 2 * SYNC_INTERVAL
+
+
+def serve_dataframe(port=0, partitions=PARTITIONS):
+    ''' The dataframe the nodes of a distributed crawl share, served from
+    threads of this process, with partitions unowned HostPartitions.
+    dataframe.details is its (host, port). '''
+    dataframe = Dataframe("crawl-dataframe", TYPES, server_port=port)
+    dataframe.add_many(
+        HostPartition, [HostPartition(n) for n in range(partitions)])
+    dataframe.commit()
+    return dataframe
+
+
+def preference(node_id, partition):
+    # Rendezvous order, so nodes claiming at once mostly want different
+    # partitions.
+    return crc32(f"{node_id}/{partition}".encode("utf-8"))
+
+
+class DistributedFrontier(Frontier):
+    ''' The frontier of one node of a crawl shared through a spacetime
+    dataframe: the hosts with shard_of(host, partitions) in a partition
+    the node holds the lease of.
+
+    Every SYNC_INTERVAL a thread pulls the dataframe, queues the urls of
+    the UrlBatches of the node's partitions and acknowledges them, appends
+    the urls found since for other partitions to the node's UrlBatches,
+    and renews the node's heartbeat and leases. Objects are never deleted,
+    as spacetime fails to merge versions that create and delete an object
+    while other nodes change others. It claims free or expired partitions
+    until the node holds its share, the partitions over the live nodes
+    rounded up, and releases those above it. Of two nodes claiming a
+    partition at once the last push wins, so a claim is only held, and its
+    hosts fetched, once a pull started CLAIM_WAIT after its push still shows
+    it. A claim pushed later than CLAIM_WAIT / 2 after the pull it was made
+    on may have overwritten a claim already held, and is given up instead.
+    A released partition is not fetched from as soon as it is released, and
+    none is once the leases the node last pushed have expired, if it could
+    not renew them. The queued urls of a partition the node lost are handed
+    off to its new owner in UrlBatches too.
+
+    The crawl is over once a pull shows every live node idle and no url
+    of a UrlBatch unacknowledged. Urls a dead node had queued are lost,
+    those sent to its partitions after it took them last are not. '''
+    def __init__(self, config, restart, node_id, address):
+        self.node_id = node_id
+        self.dataframe = Dataframe(
+            f"crawler-{node_id}", TYPES, details=address)
+        self.partitions = len(self.dataframe.read_all(HostPartition))
+        if not self.partitions:
+            raise RuntimeError(f"No host partitions in the dataframe {address}.")
+        node = self.dataframe.read_one(CrawlNode, node_id)
+        if node is None:
+            self.dataframe.add_one(CrawlNode, CrawlNode(node_id))
+        else:
+            node.stopped = False
+        # Partitions held as of the last pull, the claims not held yet with
+        # the time they were pushed (None until then, or if it took too
+        # long), the expiry of the leases pushed, urls for the others, and
+        # the last sequence queued of each UrlBatch.
+        self.owned = set()
+        self.claims = dict()
+        self.lease_end = float("inf")
+        self.outbox = dict()
+        self.acks = dict(node.acks if node is not None else ())
+        # Urls already sent away, so each goes to its owner only once.
+        self.forwarded = SeenSet()
+        # Urlhashes of the queued urls handed off, queued again if they
+        # come back.
+        self.handed_off = set()
+        self.fetched = 0
+        self.synced = Event()
+        self.done = Event()
+        super().__init__(config, restart)
+        metrics.gauge("partitions", lambda: len(self.owned))
+        self.syncer = Thread(target=self._run_sync, daemon=True)
+        self.syncer.start()
+
+    def add_url(self, url, parent=None):
+        url = normalize(url)
+        partition = shard_of(scraper.get_full_domain(url), self.partitions)
+        with self.lock:
+            if partition in self.owned:
+                super().add_url(url, parent)
+            elif self.forwarded.add(url):
+                # The owner scores it with the depth and parent word count.
+                self.outbox.setdefault(partition, list()).append(
+                    [url, *self._link_context(parent)])
+
+    def get_tbd_url(self, block=True):
+        ''' Like Frontier.get_tbd_url, but starts after the first sync and,
+        out of urls, waits until the crawl is over or urls arrive. '''
+        while not self.done.is_set():
+            if not self.synced.is_set() or time.time() >= self.lease_end:
+                # Until the next sync renews the leases, another node may
+                # take the partitions over.
+                if not block:
+                    return None
+                self.synced.wait(SYNC_INTERVAL)
+                continue
+            url = super().get_tbd_url(block)
+            if url or not block:
+                return url
+            with self.lock:
+                if not self._idle():
+                    continue
+                self.has_work.wait(SYNC_INTERVAL)
+        return None
+
+    def mark_url_complete(self, url):
+        with self.lock:
+            super().mark_url_complete(url)
+            self.fetched += 1
+
+    def _idle(self):
+        return not (
+            self.queued or self.in_flight or self.scheduled_hosts or self.outbox)
+
+    def _run_sync(self):
+        while not self.done.is_set():
+            start = time.monotonic()
+            try:
+                with metrics.timer("sync"):
+                    self._sync()
+            except Exception as e:
+                self.logger.error(f"Sync with the dataframe failed: {e}")
+            self.done.wait(max(0.0, SYNC_INTERVAL - (time.monotonic() - start)))
+
+    def _sync(self):
+        dataframe = self.dataframe
+        pulled = time.monotonic()
+        dataframe.pull()
+        now = time.time()
+        with self.lock:
+            owned = self._held(pulled)
+            if owned != self.owned or not self.synced.is_set():
+                self.owned = owned
+                self._hand_off()
+                self.synced.set()
+            acked = self._acked()
+            if self._idle() and self._finished(now, acked):
+                self.done.set()
+                self.has_work.notify_all()
+                return
+            self._receive(acked)
+            claimed, released, lease_end = self._lease(now)
+            if released & self.owned:
+                # Not fetched from any more, whoever takes them over.
+                self.owned -= released
+                self._hand_off()
+            self._flush(acked)
+            node = dataframe.read_one(CrawlNode, self.node_id)
+            node.heartbeat = now
+            node.fetched = self.fetched
+            node.acks = [list(ack) for ack in self.acks.items()]
+            # Taken with the urls above, so no url is in neither.
+            node.idle = self._idle()
+        dataframe.commit()
+        dataframe.push()
+        pushed = time.monotonic()
+        with self.lock:
+            self.lease_end = lease_end
+            if pushed - pulled <= CLAIM_WAIT / 2:
+                for partition in claimed:
+                    if partition in self.claims:
+                        self.claims[partition] = pushed
+
+    def _held(self, pulled):
+        # The partitions this node holds as of the pull started at pulled:
+        # those it owns, but for claims pushed less than CLAIM_WAIT before.
+        held = set()
+        for partition in self.dataframe.read_all(HostPartition):
+            number = partition.partition
+            if partition.owner != self.node_id:
+                # Claimed by another node, or never pushed.
+                self.claims.pop(number, None)
+            elif number not in self.claims:
+                held.add(number)
+            elif (self.claims[number] is not None
+                    and pulled - self.claims[number] >= CLAIM_WAIT):
+                del self.claims[number]
+                held.add(number)
+        return held
+
+    def _finished(self, now, acked):
+        # Every live node idle and every url sent queued by its owner.
+        live = [
+            node for node in self.dataframe.read_all(CrawlNode)
+            if not node.stopped and node.heartbeat > now - LEASE]
+        return all(node.idle for node in live) and all(
+            batch.sequence <= acked.get(batch.batch_id, 0)
+            for batch in self.dataframe.read_all(UrlBatch))
+
+    def _acked(self):
+        # batch_id -> the last sequence some node queued.
+        acked = dict()
+        for node in self.dataframe.read_all(CrawlNode):
+            for batch_id, sequence in node.acks:
+                acked[batch_id] = max(acked.get(batch_id, 0), sequence)
+        return acked
+
+    def _receive(self, acked):
+        # Queues the urls of the partitions held no node queued yet.
+        received = 0
+        for batch in self.dataframe.read_all(UrlBatch):
+            if batch.partition not in self.owned:
+                continue
+            last = max(
+                acked.get(batch.batch_id, 0), self.acks.get(batch.batch_id, 0))
+            if batch.sequence <= last:
+                continue
+            for sequence, url, depth, parent_words in batch.urls:
+                if sequence <= last:
+                    continue
+                received += 1
+                urlhash = get_urlhash(url)
+                if urlhash in self.handed_off:
+                    self.handed_off.discard(urlhash)
+                    self.save.discover(urlhash, url)
+                    self._enqueue(url, depth, 1 if depth else 0, parent_words)
+                else:
+                    self._discover(url, depth, parent_words)
+            self.acks[batch.batch_id] = batch.sequence
+        metrics.count("urls_received", received)
+
+    def _flush(self, acked):
+        # Appends the outbox to this node's UrlBatches, dropping the urls
+        # acknowledged since the last time.
+        sent = 0
+        batches = dict(
+            (batch.partition, batch)
+            for batch in self.dataframe.read_all(UrlBatch)
+            if batch.sender == self.node_id)
+        for partition in set(batches) | set(self.outbox):
+            batch = batches.get(partition)
+            if batch is None:
+                batch = UrlBatch(self.node_id, partition)
+                self.dataframe.add_one(UrlBatch, batch)
+            last = acked.get(batch.batch_id, 0)
+            urls = [entry for entry in batch.urls if entry[0] > last]
+            new = self.outbox.get(partition, ())
+            if len(urls) == len(batch.urls) and not new:
+                continue
+            sequence = batch.sequence
+            for url, depth, parent_words in new:
+                sequence += 1
+                urls.append([sequence, url, depth, parent_words])
+            batch.urls = urls
+            batch.sequence = sequence
+            sent += len(new)
+        self.outbox = dict()
+        metrics.count("urls_sent", sent)
+
+    def _lease(self, now):
+        # Renews the leases held, then claims or releases partitions until
+        # this node holds its share. Returns the partitions claimed, those
+        # released and when the first lease left ends.
+        partitions = self.dataframe.read_all(HostPartition)
+        live = 1 + sum(
+            1 for node in self.dataframe.read_all(CrawlNode)
+            if node.node_id != self.node_id and not node.stopped
+            and node.heartbeat > now - LEASE)
+        share = -(-len(partitions) // live)
+        mine = list()
+        released = set()
+        for partition in partitions:
+            if partition.owner != self.node_id:
+                continue
+            if self.claims.get(partition.partition, 0) is None:
+                # Pushed too late to count.
+                del self.claims[partition.partition]
+                released.add(partition.partition)
+                partition.owner = ""
+                partition.expires = 0.0
+                continue
+            mine.append(partition)
+            if partition.expires < now + LEASE / 2:
+                partition.expires = now + LEASE
+        order = lambda partition: preference(self.node_id, partition.partition)
+        for partition in sorted(mine, key=order)[share:]:
+            self.claims.pop(partition.partition, None)
+            released.add(partition.partition)
+            partition.owner = ""
+            partition.expires = 0.0
+        mine = sorted(mine, key=order)[:share]
+        free = [
+            partition for partition in partitions
+            if (not partition.owner or partition.expires < now)
+            and partition.partition not in released]
+        claimed = set()
+        for partition in sorted(free, key=order)[:max(0, share - len(mine))]:
+            partition.owner = self.node_id
+            partition.expires = now + LEASE
+            self.claims[partition.partition] = None
+            claimed.add(partition.partition)
+        lease_end = min(
+            (partition.expires for partition in mine
+             if partition.partition in self.owned), default=float("inf"))
+        return claimed, released, lease_end
+
+    def _hand_off(self):
+        ''' Moves the queued urls of the hosts outside the partitions held
+        to the outbox, marking them complete in the save file. '''
+        handed_off = 0
+        for host in list(self.to_be_downloaded):
+            partition = shard_of(host, self.partitions)
+            if partition in self.owned:
+                continue
+            queue = self.to_be_downloaded.pop(host)
+            self.queued -= len(queue)
+            self.in_memory -= len(queue.entries)
+            outbox = self.outbox.setdefault(partition, list())
+            for context in queue.contexts():
+                urlhash = get_urlhash(context.url)
+                self.save.complete(urlhash, context.url)
+                self.handed_off.add(urlhash)
+                outbox.append([context.url, context.depth, context.parent_words])
+            handed_off += len(queue)
+            queue.discard()
+        if not handed_off:
+            return
+        # Hosts left with nothing to fetch come off the heaps.
+        waiting = lambda host: (
+            host in self.to_be_downloaded or self.robots.has_sitemaps(host))
+        self.ready_hosts = [
+            entry for entry in self.ready_hosts if waiting(entry[1])]
+        self.eligible_hosts = [
+            entry for entry in self.eligible_hosts if waiting(entry[2])]
+        heapq.heapify(self.ready_hosts)
+        heapq.heapify(self.eligible_hosts)
+        self.scheduled_hosts = set(
+            [host for _, host in self.ready_hosts]
+            + [host for _, _, host in self.eligible_hosts])
+        metrics.count("urls_handed_off", handed_off)
+        self.logger.info(
+            f"Handed off {handed_off} queued urls, holding "
+            f"{len(self.owned)} of {self.partitions} partitions.")
+
+    def close(self):
+        ''' Stops syncing, then gives up the leases and sends the urls left
+        for other partitions, so the other nodes need not wait them out. '''
+        self.done.set()
+        self.syncer.join()
+        dataframe = self.dataframe
+        dataframe.pull()
+        with self.lock:
+            self._flush(self._acked())
+            for partition in dataframe.read_all(HostPartition):
+                if partition.owner == self.node_id:
+                    partition.owner = ""
+                    partition.expires = 0.0
+            node = dataframe.read_one(CrawlNode, self.node_id)
+            node.fetched = self.fetched
+            node.stopped = True
+        dataframe.commit()
+        dataframe.push()
+        super().close()
+
+
+class DistributedCrawler(Crawler):
+    ''' One node of a crawl shared through the dataframe at address, see
+    DistributedFrontier. Same start/join interface as Crawler. Nodes on
+    one machine need their own node_id, which names their save file,
+    SAVE.<node_id>, and their metrics file. '''
+    def __init__(self, config, restart, node_id, address):
+        config.save_file = f"{config.save_file}.{node_id}"
+        if config.metrics_file:
+            config.metrics_file = f"{config.metrics_file}.{node_id}"
+        super().__init__(
+            config, restart, frontier_factory=lambda config, restart:
+                DistributedFrontier(config, restart, node_id, address))
+
+    def join(self):
+        for worker in self.workers:
+            worker.join()
+        if self.controller is not None:
+            self.controller.stop()
+        self.frontier.close()
+        # The runs of every node are merged by analyze.py, or the next
+        # crawl that closes its word statistics.
+        scraper.word_stats.flush()
+        scraper.crawl_records.close()
+        self.exporter.stop()
+
+
+def main():
+    parser = ArgumentParser(
+        description="Serve the dataframe of a distributed crawl. Nodes join "
+                    "it with launch.py --dataframe HOST:PORT --node_id ID.")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--partitions", type=int, default=PARTITIONS)
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="Seconds between two progress lines")
+    args = parser.parse_args()
+    logger = get_logger("DATAFRAME")
+    dataframe = serve_dataframe(args.port, args.partitions)
+    logger.info(
+        f"Serving {args.partitions} host partitions on port {args.port}.")
+    try:
+        while True:
+            time.sleep(args.interval)
+            dataframe.checkout()
+            now = time.time()
+            nodes = dataframe.read_all(CrawlNode)
+            live = [
+                node for node in nodes
+                if not node.stopped and node.heartbeat > now - LEASE]
+            logger.info(
+                f"{len(live)} live nodes, "
+                f"{sum(node.fetched for node in nodes)} urls fetched, "
+                f"{len(dataframe.read_all(UrlBatch))} batches waiting.")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,65 @@
 import os
-import shelve
+import time
+import heapq
+import shutil
 
-from threading import Thread, RLock
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
 
 from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from scraper import (
+    is_valid, get_full_domain, near_duplicates, visited_urls, word_stats,
+    traps, page_words, response_gate)
+from crawler.hostqueue import HostQueue, SPILL_CHUNK
+from crawler.scoring import UrlContext, get_scorer
+from crawler.store import open_store, delete_store
+from crawler.checkpoint import Checkpoint, read_checkpoint, write_checkpoint
+from utils.seen import SeenSet, urlhash_digest
+from utils.robots import RobotsPolicy
+from utils.archive import ResponseArchive
+from utils.retry import RetryPolicy
+from utils.pacing import HostPacer
+from utils.metrics import metrics
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        
+        # One HostQueue of urls per host, lowest score first, a heap of
+        # (ready_time, host) for the hosts that have urls waiting and are
+        # not being fetched, and a heap of (score, order, host) for those
+        # of them past their politeness delay, best next url first.
+        self.to_be_downloaded = dict()
+        self.ready_hosts = list()
+        self.eligible_hosts = list()
+        self.scheduled_hosts = set()
+        self.scorer = get_scorer(config.scorer)
+        self.queued = 0
+        self.in_memory = 0
+        self.order = 0
+        # The host and depth of each url handed out and not yet released.
+        self.in_flight = dict()
+        self.depths = dict()
+        self.busy_hosts = set()
+        self.next_fetch = dict()
+        self.host_fetched = dict()
+        # The downloads timed so far and how many of them took unusually
+        # long for their host, how often a url was held back by the limit
+        # on urls in flight set by the controller (0 for none). The pacer
+        # stretches host delays.
+        self.fetches = 0
+        self.slowed_fetches = 0
+        self.throttled = 0
+        self.concurrency = 0
+        self.pacer = HostPacer(
+            config.host_latency_factor, config.max_host_delay)
+        # Queues over config.queue_memory urls spill their tails here.
+        self.spill_dir = f"{config.save_file}.spill"
+        self.spill_runs = 0
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        self.lock = RLock()
+        self.has_work = Condition(self.lock)
+
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
@@ -22,51 +69,468 @@ class Frontier(object):
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            delete_store(self.config.save_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = open_store(self.config)
+        self.checkpoint_file = f"{self.config.save_file}.ckpt"
+        self.traps_file = f"{self.config.save_file}.traps"
+        self.skips_file = f"{self.config.save_file}.skips"
+        # robots.txt rules and sitemaps, fetched like pages.
+        self.robots_file = f"{self.config.save_file}.robots"
+        self.robots = RobotsPolicy(
+            self.config.user_agent, self.config.robots_expiry,
+            obey=self.config.obey_robots, sitemaps=self.config.sitemaps)
+        if not restart and os.path.exists(self.robots_file):
+            self.robots.read(self.robots_file)
+        # Downloads that failed and are tried again after a backoff: a heap
+        # of (due time, url, host, depth), counted in queued, and a circuit
+        # breaker per host that holds back its next fetch.
+        self.retry_file = f"{self.config.save_file}.retries"
+        self.retries = RetryPolicy(
+            self.config.max_retries, self.config.retry_delay,
+            self.config.retry_max_delay, self.config.breaker_failures,
+            self.config.breaker_cooldown, self.config.breaker_limit)
+        self.retry_heap = list()
+        if not restart and os.path.exists(self.retry_file):
+            self.retries.read(self.retry_file)
+            for host in self.retries.hosts:
+                self.next_fetch[host] = (
+                    time.monotonic() + self.retries.wait(host))
+        # The pages scraped, kept for replay.py, in segments named after
+        # the save file so crawl processes can share the directory.
+        self.archive = None
+        if self.config.archive_dir:
+            self.archive = ResponseArchive(
+                self.config.archive_dir,
+                os.path.basename(self.config.save_file),
+                self.config.archive_compression, self.config.archive_segment)
+        traps.configure(
+            self.config.trap_budget, self.config.trap_low_value,
+            self.config.trap_samples, self.config.trap_repeats)
+        response_gate.configure(
+            self.config.max_page_bytes, self.config.parse_bytes)
+        self.last_checkpoint = time.monotonic()
+        self.checkpoint_position = self.save.position()
+        near_duplicates.open(
+            f"{self.config.save_file}.simhash", self.config.simhash_distance)
         if restart:
+            self.seen = SeenSet()
             for url in self.config.seed_urls:
                 self.add_url(url)
-        else:
+        elif not self._restore_checkpoint():
             # Set the frontier state with contents of save file.
+            self.seen = self._load_seen()
             self._parse_save_file()
             if not self.save:
                 for url in self.config.seed_urls:
                     self.add_url(url)
 
+        metrics.gauge("queued", lambda: self.queued)
+        metrics.gauge("queued_in_memory", lambda: self.in_memory)
+        metrics.gauge("in_flight", lambda: len(self.in_flight))
+        metrics.gauge("hosts", lambda: len(self.to_be_downloaded))
+        metrics.gauge("host_backlog", self.host_backlog)
+        metrics.gauge("retry_pending", lambda: len(self.retry_heap))
+        metrics.gauge("breakers_open", self.retries.open_breakers)
+        metrics.gauge(
+            "hosts_slowed", lambda: self.pacer.slowed(self.config.time_delay))
+
+    def host_backlog(self, top=10):
+        ''' {host: queued urls} of the top hosts with the most queued. '''
+        with self.lock:
+            sizes = [
+                (len(queue), host)
+                for host, queue in self.to_be_downloaded.items()]
+        return dict((host, size) for size, host in heapq.nlargest(top, sizes))
+
+    def ready_backlog(self):
+        ''' The number of hosts past their politeness delay that wait for
+        a worker to fetch from them. '''
+        now = time.monotonic()
+        with self.lock:
+            return len(self.eligible_hosts) + sum(
+                1 for ready, _ in self.ready_hosts if ready <= now)
+
+    def set_concurrency(self, limit):
+        ''' Lets at most limit urls be in flight at once, 0 for any. '''
+        with self.lock:
+            self.concurrency = limit
+            self.has_work.notify_all()
+
+    def _load_seen(self):
+        # The digests of every url in the save file, so add_url never has
+        # to ask the save file.
+        seen = SeenSet(2 * len(self.save))
+        for urlhash in self.save.keys():
+            seen.add_digest(urlhash_digest(urlhash))
+        return seen
+
+    def _restore_checkpoint(self):
+        ''' Loads the queue and the seen urls from the checkpoint instead of
+        rescanning the save file. The urls the save log discovered and
+        completed after the checkpoint are applied to them, so a crawl
+        killed between two checkpoints restarts from the last one too.
+        Without the log to replay, the checkpoint has to match the save
+        file. '''
+        checkpoint = read_checkpoint(self.checkpoint_file)
+        if checkpoint is None:
+            return False
+        events = self.save.events_after(checkpoint.position)
+        if events is None:
+            if (checkpoint.discovered != len(self.save)
+                    or checkpoint.completed != self.save.completed):
+                self.logger.info(
+                    f"Checkpoint {self.checkpoint_file} is older than the "
+                    f"save file, rescanning the save file.")
+                return False
+            events = ()
+        # The last event of a url wins, as in the save log.
+        changed = dict(
+            (urlhash, (url, completed)) for urlhash, url, completed in events)
+        completed_since = set(
+            url for url, completed in changed.values() if completed)
+        self.seen = checkpoint.seen
+        visited_urls.restore(checkpoint.visited)
+        with self.lock:
+            # A url is queued once, even if an older checkpoint has it twice.
+            restored = set()
+            for host, urls in checkpoint.pending:
+                for url in urls:
+                    if url not in restored and url not in completed_since:
+                        restored.add(url)
+                        self._enqueue(url, host=host)
+            for urlhash, (url, completed) in changed.items():
+                self.seen.add_digest(urlhash_digest(urlhash))
+                if completed:
+                    # Scraped, or dropped, before the crawl stopped.
+                    visited_urls.add(url)
+                elif url not in restored:
+                    restored.add(url)
+                    self._enqueue(url)
+        self.logger.info(
+            f"Found {self.queued} urls to be downloaded from "
+            f"{len(self.save)} total urls discovered in checkpoint, "
+            f"{len(changed)} of them saved after it.")
+        return True
+
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
         total_count = len(self.save)
         tbd_count = 0
         for url, completed in self.save.values():
             if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
+                self._enqueue(url)
                 tbd_count += 1
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
-    def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+    def _enqueue(self, url, depth=0, inlinks=0, parent_words=0, host=None):
+        if host is None:
+            host = get_full_domain(url)
+        with self.lock:
+            queue = self.to_be_downloaded.get(host)
+            if queue is None:
+                queue = self.to_be_downloaded[host] = HostQueue()
+            self._push(host, queue, UrlContext(
+                url, depth, inlinks, parent_words,
+                self.host_fetched.get(host, 0), self.order))
+            self.queued += 1
+            self._schedule(host)
+            if self.in_memory > self.config.queue_memory:
+                self._spill()
+
+    def _push(self, host, queue, context):
+        self.order += 1
+        before = len(queue.entries)
+        queue.push(self.scorer(context), context)
+        self.in_memory += len(queue.entries) - before
+
+    def _add_inlink(self, url):
+        # Rescores a url still queued in memory that one more page links to.
+        host = get_full_domain(url)
+        queue = self.to_be_downloaded.get(host)
+        entry = queue.get(url) if queue is not None else None
+        if entry is None:
+            return
+        score, context = entry
+        context = context._replace(
+            inlinks=context.inlinks + 1,
+            host_fetched=self.host_fetched.get(host, 0))
+        if self.scorer(context) < score:
+            self._push(host, queue, context._replace(order=self.order))
+        else:
+            queue.entries[url] = (score, context)
+
+    def _spill(self):
+        ''' Moves the worst half of the largest host queues to disk until
+        the urls in memory are down to 3/4 of config.queue_memory. Every
+        host keeps at least SPILL_CHUNK urls in memory. '''
+        os.makedirs(self.spill_dir, exist_ok=True)
+        target = 3 * self.config.queue_memory // 4
+        queues = sorted(
+            self.to_be_downloaded.values(),
+            key=lambda queue: len(queue.entries), reverse=True)
+        for queue in queues:
+            if self.in_memory <= target:
+                break
+            keep = max(SPILL_CHUNK, len(queue.entries) // 2)
+            self.spill_runs += 1
+            before = len(queue.entries)
+            queue.spill(
+                os.path.join(self.spill_dir, f"{self.spill_runs}.run"), keep)
+            self.in_memory += len(queue.entries) - before
+        self.logger.info(
+            f"Spilled url queues to {self.spill_dir}, "
+            f"{self.in_memory} of {self.queued} urls left in memory.")
 
-    def add_url(self, url):
-        url = normalize(url)
+    def _schedule(self, host):
+        # A host goes back on the heap only when it has urls waiting and
+        # no download in flight, so one host is never fetched concurrently.
+        if (host in self.scheduled_hosts or host in self.busy_hosts
+                or not (self.to_be_downloaded.get(host)
+                        or self.robots.has_sitemaps(host))):
+            return
+        heapq.heappush(
+            self.ready_hosts, (self.next_fetch.get(host, 0), host))
+        self.scheduled_hosts.add(host)
+        self.has_work.notify()
+
+    def get_tbd_url(self, block=True):
+        ''' Blocks until some host is allowed to be fetched again, then
+        hands out the url with the lowest score among those hosts. Returns
+        None once nothing is queued and no download is in flight, or, if
+        block is False, as soon as no host is ready. '''
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                while self.retry_heap and self.retry_heap[0][0] <= now:
+                    _, url, host, depth = heapq.heappop(self.retry_heap)
+                    self.queued -= 1
+                    self._enqueue(url, depth, host=host)
+                if self.concurrency and len(self.in_flight) >= self.concurrency:
+                    # Released urls make room again.
+                    self.throttled += 1
+                    if not block:
+                        return None
+                    self.has_work.wait()
+                    continue
+                while self.ready_hosts and self.ready_hosts[0][0] <= now:
+                    _, host = heapq.heappop(self.ready_hosts)
+                    queue = self.to_be_downloaded.get(host)
+                    heapq.heappush(self.eligible_hosts, (
+                        *(queue.head() if queue else (float("-inf"), 0)),
+                        host))
+                if self.eligible_hosts:
+                    start = time.perf_counter()
+                    _, _, host = heapq.heappop(self.eligible_hosts)
+                    self.scheduled_hosts.discard(host)
+                    queue = self.to_be_downloaded.get(host)
+                    if self.retries.is_dead(host):
+                        if queue:
+                            self._drop_host(host, queue)
+                        continue
+                    # The host's robots.txt and sitemaps go first.
+                    special = self.robots.next_url(
+                        host, queue.peek().url if queue else None)
+                    if special is not None:
+                        self.in_flight[special] = host
+                        self.busy_hosts.add(host)
+                        metrics.observe(
+                            "frontier_pop", time.perf_counter() - start)
+                        return special
+                    before = len(queue.entries)
+                    context = queue.pop()
+                    self.in_memory += len(queue.entries) - before
+                    self.queued -= 1
+                    if not queue:
+                        del self.to_be_downloaded[host]
+                    url = context.url
+                    if (traps.is_wasteful(url)
+                            or not self.robots.allowed(url, host)):
+                        # Queued before its pattern turned out a trap, or
+                        # before the robots.txt of its host arrived.
+                        self.save.complete(get_urlhash(url), url)
+                        self._schedule(host)
+                        metrics.count("dropped_queued")
+                        continue
+                    self.in_flight[url] = host
+                    self.depths[url] = context.depth
+                    self.busy_hosts.add(host)
+                    self.host_fetched[host] = self.host_fetched.get(host, 0) + 1
+                    metrics.observe("frontier_pop", time.perf_counter() - start)
+                    return url
+                waiting = [
+                    heap[0][0] for heap in (self.ready_hosts, self.retry_heap)
+                    if heap]
+                if waiting:
+                    if not block:
+                        return None
+                    self.has_work.wait(min(waiting) - now)
+                elif self.in_flight and block:
+                    # Urls in flight may still add new urls to the frontier.
+                    self.has_work.wait()
+                else:
+                    self.has_work.notify_all()
+                    return None
+
+    def _drop_host(self, host, queue):
+        # Completes the queued urls of a host whose breaker gave up on it.
+        dropped = len(queue)
+        del self.to_be_downloaded[host]
+        self.queued -= dropped
+        self.in_memory -= len(queue.entries)
+        for context in queue.contexts():
+            self.save.complete(get_urlhash(context.url), context.url)
+        queue.discard()
+        metrics.count("dropped_dead_host", dropped)
+        self.logger.warning(
+            f"Dropped {dropped} queued urls of {host}, which keeps failing.")
+
+    def add_url(self, url, parent=None):
+        ''' Queues url unless it was seen before. parent is the url of the
+        page it was found on, if any, for the scorer. '''
+        start = time.perf_counter()
+        self._discover(normalize(url), *self._link_context(parent))
+        metrics.observe("admission", time.perf_counter() - start)
+
+    def _link_context(self, parent):
+        # (depth, parent word count) of the urls found on parent.
+        if parent is None:
+            return 0, 0
+        return self.depths.get(parent, 0) + 1, page_words.get(parent, 0)
+
+    def _discover(self, url, depth=0, parent_words=0):
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
+        with self.lock:
+            if self.seen.add_digest(urlhash_digest(urlhash)):
+                host = get_full_domain(url)
+                if traps.admit(url) and self.robots.allowed(url, host):
+                    metrics.count("discovered")
+                    self.save.discover(urlhash, url)
+                    self._enqueue(
+                        url, depth, 1 if depth else 0, parent_words, host)
+            elif depth:
+                self._add_inlink(url)
+
+    def release_url(self, url):
+        ''' Frees the host of a handed out url for its next fetch, after
+        the politeness delay. '''
+        with self.lock:
+            host = self.in_flight.pop(url, None)
+            if host is None:
+                return
+            self.depths.pop(url, None)
+            page_words.pop(url, None)
+            if self.robots.handles(url):
+                self.robots.done(url)
+            self.busy_hosts.discard(host)
+            now = time.monotonic()
+            floor = max(self.config.time_delay, self.robots.crawl_delay(host))
+            self.next_fetch[host] = now + max(
+                self.pacer.delay(host, floor), self.retries.wait(host))
+            self._schedule(host)
+            # Wake waiting workers, the crawl may have just run out of urls.
+            self.has_work.notify_all()
+
+    def record_download(self, url, seconds):
+        ''' Counts the download of a handed out url that took seconds on
+        the cache server, for the host's delay and the controller. Scraping
+        the page is not part of it. '''
+        with self.lock:
+            host = self.in_flight.get(url)
+            if host is None:
+                return
+            self.fetches += 1
+            if self.pacer.observe(host, seconds):
+                self.slowed_fetches += 1
+
+    def retry_url(self, url):
+        ''' Takes back a handed out url whose download failed transiently,
+        to be handed out again after a backoff. Returns False, leaving it
+        handed out, if it is out of retries and should be completed. '''
+        with self.lock:
+            host = self.in_flight.get(url)
+            if host is None:
+                return False
+            delay = self.retries.failed(url, host)
+            self.pacer.failed(host)
+            if delay is None:
+                metrics.count("retries_exhausted")
+                return False
+            heapq.heappush(self.retry_heap, (
+                time.monotonic() + delay, url, host, self.depths.get(url, 0)))
+            self.queued += 1
+            metrics.count("retries")
+            self.release_url(url)
+            return True
+
     def mark_url_complete(self, url):
+        if self.robots.handles(url):
+            # robots.txt and sitemaps are not in the save file.
+            self.release_url(url)
+            return
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        with self.lock:
+            if not self.seen.contains_digest(urlhash_digest(urlhash)):
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            self.retries.succeeded(url, self.in_flight.get(url))
+            self.pacer.succeeded(self.in_flight.get(url))
+            start = time.perf_counter()
+            self.save.complete(urlhash, url)
+            metrics.observe("persist", time.perf_counter() - start)
+            metrics.count("pages")
+            self.release_url(url)
+            # A compacted save log no longer has the events since the last
+            # checkpoint, so a new one is taken right away.
+            if self.config.checkpoint_interval and (
+                    time.monotonic() - self.last_checkpoint
+                    >= self.config.checkpoint_interval
+                    or self.save.position()[0]
+                    != self.checkpoint_position[0]):
+                self.checkpoint()
+
+    def checkpoint(self):
+        ''' Syncs the save file, the signatures and the word counts, then
+        writes the urls to download and the seen urls to the checkpoint. '''
+        with self.lock, metrics.timer("checkpoint"):
+            self.save.sync()
+            near_duplicates.sync()
+            word_stats.flush()
+            traps.write_stats(self.traps_file)
+            response_gate.write_stats(self.skips_file)
+            self.robots.write(self.robots_file)
+            self.retries.write(self.retry_file)
+            pending = dict()
+            for _, url, host, _ in self.retry_heap:
+                pending.setdefault(host, list()).append(url)
+            for url, host in self.in_flight.items():
+                if not self.robots.handles(url):
+                    # robots.txt and sitemaps are fetched again by the policy.
+                    pending.setdefault(host, list()).append(url)
+            for host, queue in self.to_be_downloaded.items():
+                pending.setdefault(host, list()).extend(queue.urls())
+            visited = visited_urls
+            if self.in_flight:
+                # A url in flight may be scraped with its links not all
+                # added yet. Fetched again after a restart, it has to be
+                # scraped again, not skipped as visited.
+                visited = visited_urls.copy()
+                for url in self.in_flight:
+                    visited.discard(url)
+            self.checkpoint_position = self.save.position()
+            write_checkpoint(self.checkpoint_file, Checkpoint(
+                len(self.save), self.save.completed, self.checkpoint_position,
+                list(pending.items()), self.seen, visited))
+            self.last_checkpoint = time.monotonic()
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+    def close(self):
+        with self.lock:
+            self.checkpoint()
+            self.save.close()
+            near_duplicates.close()
+            if self.archive is not None:
+                self.archive.close()
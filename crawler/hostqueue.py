@@ -0,0 +1,137 @@
+import os
+import heapq
+
+from crawler.scoring import UrlContext
+
+# Spilled urls read back at a time, per run file of a host.
+SPILL_CHUNK = 1000
+
+
+class HostQueue(object):
+    ''' The queued urls of one host, lowest score first, with O(log n)
+    push and pop.
+
+    A url pushed again with a better score leaves its old heap entry
+    behind, pop skips it. spill() moves the worst urls to a run file
+    sorted by score, read back SPILL_CHUNK at a time once the urls in
+    memory run out. '''
+    def __init__(self):
+        self.heap = list()
+        # url -> (score, context) of the live heap entries.
+        self.entries = dict()
+        # [path, offset, count] of the spill runs not read back yet.
+        self.runs = list()
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self.entries) + self.spilled
+
+    def __bool__(self):
+        return bool(self.entries) or bool(self.spilled)
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def head(self):
+        ''' (score, order) of the next url. '''
+        while self.heap:
+            score, order, url = self.heap[0]
+            entry = self.entries.get(url)
+            if entry is not None and entry[1].order == order:
+                return score, order
+            heapq.heappop(self.heap)
+        return float("inf"), 0
+
+    def peek(self):
+        ''' The context of the next url, without taking it. '''
+        self.head()
+        return self.entries[self.heap[0][2]][1]
+
+    def push(self, score, context):
+        self.entries[context.url] = (score, context)
+        heapq.heappush(self.heap, (score, context.order, context.url))
+
+    def pop(self):
+        ''' The context of the url with the lowest score. '''
+        while True:
+            if not self.heap:
+                self._load()
+            score, order, url = heapq.heappop(self.heap)
+            entry = self.entries.get(url)
+            if entry is not None and entry[1].order == order:
+                del self.entries[url]
+                if not self.entries and self.spilled:
+                    self._load()
+                return entry[1]
+
+    def spill(self, path, keep):
+        ''' Writes all but the keep best urls in memory to path. Returns
+        how many were written. '''
+        entries = sorted(
+            self.entries.values(), key=lambda entry: (entry[0], entry[1].order))
+        if len(entries) <= keep:
+            return 0
+        with open(path, "w", encoding="utf-8") as file:
+            for score, context in entries[keep:]:
+                file.write(
+                    f"{score!r}\t{context.depth}\t{context.inlinks}\t"
+                    f"{context.parent_words}\t{context.host_fetched}\t"
+                    f"{context.order}\t{context.url}\n")
+        spilled = len(entries) - keep
+        self.runs.append([path, 0, spilled])
+        self.spilled += spilled
+        self.entries = dict(
+            (context.url, (score, context)) for score, context in entries[:keep])
+        self.heap = [
+            (score, context.order, context.url)
+            for score, context in entries[:keep]]
+        return spilled
+
+    def _read_run(self, run, limit=None):
+        path, offset, count = run
+        with open(path, "r", encoding="utf-8") as file:
+            file.seek(offset)
+            while count and limit != 0:
+                fields = file.readline().rstrip("\n").split("\t", 6)
+                count -= 1
+                if limit is not None:
+                    limit -= 1
+                score = float(fields[0])
+                depth, inlinks, words, fetched, order = map(int, fields[1:6])
+                yield score, UrlContext(
+                    fields[6], depth, inlinks, words, fetched, order)
+            run[1] = file.tell()
+        run[2] = count
+
+    def _load(self):
+        # A chunk of every run, so the best spilled urls of each come back.
+        for run in self.runs:
+            for score, context in self._read_run(run, SPILL_CHUNK):
+                self.spilled -= 1
+                self.push(score, context)
+        for run in self.runs:
+            if not run[2]:
+                os.remove(run[0])
+        self.runs = [run for run in self.runs if run[2]]
+
+    def contexts(self):
+        ''' The context of every queued url, the ones in memory in score
+        order first. '''
+        for score, context in sorted(
+                self.entries.values(),
+                key=lambda entry: (entry[0], entry[1].order)):
+            yield context
+        for path, offset, count in self.runs:
+            for score, context in self._read_run([path, offset, count]):
+                yield context
+
+    def urls(self):
+        ''' Every queued url, the ones in memory in score order first. '''
+        for context in self.contexts():
+            yield context.url
+
+    def discard(self):
+        ''' Deletes the spill runs, once the queue is no longer used. '''
+        for path, offset, count in self.runs:
+            os.remove(path)
+        self.runs = list()
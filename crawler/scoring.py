@@ -0,0 +1,59 @@
+import math
+from collections import namedtuple
+
+# What the frontier knows about a url when it queues it: its link depth
+# from the seeds, how many pages linked to it so far, the word count of
+# the page it was found on (0 for seeds and low value pages), how many
+# urls of its host were handed out already, and the order it was queued in.
+UrlContext = namedtuple(
+    "UrlContext",
+    ["url", "depth", "inlinks", "parent_words", "host_fetched", "order"])
+
+# Weights of the default scorer, in units of one link of depth.
+INLINK_WEIGHT = 1.0
+PARENT_WORDS_WEIGHT = 1.0
+PARENT_WORDS_CAP = 2000
+HOST_FETCHED_WEIGHT = 0.001
+
+
+def fifo_score(context):
+    # Ties go to the url queued first.
+    return 0
+
+
+def lifo_score(context):
+    return -context.order
+
+
+def depth_score(context):
+    return context.depth
+
+
+def default_score(context):
+    ''' Breadth first, pulled forward by the pages linking to the url and
+    by a long parent page, pushed back by the pages of its host already
+    fetched so small subdomains are not starved by large ones. '''
+    return (
+        context.depth
+        - INLINK_WEIGHT * math.log2(1 + context.inlinks)
+        - PARENT_WORDS_WEIGHT
+        * min(context.parent_words, PARENT_WORDS_CAP) / PARENT_WORDS_CAP
+        + HOST_FETCHED_WEIGHT * context.host_fetched)
+
+
+# Lower scores are fetched first.
+SCORERS = {
+    "fifo": fifo_score,
+    "lifo": lifo_score,
+    "depth": depth_score,
+    "default": default_score,
+}
+
+
+def get_scorer(name):
+    try:
+        return SCORERS[name.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown scorer {name}, expected one of "
+            f"{', '.join(sorted(SCORERS))}.") from None
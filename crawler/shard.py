@@ -0,0 +1,234 @@
+import time
+import multiprocessing
+from zlib import crc32
+from queue import Empty
+from threading import Thread
+
+from utils import get_logger, normalize
+from utils.seen import SeenSet
+from utils.metrics import metrics, MetricsExporter
+from crawler.frontier import Frontier
+from crawler.store import save_format_of, delete_store
+from crawler.worker import Worker
+from crawler.controller import ConcurrencyController
+import scraper
+
+# Urls for another shard are sent once this many are buffered, or once the
+# oldest buffered one is FLUSH_INTERVAL seconds old.
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 0.5
+
+
+def shard_of(host, processes):
+    ''' Index of the process owning host. Stable across runs and processes,
+    so a host is always fetched, and kept polite, by the same process. '''
+    return crc32(host.encode("utf-8")) % processes
+
+
+def check_shards(save_file, processes, restart):
+    ''' Raises ValueError when resuming a sharded save file with another
+    number of processes. Urls in a shard that no longer owns their host, or
+    in a shard no process opens, would never be fetched. A restart deletes
+    the shards beyond processes instead. '''
+    saved = 0
+    while save_format_of(f"{save_file}.shard{saved}") is not None:
+        saved += 1
+    if restart:
+        for shard in range(processes if processes > 1 else 0, saved):
+            delete_store(f"{save_file}.shard{shard}")
+        return
+    if not saved or saved == processes:
+        return
+    raise ValueError(
+        f"{save_file} was crawled with {saved} processes, not {processes}. "
+        f"Resume with --processes {saved}, or start with --restart.")
+
+
+class ShardCoordinator(object):
+    ''' State shared by all shards to tell when the whole crawl is over:
+    every shard has run out of urls and no batch of urls is on its way.
+
+    pending counts the urls sent and not yet received. Both it and the idle
+    flags only change under one lock, so a shard can not go idle while a
+    batch for it is still in a queue. '''
+    def __init__(self, processes, context=multiprocessing):
+        self.lock = context.Lock()
+        self.idle = context.Array("b", processes, lock=False)
+        self.pending = context.Value("q", 0, lock=False)
+        self.fetched = context.Array("q", processes, lock=False)
+        self.done = context.Event()
+
+    def sent(self, count):
+        with self.lock:
+            self.pending.value += count
+
+    def received(self, shard, count):
+        with self.lock:
+            self.idle[shard] = 0
+            self.pending.value -= count
+
+    def set_idle(self, shard):
+        ''' Marks shard idle. True once the crawl is over. '''
+        with self.lock:
+            self.idle[shard] = 1
+            if self.pending.value == 0 and all(self.idle):
+                self.done.set()
+        return self.done.is_set()
+
+    def total_fetched(self):
+        return sum(self.fetched)
+
+
+class ShardedFrontier(Frontier):
+    ''' The part of the frontier owning the hosts with shard_of(host) ==
+    shard. Urls of other hosts are batched to their owner's inbox; urls
+    arriving in this shard's inbox are added like discovered ones.
+
+    Urls still buffered for another shard when a process dies are lost,
+    the owner only stores them once they arrive. '''
+    def __init__(self, config, restart, shard, inboxes, coordinator):
+        self.shard = shard
+        self.inboxes = inboxes
+        self.coordinator = coordinator
+        self.outbox = [list() for _ in inboxes]
+        self.last_flush = time.monotonic()
+        # Urls already sent away, so each goes to its owner only once.
+        self.forwarded = SeenSet()
+        super().__init__(config, restart)
+        self.receiver = Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def add_url(self, url, parent=None):
+        url = normalize(url)
+        owner = shard_of(scraper.get_full_domain(url), len(self.inboxes))
+        with self.lock:
+            if owner == self.shard:
+                super().add_url(url, parent)
+            elif self.forwarded.add(url):
+                # The owner scores it with the depth and parent word count.
+                self.outbox[owner].append((url, *self._link_context(parent)))
+                if len(self.outbox[owner]) >= BATCH_SIZE:
+                    self._send(owner)
+            if time.monotonic() - self.last_flush > FLUSH_INTERVAL:
+                self._flush()
+
+    def _send(self, owner):
+        batch, self.outbox[owner] = self.outbox[owner], list()
+        self.coordinator.sent(len(batch))
+        self.inboxes[owner].put(batch)
+
+    def _flush(self):
+        for owner, batch in enumerate(self.outbox):
+            if batch:
+                self._send(owner)
+        self.last_flush = time.monotonic()
+
+    def _receive(self):
+        inbox = self.inboxes[self.shard]
+        while not self.coordinator.done.is_set():
+            try:
+                batch = inbox.get(timeout=0.1)
+            except Empty:
+                continue
+            # Held across the whole batch, so this shard can not be found
+            # idle between taking the batch and queueing its urls.
+            with self.lock:
+                self.coordinator.received(self.shard, len(batch))
+                for url, depth, parent_words in batch:
+                    self._discover(url, depth, parent_words)
+
+    def get_tbd_url(self, block=True):
+        ''' Like Frontier.get_tbd_url, but an empty shard only gives up
+        once every shard is empty and no urls are on their way. '''
+        while not self.coordinator.done.is_set():
+            url = super().get_tbd_url(block)
+            if url or not block:
+                return url
+            with self.lock:
+                if self.queued or self.in_flight:
+                    continue
+                self._flush()
+                if self.coordinator.set_idle(self.shard):
+                    self.has_work.notify_all()
+                    return None
+                self.has_work.wait(0.05)
+        return None
+
+    def mark_url_complete(self, url):
+        with self.lock:
+            super().mark_url_complete(url)
+            self.coordinator.fetched[self.shard] += 1
+
+
+def run_shard(config, restart, shard, inboxes, coordinator):
+    ''' Body of one crawl process: a frontier shard and its workers. '''
+    config.save_file = f"{config.save_file}.shard{shard}"
+    frontier = ShardedFrontier(config, restart, shard, inboxes, coordinator)
+    # Each process has its own metrics, file and port.
+    exporter = MetricsExporter(
+        metrics,
+        f"{config.metrics_file}.shard{shard}" if config.metrics_file else None,
+        config.metrics_interval,
+        config.metrics_port + shard if config.metrics_port else 0)
+    exporter.start()
+    workers = [
+        Worker(f"{shard}-{worker_id}", config, frontier)
+        for worker_id in range(max(config.threads_count, config.max_threads))]
+    controller = None
+    if config.max_threads:
+        controller = ConcurrencyController(frontier, config)
+        controller.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if controller is not None:
+        controller.stop()
+    frontier.close()
+    # The parent merges the word counts of every shard.
+    scraper.word_stats.flush()
+    scraper.crawl_records.close()
+    exporter.stop()
+
+
+class ShardedCrawler(object):
+    ''' Runs the crawl in processes processes, each with its own frontier
+    shard (SAVE.shard<n>) and config.threads_count workers, so parsing is
+    not serialized by the GIL. Same start/join interface as Crawler. '''
+    def __init__(self, config, restart, processes):
+        check_shards(config.save_file, processes, restart)
+        self.config = config
+        self.restart = restart
+        self.logger = get_logger("CRAWLER")
+        self.coordinator = ShardCoordinator(processes)
+        self.inboxes = [multiprocessing.Queue() for _ in range(processes)]
+        self.processes = list()
+
+    def start_async(self):
+        self.processes = [
+            multiprocessing.Process(
+                target=run_shard, name=f"Shard-{shard}",
+                args=(self.config, self.restart, shard, self.inboxes,
+                      self.coordinator))
+            for shard in range(len(self.inboxes))]
+        for process in self.processes:
+            process.start()
+
+    def start(self):
+        self.start_async()
+        self.join()
+
+    def join(self):
+        for process in self.processes:
+            while process.is_alive():
+                process.join(1)
+                if any(other.exitcode for other in self.processes):
+                    # A dead shard never goes idle, stop the others too.
+                    self.coordinator.done.set()
+            if process.exitcode:
+                self.logger.error(
+                    f"{process.name} exited with code {process.exitcode}.")
+        self.logger.info(
+            f"Fetched {self.coordinator.total_fetched()} urls "
+            f"in {len(self.processes)} processes.")
+        scraper.word_stats.close()
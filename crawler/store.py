@@ -0,0 +1,270 @@
+import os
+import dbm
+import shelve
+import shutil
+import time
+
+from utils import get_logger
+
+
+def save_format_of(save_file):
+    ''' "shelve" or "log" for an existing save file, None if there is none.
+    A log snapshot is plain text, which dbm does not recognize. '''
+    kind = dbm.whichdb(save_file)
+    if kind:
+        return "shelve"
+    if kind == "" or os.path.exists(f"{save_file}.log"):
+        return "log"
+    return None
+
+
+def open_store(config):
+    ''' Opens the frontier save file with the backend named by SAVEFORMAT,
+    or with the one that wrote it, if the save file exists. '''
+    save_format = config.save_format
+    if save_format not in ("shelve", "log"):
+        raise ValueError(f"Unknown save format {save_format}.")
+    found = save_format_of(config.save_file)
+    if found is not None and found != save_format:
+        get_logger("FRONTIER").warning(
+            f"{config.save_file} was saved as {found}, not {save_format}; "
+            f"resuming it as {found}. Start with --restart to switch.")
+        save_format = found
+    if save_format == "shelve":
+        return ShelveStore(config.save_file)
+    return LogStore(
+        config.save_file, batch_size=config.save_batch,
+        interval=config.save_interval)
+
+
+def delete_store(save_file):
+    ''' Removes every file the crawl may have written next to save_file. '''
+    suffixes = (
+        "", ".log", ".tmp", ".db", ".dir", ".dat", ".bak", ".simhash",
+        ".seen", ".ckpt", ".ckpt.tmp", ".traps",
+        ".skips", ".robots", ".retries")
+    for path in (f"{save_file}{suffix}" for suffix in suffixes):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(f"{save_file}.spill", ignore_errors=True)
+
+
+class ShelveStore(object):
+    ''' The original save format: one shelve entry per url, synced to disk
+    on every change. '''
+    def __init__(self, save_file):
+        self.save = shelve.open(save_file)
+        self.completed = sum(
+            1 for _, completed in self.save.values() if completed)
+
+    def __contains__(self, urlhash):
+        return urlhash in self.save
+
+    def __len__(self):
+        return len(self.save)
+
+    def keys(self):
+        return self.save.keys()
+
+    def values(self):
+        return self.save.values()
+
+    def discover(self, urlhash, url):
+        if self.save.get(urlhash, (url, False))[1]:
+            self.completed -= 1
+        self.save[urlhash] = (url, False)
+        self.save.sync()
+
+    def complete(self, urlhash, url):
+        if not self.save.get(urlhash, (url, False))[1]:
+            self.completed += 1
+        self.save[urlhash] = (url, True)
+        self.save.sync()
+
+    def sync(self):
+        self.save.sync()
+
+    def position(self):
+        # Every change is on disk at once, there is no log to replay.
+        return (0, 0)
+
+    def events_after(self, position):
+        return None
+
+    def close(self):
+        self.save.close()
+
+
+class LogStore(object):
+    ''' Keeps the frontier state in memory and appends discover and complete
+    events to a write-ahead log next to a snapshot file.
+
+    Events are group-committed: they are buffered and written with a single
+    fsync once batch_size events are pending or interval seconds have passed.
+    After compact_every logged events the state is rewritten as a fresh
+    snapshot and the log is truncated. Loading replays snapshot then log,
+    the last event of a url wins: discover() takes a completed url back,
+    as a url handed off and returned in a distributed crawl is.
+
+    Both files start with the generation of the snapshot, counting the
+    compactions. A log of another generation is left over from a crash
+    during compaction and already in the snapshot, so it is skipped.
+    position() is (generation, events logged), for events_after().
+
+    completed is the number of completed urls, as in ShelveStore. '''
+    DISCOVERED = "D"
+    COMPLETED = "C"
+    GENERATION = "G"
+
+    def __init__(self, save_file, batch_size=512, interval=1.0,
+                 compact_every=100000):
+        self.snapshot_file = save_file
+        self.log_file = f"{save_file}.log"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.compact_every = compact_every
+        self.urls = dict()
+        self.pending = list()
+        self.logged = 0
+        self.generation = 0
+        self.last_flush = time.monotonic()
+
+        self._replay(self.snapshot_file)
+        if self._generation_of(self.log_file) == self.generation:
+            self.logged = self._replay(self.log_file)
+            self.log = open(self.log_file, "a", encoding="utf-8")
+            if not self.log.tell():
+                self.log.write(self._record(
+                    self.GENERATION, str(self.generation), ""))
+        else:
+            # Left over from a crash during compaction, in the snapshot.
+            self.log = self._new_log()
+        self.completed = sum(
+            1 for _, completed in self.urls.values() if completed)
+        if not os.path.exists(self.snapshot_file):
+            self._write_snapshot()
+
+    def _read(self, path):
+        # [kind, urlhash, url] of each complete line of path.
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    # Torn write from a crash, the event was never committed.
+                    break
+                yield line[:-1].split("\t", 2)
+
+    def _replay(self, path):
+        # Applies the events of path, returns how many there were.
+        count = 0
+        for kind, urlhash, url in self._read(path):
+            if kind == self.GENERATION:
+                self.generation = int(urlhash)
+                continue
+            self.urls[urlhash] = (url, kind == self.COMPLETED)
+            count += 1
+        return count
+
+    def _generation_of(self, path):
+        # The generation path starts with, 0 if none, that of the
+        # snapshot if there is no such file.
+        for kind, urlhash, _ in self._read(path):
+            return int(urlhash) if kind == self.GENERATION else 0
+        return self.generation
+
+    def _new_log(self):
+        log = open(self.log_file, "w", encoding="utf-8")
+        log.write(self._record(self.GENERATION, str(self.generation), ""))
+        log.flush()
+        return log
+
+    def _write_snapshot(self):
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            file.write(self._record(self.GENERATION, str(self.generation), ""))
+            for urlhash, (url, completed) in self.urls.items():
+                kind = self.COMPLETED if completed else self.DISCOVERED
+                file.write(self._record(kind, urlhash, url))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+
+    def __contains__(self, urlhash):
+        return urlhash in self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    def keys(self):
+        return self.urls.keys()
+
+    def values(self):
+        return self.urls.values()
+
+    def discover(self, urlhash, url):
+        if self.urls.get(urlhash, (url, False))[1]:
+            self.completed -= 1
+        self.urls[urlhash] = (url, False)
+        self._append(self.DISCOVERED, urlhash, url)
+
+    def complete(self, urlhash, url):
+        if not self.urls.get(urlhash, (url, False))[1]:
+            self.completed += 1
+        self.urls[urlhash] = (url, True)
+        self._append(self.COMPLETED, urlhash, url)
+
+    @staticmethod
+    def _record(kind, urlhash, url):
+        # Tabs and newlines would break the line format, hrefs may have them.
+        url = url.replace("\t", "%09").replace("\n", "%0A").replace("\r", "%0D")
+        return f"{kind}\t{urlhash}\t{url}\n"
+
+    def _append(self, kind, urlhash, url):
+        self.pending.append(self._record(kind, urlhash, url))
+        if (len(self.pending) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.interval):
+            self.sync()
+
+    def sync(self):
+        if self.pending:
+            self.log.write("".join(self.pending))
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.logged += len(self.pending)
+            self.pending.clear()
+        self.last_flush = time.monotonic()
+        if self.logged >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        ''' Folds the log into a new snapshot and starts an empty log. '''
+        self.generation += 1
+        self._write_snapshot()
+        self.log.close()
+        self.log = self._new_log()
+        self.logged = 0
+
+    def position(self):
+        ''' (generation, events logged) of the events synced so far. '''
+        return (self.generation, self.logged)
+
+    def events_after(self, position):
+        ''' (urlhash, url, completed) of the events logged after position,
+        oldest first, or None if the log was compacted since. '''
+        generation, logged = position
+        if generation != self.generation or logged > self.logged:
+            return None
+        events = list()
+        number = 0
+        for kind, urlhash, url in self._read(self.log_file):
+            if kind == self.GENERATION:
+                continue
+            number += 1
+            if number > logged:
+                events.append((urlhash, url, kind == self.COMPLETED))
+        return events
+
+    def close(self):
+        self.sync()
+        self.log.close()
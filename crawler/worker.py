@@ -1,10 +1,12 @@
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from inspect import getsource
 from utils.download import download
 from utils import get_logger
+from utils.metrics import metrics
+from utils.retry import is_transient
 import scraper
-import time
 
 
 class Worker(Thread):
@@ -18,18 +20,84 @@ class Worker(Thread):
         super().__init__(daemon=True)
         
     def run(self):
+        if self.config.max_in_flight > 1:
+            self.run_pipelined()
+            return
         while True:
             tbd_url = self.frontier.get_tbd_url()
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
+            try:
+                resp = download(tbd_url, self.config, self.logger)
+                self.process(tbd_url, resp)
+            finally:
+                # Let the host be scheduled again even if this url failed.
+                self.frontier.release_url(tbd_url)
+
+    def run_pipelined(self):
+        ''' Keeps up to config.max_in_flight downloads running on a thread
+        pool while this thread scrapes the ones that completed. The frontier
+        still hands out at most one url per host at a time. '''
+        in_flight = dict()
+        with ThreadPoolExecutor(self.config.max_in_flight) as fetchers:
+            while True:
+                while len(in_flight) < self.config.max_in_flight:
+                    # Only block for a url when there is nothing to scrape.
+                    tbd_url = self.frontier.get_tbd_url(block=not in_flight)
+                    if not tbd_url:
+                        break
+                    future = fetchers.submit(
+                        download, tbd_url, self.config, self.logger)
+                    in_flight[future] = tbd_url
+                if not in_flight:
+                    self.logger.info("Frontier is empty. Stopping Crawler.")
+                    break
+                # Wake up at least every politeness delay to refill.
+                done, _ = wait(
+                    in_flight, timeout=max(self.config.time_delay, 0.05),
+                    return_when=FIRST_COMPLETED)
+                for future in done:
+                    tbd_url = in_flight.pop(future)
+                    try:
+                        self.process(tbd_url, future.result())
+                    except Exception as e:
+                        # Keep going, the other downloads still need us.
+                        self.logger.error(f"Failed {tbd_url}: {e}")
+                    finally:
+                        self.frontier.release_url(tbd_url)
+
+    def process(self, tbd_url, resp):
+        if not resp:
+            metrics.count("download_errors")
+        else:
+            if resp.download_seconds is not None:
+                self.frontier.record_download(tbd_url, resp.download_seconds)
+            metrics.count(f"status.{resp.status}")
+            self.logger.info(
+                f"Downloaded {tbd_url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+        robots = getattr(self.frontier, "robots", None)
+        if robots is not None and robots.handles(tbd_url):
+            # robots.txt or a sitemap, its urls are streamed in. The
+            # robots policy fetches a failed one again itself.
             if resp:
-                self.logger.info(
-                    f"Downloaded {tbd_url}, status <{resp.status}>, "
-                    f"using cache {self.config.cache_server}.")
+                for url in robots.process(tbd_url, resp):
+                    if scraper.is_valid(url):
+                        self.frontier.add_url(url)
+            self.frontier.mark_url_complete(tbd_url)
+            return
+        if is_transient(resp) and self.frontier.retry_url(tbd_url):
+            # Fetched again after a backoff; out of retries, it is
+            # scraped and completed like any other response.
+            return
+        if resp:
+            archive = getattr(self.frontier, "archive", None)
+            if archive is not None:
+                with metrics.timer("archive"):
+                    archive.append(tbd_url, resp)
+            with metrics.timer("scrape"):
                 scraped_urls = scraper.scraper(tbd_url, resp)
-                for scraped_url in scraped_urls:
-                    self.frontier.add_url(scraped_url)
-                self.frontier.mark_url_complete(tbd_url)
-                time.sleep(self.config.time_delay)
+            for scraped_url in scraped_urls:
+                self.frontier.add_url(scraped_url, parent=tbd_url)
+        self.frontier.mark_url_complete(tbd_url)
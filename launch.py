@@ -1,17 +1,28 @@
 from configparser import ConfigParser
 from argparse import ArgumentParser
+import socket
 
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.shard import ShardedCrawler, check_shards
+from crawler.distributed import DistributedCrawler
 
 
-def main(config_file, restart):
+def main(config_file, restart, processes=1, dataframe=None, node_id=None):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
     config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    if dataframe:
+        host, port = dataframe.rsplit(":", 1)
+        crawler = DistributedCrawler(
+            config, restart, node_id, (host or "127.0.0.1", int(port)))
+    elif processes > 1:
+        crawler = ShardedCrawler(config, restart, processes)
+    else:
+        check_shards(config.save_file, processes, restart)
+        crawler = Crawler(config, restart)
     crawler.start()
 
 
@@ -19,5 +30,15 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument(
+        "--processes", type=int, default=1,
+        help="Crawl processes, each owning a shard of the hosts")
+    parser.add_argument(
+        "--dataframe", type=str, default=None,
+        help="HOST:PORT of a crawler.distributed server to crawl with")
+    parser.add_argument(
+        "--node_id", type=str, default=socket.gethostname(),
+        help="Name of this node in a distributed crawl")
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.processes,
+         args.dataframe, args.node_id)
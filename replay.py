@@ -0,0 +1,97 @@
+import os
+import time
+import shutil
+import multiprocessing
+from configparser import ConfigParser
+from argparse import ArgumentParser
+
+from utils.config import Config
+from utils.archive import records
+from utils.records import CrawlRecords
+from utils.simhash import NearDuplicateIndex
+from utils.wordstats import WordStatistics
+from utils.seen import SeenSet
+from utils.traps import TrapDetector
+from utils.gate import ResponseGate
+import scraper
+
+STOPWORDS = os.path.join(
+    os.path.dirname(os.path.abspath(scraper.__file__)), "stopword.txt")
+
+
+def replay_shard(config, archive, out, shard, shards, pages):
+    # One process: the archived pages of its hosts through the scraper, so
+    # each url and its near duplicates within the host stay in one process.
+    # The scraper starts afresh, even when forked from a crawl.
+    scraper.visited_urls = SeenSet()
+    scraper.page_words.clear()
+    scraper.response_gate = ResponseGate(
+        config.max_page_bytes, config.parse_bytes)
+    scraper.traps = TrapDetector()
+    scraper.traps.configure(
+        config.trap_budget, config.trap_low_value,
+        config.trap_samples, config.trap_repeats)
+    scraper.near_duplicates = NearDuplicateIndex(config.simhash_distance)
+    scraper.word_stats = WordStatistics(out, STOPWORDS)
+    scraper.crawl_records = CrawlRecords(os.path.join(out, "crawl.jsonl"))
+    for url, resp in records(archive, shard, shards):
+        scraper.scraper(url, resp)
+        # The frontier drops it once the url is released.
+        scraper.page_words.pop(url, None)
+        pages[shard] += 1
+    scraper.word_stats.flush()
+    scraper.crawl_records.close()
+
+
+def replay(config, archive, out, processes):
+    ''' Runs the archive through the scraper in processes processes,
+    writing the crawl records and word counts analyze.py reads to out.
+    Returns the number of pages replayed. '''
+    # Counts from an earlier replay would be added to.
+    shutil.rmtree(out, ignore_errors=True)
+    os.makedirs(out)
+    pages = multiprocessing.Array("q", processes, lock=False)
+    workers = [
+        multiprocessing.Process(
+            target=replay_shard, name=f"Replay-{shard}",
+            args=(config, archive, out, shard, processes, pages))
+        for shard in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        if worker.exitcode:
+            raise RuntimeError(
+                f"{worker.name} exited with code {worker.exitcode}.")
+    WordStatistics(out, STOPWORDS).close()
+    return sum(pages)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Scrape the archived pages of a crawl again, without "
+                    "fetching them.")
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--archive", type=str, default=None,
+                        help="Archive directory, ARCHIVE of the config "
+                             "by default")
+    parser.add_argument("--out", type=str,
+                        default=os.path.join("Logs", "replay"),
+                        help="Where the crawl records and word counts go, "
+                             "emptied first")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    cparser = ConfigParser()
+    cparser.read(args.config_file)
+    config = Config(cparser)
+    archive = args.archive or config.archive_dir
+    if not archive:
+        parser.error("No --archive, and ARCHIVE is not set in the config.")
+    start = time.perf_counter()
+    pages = replay(config, archive, args.out, args.processes)
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {pages} pages in {elapsed:.1f}s "
+          f"({pages / max(elapsed, 1e-9):.0f} pages/s).")
+    print(f"python analyze.py --records {os.path.join(args.out, 'crawl.jsonl')}"
+          f" --words {args.out} --state ''")
@@ -1,141 +1,118 @@
-import re
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
-from lxml import html
-import tldextract
-from utils.tokenize import tokenize_from_text
-
-visited_hashes = set()
-visited_urls = set()  # Add this new set to track visited URLs
+import os
+from urllib.parse import urlparse
+from utils.document import Document
+from utils.urlfilter import UrlFilter
+from utils.simhash import NearDuplicateIndex
+from utils.wordstats import WordStatistics
+from utils.seen import SeenSet
+from utils.traps import TrapDetector
+from utils.records import CrawlRecords
+from utils.gate import ResponseGate, STATUS
+from utils.metrics import metrics
+from utils.canonical import canonicalize
+
+# SimHash signatures of every kept page. The frontier opens it next to its
+# save file, with the configured distance, so it survives restarts.
+near_duplicates = NearDuplicateIndex()
+# Pages per word, flushed to sorted run files in Logs and merged on close.
+word_stats = WordStatistics(
+    "Logs", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stopword.txt'))
+visited_urls = SeenSet()  # 8 byte digests of the urls already scraped
+# One JSON line per fetched page, read by analyze.py.
+crawl_records = CrawlRecords(os.path.join("Logs", "crawl.jsonl"))
+# Url patterns that behave like traps. The frontier configures it and asks
+# it before adding a url; extract_next_links reports how each page went.
+traps = TrapDetector()
+# Skips non-HTML and oversized responses before parsing and caps the bytes
+# parsed. The frontier configures it and writes its stats.
+response_gate = ResponseGate()
+# Word count of each scraped page with links, by the url it was requested
+# as, until the frontier releases that url. The frontier scores the links.
+page_words = dict()
 
 def parse_url(url):
-    # Remove URL fragment
-    url = url.split('#')[0]
-    parsed = urlparse(url)
+    # Canonical form, without fragment
+    parsed = urlparse(canonicalize(url))
     return parsed
 
 
 def get_full_domain(url):
-    extracted = tldextract.extract(url)
-    # Reconstruct the domain with subdomain
-    domain_parts = [part for part in [extracted.subdomain, extracted.domain, extracted.suffix] if part]
-    full_domain = '.'.join(domain_parts)
-    return full_domain
+    # subdomain.domain.suffix, cached per netloc by URL_FILTER.hosts
+    return URL_FILTER.hosts.classify(urlparse(url).netloc).full_domain
 
 def is_domain_allowed(full_domain):
-    allowed_domains = [
-        'ics.uci.edu',
-        'cs.uci.edu',
-        'informatics.uci.edu',
-        'stat.uci.edu',
-    ]
-    return any(full_domain.endswith(allowed_domain) for allowed_domain in allowed_domains)
+    return URL_FILTER.hosts.is_domain_allowed(full_domain)
 
 def is_today_uci_url_allowed(parsed_url):
-    allowed_today_prefix = '/department/information_computer_sciences/'
+    allowed_today_prefix = URL_FILTER.hosts.allowed_paths['today.uci.edu']
     return parsed_url.path.startswith(allowed_today_prefix)
 
 def is_allowed_url(url):
     try:
         parsed_url = parse_url(url)
-        full_domain = get_full_domain(url)
 
         # Check for HTTP or HTTPS scheme
         if parsed_url.scheme not in ('http', 'https'):
             return False
 
-        # Check if domain is 'today.uci.edu'
-        if full_domain == 'today.uci.edu':
-            return is_today_uci_url_allowed(parsed_url)
+        # Domain decision and 'today.uci.edu' path prefix, cached per netloc
+        host = URL_FILTER.hosts.classify(parsed_url.netloc)
+        if host.path_prefix is not None:
+            return parsed_url.path.startswith(host.path_prefix)
         else:
-            return is_domain_allowed(full_domain)
+            return host.allowed
     except Exception as e:
         # Handle exceptions, e.g., malformed URLs
         print(f"Error processing URL {url}: {e}")
         return False
     
-def get_number_of_words(resp, mode=""):
+def get_number_of_words(doc, mode=""):
     # Check if response is valid and has content
+    resp = doc.resp
     result = 0
-    if resp.status != 200 or not resp.raw_response or not resp.raw_response.content:
+    if resp.status != 200 or not resp.body:
         return result
 
     
     try:
-        # Create BeautifulSoup object from the response content
-        soup = BeautifulSoup(resp.raw_response.content, 'html.parser')
-        #print("caaaaaaaaa")
-        #print(soup.get_text().strip())
-        #print("caaaaaaaaa")
-        result = tokenize_from_text(soup.get_text().strip(), rtype='set')
+        result = doc.tokens
 
     except Exception as e:
         print(f"Error count content from {resp.url}: {str(e)}")
         return result
     
     if mode == "w":
-        import os
-        import time
-        
-        stopword_file = 'stopword.txt' ## TO FIX, make it global
-        stopwords = set()
-
-        # Read the stopword.txt file into a set for quick lookup
-        with open(stopword_file, 'r') as f:
-            stopwords = set(line.strip() for line in f)
+        # Stopwords are dropped by word_stats, loaded once at import
+        word_stats.add(result)
 
-        for key in result:
-            if key not in stopwords:
-
-                # Define the path to the log file using the key
-                file_path = os.path.join("Logs", f"{key}.k")
-
-                # Create the file if it doesn't exist, or append to it if it does
-                with open(file_path, 'a') as f:
-                    timestamp = time.strftime('%Y%m%d%H%M%S')
-                    f.write( f"{timestamp}\n")
-
-                #print(f"Appended to file {file_path}")
-
-    
     return len(result)
 
 
-def is_resp_low_value(resp):
+def is_resp_low_value(doc):
     # Check if response is valid and has content
-    if resp.status != 200 or not resp.raw_response or not resp.raw_response.content:
+    resp = doc.resp
+    if resp.status != 200 or not resp.body:
         return True
     
     try:
-        # Create BeautifulSoup object from the response content
-        soup = BeautifulSoup(resp.raw_response.content, 'html.parser')
-        
-        # Get text content and remove extra whitespace
-        text_content = ' '.join(soup.get_text().split())
+        # Text content with extra whitespace removed, from the shared parse
+        text_content = doc.text
         
         # If the page has very little text content, consider it low info
         if len(text_content) < 50:  # You can adjust this threshold
             return True
         
-        # Duplicate Content Check using Python's built-in hash function
-        content_hash = hash(text_content)
-        if content_hash in visited_hashes:
+        # Near-duplicate Content Check using the SimHash of the tokens
+        if near_duplicates.check_and_add(doc.signature):
             return True
-        visited_hashes.add(content_hash)
 
         # High Link-to-Text Ratio Check
-        links = soup.find_all('a')
-        link_count = len(links)
+        link_count = doc.anchor_count
         text_length = max(1, len(text_content))
         if link_count / text_length > 5:
             return True 
-            
-        # Large File Size Check
-        if resp.raw_response.headers.get('Content-Length'):
-            file_size = int(resp.raw_response.headers['Content-Length'])
-            if file_size > 10 * 1024 * 1024:  # 10 MB threshold
-                return True
 
+        # Large files never get here, response_gate skips them unparsed
         return False
         
     except Exception as e:
@@ -144,7 +121,8 @@ def is_resp_low_value(resp):
 
 def scraper(url, resp):
     links = extract_next_links(url, resp)
-    return [link for link in links if is_valid(link)]
+    with metrics.timer("filter"):
+        return [link for link in links if is_valid(link)]
 
 def extract_next_links(url, resp):
     # Implementation required.
@@ -155,104 +133,118 @@ def extract_next_links(url, resp):
     # resp.raw_response: this is where the page actually is. More specifically, the raw_response has two parts:
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
+    #     It is unpickled on first use; resp.headers, resp.body (a memoryview)
+    #     and resp.content (bytes) read the page without unpickling it all.
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
 
     # ------------
-    # Check if we've seen this URL before
-    if resp.url in visited_urls:
+    # Check if we've seen this URL before, and mark it seen
+    if not visited_urls.add(resp.url):
         return list()
-    visited_urls.add(resp.url)
     
-    # check response
-    if resp.status != 200:
-        print(resp.error)
+    # check status, headers and size before any parsing
+    reason = response_gate.check(resp)
+    if reason is not None:
+        metrics.count(f"skipped.{reason}")
+        if reason == STATUS:
+            print(resp.error)
+        traps.record(url, low_value=True)
+        crawl_records.append(resp.url, resp.status)
         return list() # empty list
     
-    try: # 200 but no info
-        tree = html.fromstring(resp.raw_response.content) # parse content
-    except: 
+    # 200 but no info; the page is parsed once and shared by every check
+    doc = Document(resp, response_gate.body(resp))
+    if doc.tree is None:
         print(f'{resp.url} cannot be parsed')
+        traps.record(url, low_value=True)
+        crawl_records.append(resp.url, resp.status)
         return list()
     
-    if is_resp_low_value(resp):
+    if is_resp_low_value(doc):
+        traps.record(url, low_value=True)
+        crawl_records.append(resp.url, resp.status)
         return list()
+    traps.record(url, low_value=False)
         
-    hrefs = tree.xpath('//a[@href]/@href') # extract all <a> tags that have href; return href value
-
-    # Modify this section to defragment URLs while creating absolute URLs
-    links = [urljoin(resp.url, href).split('#')[0] for href in hrefs]  # remove fragments and convert relative to absolute
+    # absolute <a href> urls with fragments removed
+    links = doc.links
 
-    n = get_number_of_words(resp, "w")   
-    with open('found_urls.txt', 'a+') as f: # quick local save
-        for link in links: 
-            if link not in visited_urls:
-                f.write(f"\n{url} - {n}")
+    n = get_number_of_words(doc, "w")   
+    page_words[url] = n
+    # one record per page, for analyze.py
+    crawl_records.append(resp.url, resp.status, n, doc.signature, len(links))
     
     return links
 
 def is_valid(url):
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
+    # The rules are the URL_FILTER tables below; see is_valid_reason for
+    # why a url was rejected.
 
     # conditions:
     # only the domains specified in assignment
     # avoid infinite loops
-    #    (avoid by using the block list pattern)
+    #    (avoid by using the block list pattern; calendars and other traps
+    #    are throttled per url pattern by the frontier, see utils/traps.py)
     # avoid large files/files with low info value
     #   (Checked by Using the is_resp_low_value function above)
-
-    # Other conditions to avoid:
-    # Loggin/logout sessions, cart, checkout, etc.
-    # These might lead to infinite loops.
-    # Example:
-    BLOCKLIST_PATTERNS = [
-        r".*[\?&]page=.*",
-        r".*[\?&]sort=.*",
-        r".*[\?&](sessionid|sid|phpsessid)=.*",
-        r".*\.(mp3|mp4|avi|wmv|flv|doc|docx|ppt|pptx|xls|xlsx)$",
-        r".*\/(assets|static|public|dist)\/.*",
-        r"^mailto:.*",
-        r"^tel:.*",
-        r".*[\?&](search|query|q|term)=.*",
-        r".*[\?&](comment|replytocom)=.*",
-        r".*\/(202\d|199\d|20\d{2})\/.*",  # Matches years from 1990 to 2029
-        r".*[\?&](token|auth|key)=.*",
-        r".*\.(rss|xml|atom)$",
-        r".*[\?&]lang=.*",
-        r".*\/(en|fr|de|es|jp)\/.*",
-        r".*[\?&](affiliate|partner|ref)=.*",
-        r".*[\?&](debug|test)=.*",
-        r".*\/(api|v1|json|graphql)\/.*",
-        r".*\/(status|heartbeat|healthcheck)\/.*",
-    ]
-
-
-    
-    try:
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-
-        # Check against blocklist patterns
-        for pattern in BLOCKLIST_PATTERNS:
-            if re.match(pattern, url, re.IGNORECASE):
-                return False
-            
-        # Check if the URL is allowed within the allowed domains
-        if not is_allowed_url(url):
-            return False
-            
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
-
-    except TypeError:
-        print ("TypeError for ", parsed)
-        raise
+    return URL_FILTER.check(url) is None
+
+def is_valid_reason(url):
+    # None if the url is valid, otherwise the utils.urlfilter reason code.
+    return URL_FILTER.check(url)
+
+# Other conditions to avoid:
+# Loggin/logout sessions, cart, checkout, etc.
+# These might lead to infinite loops.
+URL_FILTER = UrlFilter(
+    schemes=["http", "https"],
+    # Rejected anywhere in the url as ?key= or &key=
+    query_keys=[
+        "page", "sort",
+        "sessionid", "sid", "phpsessid",
+        "search", "query", "q", "term",
+        "comment", "replytocom",
+        "token", "auth", "key",
+        "lang",
+        "affiliate", "partner", "ref",
+        "debug", "test",
+    ],
+    # Rejected anywhere in the url as /segment/
+    path_segments=[
+        "assets", "static", "public", "dist",
+        "en", "fr", "de", "es", "jp",
+        "api", "v1", "json", "graphql",
+        "status", "heartbeat", "healthcheck",
+    ],
+    # Rejected at the very end of the url
+    blocked_extensions=[
+        "mp3", "mp4", "avi", "wmv", "flv", "doc", "docx", "ppt", "pptx",
+        "xls", "xlsx", "rss", "xml", "atom",
+    ],
+    # These domains and all of their subdomains
+    allowed_domains=[
+        'ics.uci.edu',
+        'cs.uci.edu',
+        'informatics.uci.edu',
+        'stat.uci.edu',
+    ],
+    allowed_paths={
+        'today.uci.edu': '/department/information_computer_sciences/',
+    },
+    # Rejected at the end of the url path
+    file_extensions=[
+        "css", "js", "bmp", "gif", "jpg", "jpeg", "ico",
+        "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+        "wav", "avi", "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+        "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+        "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso",
+        "epub", "dll", "cnf", "tgz", "sha1",
+        "thmx", "mso", "arff", "rtf", "jar", "csv",
+        "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz",
+    ],
+)
+
+# Hits, misses and size of the per-netloc host cache of URL_FILTER.
+metrics.gauge("host_cache", URL_FILTER.hosts.stats)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import logging
+import argparse
+import tempfile
+import unittest
+
+from benchmarks.crawl import make_config
+from crawler.frontier import Frontier
+from scraper import visited_urls
+from utils import get_urlhash
+from utils.seen import urlhash_digest
+
+ARGS = argparse.Namespace(threads=1, in_flight=1, politeness=0.0)
+
+
+class NoRescanFrontier(Frontier):
+    ''' Frontier that has to restore from the checkpoint. '''
+    def _parse_save_file(self):
+        raise AssertionError("rescanned the save file")
+
+
+def seen(frontier, url):
+    return frontier.seen.contains_digest(urlhash_digest(get_urlhash(url)))
+
+
+def queued_urls(frontier):
+    return set(
+        url for queue in frontier.to_be_downloaded.values()
+        for url in queue.urls())
+
+
+class CrashResumeTest(unittest.TestCase):
+    ''' A crawl killed between two checkpoints resumes from the last one
+    and the save log written after it. '''
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp(prefix="checkpoint-test-")
+        os.chdir(self.workdir)
+        logging.disable(logging.INFO)
+        self.config = make_config(
+            ARGS, 1, os.path.join(self.workdir, "frontier.save"))
+        self.config.obey_robots = False
+        self.config.sitemaps = False
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def crawl_after_checkpoint(self):
+        # Fetches one seed and finds a link on it after the checkpoint, then
+        # stops without close(), as a killed crawl does.
+        frontier = Frontier(self.config, True)
+        frontier.checkpoint()
+        fetched = frontier.get_tbd_url(block=False)
+        found = f"{fetched}/found-after-checkpoint"
+        frontier.add_url(found, fetched)
+        visited_urls.add(fetched)
+        frontier.mark_url_complete(fetched)
+        frontier.save.sync()
+        return frontier, fetched, found
+
+    def test_resume_replays_log(self):
+        before, fetched, found = self.crawl_after_checkpoint()
+        expected = queued_urls(before)
+        self.assertIn(found, expected)
+        self.assertNotIn(fetched, expected)
+
+        after = NoRescanFrontier(self.config, False)
+        self.assertEqual(queued_urls(after), expected)
+        self.assertEqual(after.queued, len(expected))
+        self.assertTrue(seen(after, found))
+        self.assertTrue(seen(after, fetched))
+        self.assertIn(fetched, visited_urls)
+        after.close()
+
+    def test_compacted_log_rescans(self):
+        before, fetched, found = self.crawl_after_checkpoint()
+        expected = queued_urls(before)
+        # The log no longer has the events after the checkpoint.
+        before.save.compact()
+
+        after = Frontier(self.config, False)
+        self.assertEqual(queued_urls(after), expected)
+        after.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import pickle
+import unittest
+
+import requests
+
+from utils import get_urlhash
+from utils.canonical import canonicalize
+from utils.document import Document
+from utils.response import Response
+
+PAGE = (
+    '<html><head>{head}</head><body><a href="page2.html">2</a>'
+    '<a href="../up.html">up</a><a href="/top">top</a></body></html>')
+
+
+def response(url, served_url=None, head=""):
+    ''' A Response for url as the cache returns it, the page served from
+    served_url after redirects. '''
+    raw = requests.Response()
+    raw.status_code = 200
+    raw.url = served_url or url
+    raw.headers = requests.structures.CaseInsensitiveDict(
+        {"Content-Type": "text/html"})
+    raw._content = PAGE.format(head=head).encode("utf-8")
+    return Response(
+        {"url": url, "status": 200, "response": pickle.dumps(raw)})
+
+
+class LinkResolutionTest(unittest.TestCase):
+    ''' Relative links of a directory page resolve below the directory. '''
+    def links(self, url, served_url=None, head=""):
+        return Document(response(canonicalize(url), served_url, head)).links
+
+    def test_directory(self):
+        self.assertEqual(self.links("https://www.ics.uci.edu/dir/"), [
+            "https://www.ics.uci.edu/dir/page2.html",
+            "https://www.ics.uci.edu/up.html",
+            "https://www.ics.uci.edu/top"])
+
+    def test_default_document(self):
+        self.assertEqual(
+            self.links("https://www.ics.uci.edu/dir/index.html"),
+            self.links("https://www.ics.uci.edu/dir/"))
+
+    def test_redirect_to_directory(self):
+        # Requested as /dir, the server answered from /dir/.
+        self.assertEqual(
+            self.links("https://www.ics.uci.edu/dir",
+                       "https://www.ics.uci.edu/dir/")[0],
+            "https://www.ics.uci.edu/dir/page2.html")
+
+    def test_base_href(self):
+        self.assertEqual(
+            self.links("https://www.ics.uci.edu/dir/",
+                       head='<base href="/other/x/">')[0],
+            "https://www.ics.uci.edu/other/x/page2.html")
+
+
+class TrailingSlashTest(unittest.TestCase):
+    def test_directory_keeps_slash(self):
+        for url in ("https://www.ics.uci.edu/dir/",
+                    "https://www.ics.uci.edu/dir/index.html",
+                    "https://www.ics.uci.edu/dir//INDEX.HTM",
+                    "https://www.ics.uci.edu/dir/sub/.."):
+            self.assertEqual(canonicalize(url), "https://www.ics.uci.edu/dir/")
+        self.assertEqual(canonicalize("https://www.ics.uci.edu/index.html"),
+                         "https://www.ics.uci.edu")
+
+    def test_one_page_to_the_frontier(self):
+        self.assertEqual(get_urlhash("https://www.ics.uci.edu/dir"),
+                         get_urlhash("https://www.ics.uci.edu/dir/index.html"))
+        self.assertEqual(get_urlhash("https://www.ics.uci.edu/dir?a=1"),
+                         get_urlhash("https://www.ics.uci.edu/dir/?a=1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
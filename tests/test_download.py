@@ -0,0 +1,100 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import argparse
+import multiprocessing
+from threading import Lock, Thread
+from collections import Counter
+
+from benchmarks.cache_server import SyntheticWeb, start_server, subdomains
+from benchmarks.crawl import make_config
+from utils.download import get_session
+
+THREADS = 2
+IN_FLIGHT = 4
+
+
+class CountingWeb(SyntheticWeb):
+    ''' A SyntheticWeb counting the requests for each url. '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = Lock()
+        self.requests = Counter()
+
+    def page(self, url):
+        with self.lock:
+            self.requests[url] += 1
+        return super().page(url)
+
+
+def run_crawl(port, workdir, seeds):
+    os.chdir(workdir)
+    logging.disable(logging.WARNING)
+    from crawler import Crawler
+    config = make_config(
+        argparse.Namespace(politeness=0.0, threads=THREADS,
+                           in_flight=IN_FLIGHT),
+        port, os.path.join(workdir, "frontier.shelve"))
+    config.seed_urls = seeds
+    config.metrics_interval = 0
+    Crawler(config, True).start()
+
+
+class PipelinedCrawlTest(unittest.TestCase):
+    ''' The pipelined workers against the stand-in cache server. '''
+    def setUp(self):
+        self.web = CountingWeb(400, hosts=subdomains(8))
+        self.server = start_server(self.web)
+        # Every connection the cache server accepts.
+        self.connections = 0
+        process_request = self.server.process_request
+
+        def counting(request, client_address):
+            self.connections += 1
+            process_request(request, client_address)
+        self.server.process_request = counting
+        self.workdir = tempfile.mkdtemp(prefix="crawl-test-")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_every_url_fetched_once(self):
+        seeds = [self.web.url(host, 0) for host in self.web.hosts]
+        process = multiprocessing.Process(target=run_crawl, args=(
+            self.server.server_address[1], self.workdir, seeds))
+        process.start()
+        process.join(120)
+        self.assertEqual(process.exitcode, 0)
+
+        requests = self.web.requests
+        self.assertEqual(
+            [url for url, count in requests.items() if count > 1], [])
+        pages = [url for url in requests if not url.endswith("/robots.txt")]
+        self.assertGreaterEqual(len(pages), 300)
+        for host in self.web.hosts:
+            self.assertEqual(requests[f"https://{host}/robots.txt"], 1)
+        # One kept-alive connection per download thread, not per request.
+        self.assertGreater(self.connections, 0)
+        self.assertLessEqual(self.connections, THREADS * IN_FLIGHT)
+
+    def test_session_per_thread(self):
+        sessions = list()
+
+        def twice():
+            sessions.append((get_session(), get_session()))
+        threads = [Thread(target=twice) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for first, second in sessions:
+            self.assertIs(first, second)
+        self.assertEqual(len(set(id(first) for first, _ in sessions)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from crawler.hostqueue import HostQueue, SPILL_CHUNK
+from crawler.scoring import UrlContext
+
+
+def context(number):
+    return UrlContext(
+        f"https://www.ics.uci.edu/{number}", number % 7, number % 3, 10, 0,
+        number)
+
+
+class HostQueueSpillTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="hostqueue-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def run_path(self, number):
+        return os.path.join(self.workdir, f"run{number}")
+
+    def queue(self, count):
+        # Scores in reverse push order, so the heap has work to do.
+        queue = HostQueue()
+        for number in range(count):
+            queue.push(float(count - number), context(number))
+        return queue
+
+    def test_spill_keeps_best(self):
+        queue = self.queue(10)
+        self.assertEqual(queue.spill(self.run_path(0), 4), 6)
+        self.assertEqual(len(queue), 10)
+        self.assertEqual(len(queue.entries), 4)
+        self.assertEqual(queue.spill(self.run_path(1), 4), 0)
+        self.assertFalse(os.path.exists(self.run_path(1)))
+
+    def test_read_back_in_score_order(self):
+        count = 2 * SPILL_CHUNK + 10
+        queue = self.queue(count)
+        queue.spill(self.run_path(0), 5)
+        popped = [queue.pop() for _ in range(count)]
+        self.assertEqual(
+            popped, [context(number) for number in reversed(range(count))])
+        self.assertFalse(queue)
+        # A run read back to the end is deleted.
+        self.assertFalse(os.path.exists(self.run_path(0)))
+
+    def test_read_run_resumes(self):
+        queue = self.queue(10)
+        queue.spill(self.run_path(0), 0)
+        run = queue.runs[0]
+        first = list(queue._read_run(run, 3))
+        self.assertEqual(run[2], 7)
+        rest = list(queue._read_run(run))
+        self.assertEqual(run[2], 0)
+        self.assertEqual(
+            first + rest,
+            [(float(10 - number), context(number))
+             for number in reversed(range(10))])
+
+    def test_urls_include_spilled(self):
+        queue = self.queue(10)
+        queue.spill(self.run_path(0), 4)
+        self.assertEqual(
+            list(queue.urls()),
+            [context(number).url for number in reversed(range(10))])
+        # Listing them does not read the runs back.
+        self.assertEqual(queue.spilled, 6)
+        self.assertEqual(queue.runs[0][1:], [0, 6])
+
+    def test_several_runs(self):
+        queue = self.queue(20)
+        queue.spill(self.run_path(0), 10)
+        for number in range(20, 30):
+            queue.push(float(number), context(number))
+        queue.spill(self.run_path(1), 5)
+        self.assertEqual(len(queue), 30)
+        popped = set(queue.pop().url for _ in range(30))
+        self.assertEqual(
+            popped, set(context(number).url for number in range(30)))
+
+    def test_discard(self):
+        queue = self.queue(10)
+        queue.spill(self.run_path(0), 2)
+        queue.pop()
+        queue.discard()
+        self.assertFalse(os.path.exists(self.run_path(0)))
+        self.assertEqual(queue.runs, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import pickle
+import unittest
+
+import requests
+
+from utils.response import Response, find_body, without_body, CONTENT_KEYS
+
+SIZES = [0, 255, 256, 64 * 1024 - 1, 64 * 1024, 5 * 1024 * 1024]
+PROTOCOLS = [2, 3, 4, 5]
+
+
+def raw_response(size, headers=None):
+    raw = requests.Response()
+    raw.status_code = 200
+    raw.url = "https://www.ics.uci.edu/page"
+    raw.headers = requests.structures.CaseInsensitiveDict(
+        headers or {"Content-Type": "text/html"})
+    raw._content = (bytes(range(256)) * (size // 256 + 1))[:size]
+    return raw
+
+
+class BodySpanTest(unittest.TestCase):
+    ''' Headers, body and content read through find_body and without_body
+    match those of the whole pickle decoded. '''
+    def check(self, raw, protocol):
+        pickled = pickle.dumps(raw, protocol=protocol)
+        expected = pickle.loads(pickled)
+        span = find_body(pickled)
+        if protocol >= 3:
+            # Protocol 2 pickles bytes as a call, decoded the slow way.
+            self.assertIsNotNone(span)
+        if span is not None:
+            head = pickle.loads(without_body(pickled, span))
+            self.assertIsNone(head._content)
+            self.assertEqual(head.headers, expected.headers)
+            self.assertEqual(head.url, expected.url)
+            _, start, end = span
+            self.assertEqual(pickled[start:end], expected.content)
+        resp = Response({"url": raw.url, "status": 200, "response": pickled})
+        self.assertEqual(resp.headers, expected.headers)
+        self.assertEqual(resp.final_url, expected.url)
+        self.assertEqual(bytes(resp.body), expected.content)
+        self.assertEqual(resp.content, expected.content)
+
+    def test_sizes_and_protocols(self):
+        for protocol in PROTOCOLS:
+            for size in SIZES:
+                with self.subTest(protocol=protocol, size=size):
+                    self.check(raw_response(size), protocol)
+
+    def test_content_key_in_headers(self):
+        # The pickled key, and the bytes of both of its encodings, as
+        # header values. They come after the body in the pickle.
+        headers = {"Content-Type": "text/html", "X-Key": "_content"}
+        for number, key in enumerate(CONTENT_KEYS):
+            headers[f"X-Raw-{number}"] = key.decode("latin-1")
+        for protocol in PROTOCOLS:
+            for size in (0, 255, 64 * 1024):
+                with self.subTest(protocol=protocol, size=size):
+                    self.check(raw_response(size, headers), protocol)
+
+    def test_content_key_in_body(self):
+        raw = raw_response(0)
+        raw._content = b"".join(CONTENT_KEYS) * 100
+        for protocol in PROTOCOLS:
+            with self.subTest(protocol=protocol):
+                self.check(raw, protocol)
+
+
+if __name__ == "__main__":
+    unittest.main()
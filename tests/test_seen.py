@@ -0,0 +1,76 @@
+import io
+import unittest
+
+from utils.seen import SeenSet
+
+
+def colliding(count, slots=16):
+    # Digests that all start probing at slot 3 of a table of slots slots.
+    return [3 + slots * number for number in range(1, count + 1)]
+
+
+class SeenSetDiscardTest(unittest.TestCase):
+    ''' Deleting digests, as the checkpoint does for urls in flight. '''
+    def test_discard(self):
+        seen = SeenSet()
+        seen.add("https://www.ics.uci.edu/a")
+        seen.add("https://www.ics.uci.edu/b")
+        self.assertTrue(seen.discard("https://www.ics.uci.edu/a"))
+        self.assertFalse(seen.discard("https://www.ics.uci.edu/a"))
+        self.assertNotIn("https://www.ics.uci.edu/a", seen)
+        self.assertIn("https://www.ics.uci.edu/b", seen)
+        self.assertEqual(len(seen), 1)
+        # Its Bloom filter bits stay set, adding it again still works.
+        self.assertTrue(seen.add("https://www.ics.uci.edu/a"))
+        self.assertIn("https://www.ics.uci.edu/a", seen)
+
+    def test_discard_in_probe_run(self):
+        # Removing any digest of a run of collisions keeps the others
+        # reachable, including the ones that wrapped around the table.
+        for slot_count, digests in ((16, colliding(6)),
+                                    (16, [15, 31, 47, 14, 1])):
+            for removed in digests:
+                seen = SeenSet(slot_count)
+                for digest in digests:
+                    seen.add_digest(digest)
+                self.assertEqual(seen.mask, slot_count - 1)
+                self.assertTrue(seen.discard_digest(removed))
+                self.assertFalse(seen.contains_digest(removed))
+                for digest in digests:
+                    if digest != removed:
+                        self.assertTrue(seen.contains_digest(digest))
+                self.assertEqual(len(seen), len(digests) - 1)
+
+    def test_copy_is_independent(self):
+        seen = SeenSet()
+        for number in range(100):
+            seen.add(f"https://www.ics.uci.edu/{number}")
+        copy = seen.copy()
+        copy.discard("https://www.ics.uci.edu/1")
+        copy.add("https://www.ics.uci.edu/new")
+        self.assertIn("https://www.ics.uci.edu/1", seen)
+        self.assertNotIn("https://www.ics.uci.edu/new", seen)
+        self.assertNotIn("https://www.ics.uci.edu/1", copy)
+        self.assertEqual((len(seen), len(copy)), (100, 100))
+        # Growing the copy leaves the original table alone.
+        for number in range(100, 2000):
+            copy.add(f"https://www.ics.uci.edu/{number}")
+        self.assertEqual(len(seen), 100)
+        self.assertIn("https://www.ics.uci.edu/99", seen)
+
+    def test_round_trip(self):
+        seen = SeenSet()
+        for number in range(50):
+            seen.add(f"https://www.ics.uci.edu/{number}")
+        seen.discard("https://www.ics.uci.edu/7")
+        file = io.BytesIO()
+        seen.write(file)
+        loaded, end = SeenSet.from_buffer(b"xx" + file.getvalue(), 2)
+        self.assertEqual(end, 2 + len(file.getvalue()))
+        self.assertEqual(len(loaded), 49)
+        self.assertNotIn("https://www.ics.uci.edu/7", loaded)
+        self.assertIn("https://www.ics.uci.edu/8", loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
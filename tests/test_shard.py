@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from crawler.shard import check_shards
+from crawler.store import LogStore
+
+
+class CheckShardsTest(unittest.TestCase):
+    ''' A sharded save file resumes with the processes that wrote it. '''
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="shard-test-")
+        self.save_file = os.path.join(self.workdir, "frontier.save")
+        for shard in range(2):
+            LogStore(f"{self.save_file}.shard{shard}").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_same_processes(self):
+        check_shards(self.save_file, 2, False)
+
+    def test_other_processes(self):
+        for processes in (1, 3):
+            with self.assertRaises(ValueError):
+                check_shards(self.save_file, processes, False)
+
+    def test_restart_deletes_extra_shards(self):
+        check_shards(self.save_file, 3, True)
+        check_shards(self.save_file, 2, False)
+        check_shards(self.save_file, 1, True)
+        check_shards(self.save_file, 3, False)
+
+    def test_no_save_file(self):
+        check_shards(os.path.join(self.workdir, "other.save"), 4, False)
+
+
+if __name__ == "__main__":
+    unittest.main()
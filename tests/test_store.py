@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from crawler.store import LogStore
+
+URL = "https://www.ics.uci.edu/a"
+OTHER = "https://www.ics.uci.edu/b"
+
+
+class LogStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="store-test-")
+        self.save_file = os.path.join(self.workdir, "frontier.save")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def store(self):
+        return LogStore(self.save_file, batch_size=1)
+
+    def test_last_event_wins(self):
+        store = self.store()
+        store.discover("a", URL)
+        store.complete("a", URL)
+        store.discover("b", OTHER)
+        store.complete("b", OTHER)
+        # Handed back, as a distributed crawl does.
+        store.discover("a", URL)
+        self.assertEqual(store.completed, 1)
+        store.close()
+
+        store = self.store()
+        self.assertEqual(dict(store.urls), {
+            "a": (URL, False), "b": (OTHER, True)})
+        self.assertEqual(store.completed, 1)
+        store.close()
+
+    def test_torn_tail(self):
+        store = self.store()
+        store.discover("a", URL)
+        store.close()
+        with open(store.log_file, "a", encoding="utf-8") as file:
+            file.write(f"C\ta\t{URL}")
+
+        store = self.store()
+        self.assertEqual(dict(store.urls), {"a": (URL, False)})
+        self.assertEqual(store.completed, 0)
+        store.close()
+
+    def test_escaped_url(self):
+        url = "https://www.ics.uci.edu/a\tb\nc"
+        store = self.store()
+        store.discover("a", url)
+        store.close()
+
+        store = self.store()
+        self.assertEqual(store.urls["a"], (
+            "https://www.ics.uci.edu/a%09b%0Ac", False))
+        store.close()
+
+    def test_compaction(self):
+        store = self.store()
+        store.discover("a", URL)
+        store.compact()
+        store.complete("a", URL)
+        store.close()
+
+        store = self.store()
+        self.assertEqual(store.urls["a"], (URL, True))
+        self.assertEqual(store.generation, 1)
+        store.close()
+
+    def test_log_left_from_compaction_skipped(self):
+        store = self.store()
+        store.discover("a", URL)
+        store.sync()
+        shutil.copy(store.log_file, f"{self.save_file}.old")
+        store.compact()
+        store.close()
+        # Killed after the new snapshot, before the log was emptied.
+        os.replace(f"{self.save_file}.old", store.log_file)
+
+        store = self.store()
+        self.assertEqual(dict(store.urls), {"a": (URL, False)})
+        self.assertEqual(store.logged, 0)
+        store.discover("b", OTHER)
+        store.close()
+        store = self.store()
+        self.assertEqual(len(store), 2)
+        store.close()
+
+    def test_log_without_generation(self):
+        # Written before the generation record existed.
+        with open(f"{self.save_file}.log", "w", encoding="utf-8") as file:
+            file.write(f"D\ta\t{URL}\nC\ta\t{URL}\n")
+
+        store = self.store()
+        self.assertEqual(store.urls["a"], (URL, True))
+        self.assertEqual(store.logged, 2)
+        store.close()
+
+    def test_events_after(self):
+        store = self.store()
+        store.discover("a", URL)
+        position = store.position()
+        store.discover("b", OTHER)
+        store.complete("a", URL)
+        self.assertEqual(store.events_after(position), [
+            ("b", OTHER, False), ("a", URL, True)])
+        store.compact()
+        self.assertIsNone(store.events_after(position))
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+import scraper
+from benchmarks.url_filter import (
+    legacy_is_valid, intended_difference, synthetic_urls)
+
+# One or more urls per rule of the old is_valid, accepted and rejected.
+URLS = [
+    "https://www.ics.uci.edu",
+    "https://www.ics.uci.edu/",
+    "https://vision.ics.uci.edu/people/index.html",
+    "http://www.cs.uci.edu/faculty/",
+    "https://www.informatics.uci.edu/research/pubs",
+    "https://www.stat.uci.edu/about/",
+    "https://www.ics.uci.edu:8080/about/",
+    "ftp://www.ics.uci.edu/pub/",
+    "mailto:someone@ics.uci.edu",
+    "tel:+19498245011",
+    "https://www.ics.uci.edu/events/?page=2",
+    "https://www.ics.uci.edu/events/?id=1&sort=asc",
+    "https://www.ics.uci.edu/login?PHPSESSID=abc",
+    "https://www.ics.uci.edu/search?q=crawler",
+    "https://www.ics.uci.edu/post?replytocom=9",
+    "https://www.ics.uci.edu/page?token=x",
+    "https://www.ics.uci.edu/page?lang=en",
+    "https://www.ics.uci.edu/page?ref=home",
+    "https://www.ics.uci.edu/page?debug=1",
+    "https://www.ics.uci.edu/static/site.js",
+    "https://www.ics.uci.edu/Assets/logo",
+    "https://www.ics.uci.edu/en/about/",
+    "https://www.ics.uci.edu/api/v2/",
+    "https://www.ics.uci.edu/status/now",
+    "https://www.ics.uci.edu/talks/talk.MP4",
+    "https://www.ics.uci.edu/feed.xml",
+    "https://www.ics.uci.edu/papers/paper.pdf",
+    "https://www.ics.uci.edu/papers/data.csv",
+    "https://www.ics.uci.edu/images/photo.JPEG",
+    "https://www.ics.uci.edu/~eppstein/pubs/",
+    "https://www.ics.uci.edu/2019/news/",
+    "https://www.ics.uci.edu/events/1997/",
+    "https://today.uci.edu/department/information_computer_sciences/news",
+    "https://today.uci.edu/news",
+    "https://www.uci.edu/",
+    "https://economics.uci.edu/",
+    "https://example.com/ics.uci.edu/",
+    "https://physics.uci.edu/",
+    "https://WWW.ICS.UCI.EDU/about/",
+]
+
+
+class UrlFilterEquivalenceTest(unittest.TestCase):
+    ''' UrlFilter makes the decisions of the is_valid regex loop it
+    replaced, apart from the differences intended_difference() lists. '''
+    def assert_equivalent(self, urls):
+        for url in urls:
+            before, after = legacy_is_valid(url), scraper.is_valid(url)
+            if before != after:
+                self.assertIsNotNone(
+                    intended_difference(url, before, after),
+                    f"{url}: legacy={before} filter={after}")
+
+    def test_rule_urls(self):
+        self.assert_equivalent(URLS)
+
+    def test_synthetic_urls(self):
+        self.assert_equivalent(synthetic_urls(20000))
+
+    def test_intended_differences(self):
+        self.assertEqual(intended_difference(
+            "https://physics.uci.edu/", True, False), "look-alike host")
+        self.assertEqual(intended_difference(
+            "https://WWW.ICS.UCI.EDU/about/", False, True), "upper case host")
+        self.assertEqual(intended_difference(
+            "https://www.ics.uci.edu/2019/news/", False, True), "year segment")
+
+    def test_unintended_differences(self):
+        # Other domain rejections, and hosts that only differ from the
+        # netloc by userinfo, port or IPv6 brackets, are not excused.
+        for url, before, after in (
+                ("https://www.uci.edu/", True, False),
+                ("https://www.ics.uci.edu.evil.com/", True, False),
+                ("https://User@www.ics.uci.edu/about/", False, True),
+                ("https://www.ics.uci.edu:8080/about/", False, True),
+                ("https://[::1]/about/", False, True),
+                ("https://WWW.EXAMPLE.COM/about/", False, True)):
+            self.assertIsNone(
+                intended_difference(url, before, after), url)
+
+    def test_malformed_url_is_rejected(self):
+        # The old code raised ValueError.
+        self.assertFalse(scraper.is_valid("http://[::1/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
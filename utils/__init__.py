@@ -3,11 +3,16 @@ import logging
 from hashlib import sha256
 from urllib.parse import urlparse
 
+from utils.canonical import canonicalize
+
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
+    if logger.handlers:
+        # Set up by an earlier call, more handlers would repeat every line.
+        return logger
     logger.setLevel(logging.INFO)
-    if not os.path.exists("Logs"):
-        os.makedirs("Logs")
+    # Crawl processes sharing a directory may create it at once.
+    os.makedirs("Logs", exist_ok=True)
     fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
     fh.setLevel(logging.DEBUG)
     ch = logging.StreamHandler()
@@ -23,13 +28,25 @@ def get_logger(name, filename=None):
 
 
 def get_urlhash(url):
-    parsed = urlparse(url)
+    url = normalize(url)
+    # The trailing slash a canonical directory keeps is not part of the
+    # key, /dir and /dir/ are the same page.
+    if ";" in url or "://" not in url:
+        parsed = urlparse(url)
+        key = (f"{parsed.netloc}/{parsed.path.rstrip('/')}/{parsed.params}/"
+               f"{parsed.query}/{parsed.fragment}")
+    else:
+        # The same key without urlparse: a canonical url has no fragment,
+        # and no params without a ";".
+        location, _, query = url.partition("?")
+        netloc, slash, path = location.partition("://")[2].partition("/")
+        key = f"{netloc}/{slash}{path.rstrip('/')}//{query}/"
     # everything other than scheme.
-    return sha256(
-        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
-        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
+    return sha256(key.encode("utf-8")).hexdigest()
 
 def normalize(url):
-    if url.endswith("/"):
+    # Every spelling of a page maps to one url, see utils.canonical.
+    try:
+        return canonicalize(url)
+    except ValueError:
         return url.rstrip("/")
-    return url
@@ -0,0 +1,265 @@
+import os
+import re
+import gzip
+import zlib
+import uuid
+import struct
+from zlib import crc32
+from datetime import datetime, timezone
+from threading import Lock, local
+from urllib.parse import urlparse
+
+try:
+    import zstandard
+except ImportError:
+    # Only needed for zstd archives.
+    zstandard = None
+
+from utils import normalize
+from utils.seen import url_digest
+from utils.response import Response
+from utils.metrics import metrics
+
+# Segment file extension of each compression. Every record is compressed
+# on its own, a gzip member or a zstd frame, so it can be read back alone.
+EXTENSIONS = {"gzip": ".warc.gz", "zstd": ".warc.zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+SEGMENT_BYTES = 256 * 1024 * 1024
+# One index entry per record: digest of the url requested, crc32 of its
+# host, offset and compressed length of the record in the segment.
+INDEX = struct.Struct("<QIQI")
+SEGMENT_NAME = re.compile(r"^(.+)-(\d{5})\.idx$")
+# WARC fields of the url requested, when the cache answered for another,
+# and of the cache server error of a response without a page.
+REQUESTED = "WARC-Requested-URI"
+CACHE_ERROR = "WARC-Cache-Error"
+
+_zstd = local()
+
+
+def one_line(value):
+    return str(value).replace("\r", " ").replace("\n", " ")
+
+
+def host_hash(url):
+    return crc32(urlparse(url).netloc.encode("utf-8"))
+
+
+def encode_record(url, resp):
+    ''' A WARC response record of resp, fetched for url: the WARC fields,
+    then the status line, headers and body of the page. '''
+    if resp.error is None:
+        headers, body = resp.headers, resp.body
+    else:
+        headers, body = {}, b""
+    http = "".join(
+        [f"HTTP/1.1 {resp.status}\r\n"] +
+        [f"{name}: {one_line(value)}\r\n" for name, value in headers.items()] +
+        ["\r\n"]).encode("latin-1", "replace")
+    fields = [
+        "WARC/1.0",
+        "WARC-Type: response",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {datetime.now(timezone.utc):%Y-%m-%dT%H:%M:%SZ}",
+        f"WARC-Target-URI: {one_line(resp.url)}"]
+    if url != resp.url:
+        fields.append(f"{REQUESTED}: {one_line(url)}")
+    if resp.error is not None:
+        fields.append(f"{CACHE_ERROR}: {one_line(resp.error)}")
+    fields.append("Content-Type: application/http; msgtype=response")
+    fields.append(f"Content-Length: {len(http) + len(body)}")
+    head = ("\r\n".join(fields) + "\r\n\r\n").encode("utf-8")
+    return b"".join((head, http, body, b"\r\n\r\n"))
+
+
+def decode_record(record):
+    ''' (url requested, Response) of a record of encode_record(). '''
+    head, _, rest = record.partition(b"\r\n\r\n")
+    fields = dict(
+        line.partition(": ")[::2]
+        for line in head.decode("utf-8").split("\r\n")[1:])
+    payload = memoryview(rest)[:int(fields["Content-Length"])]
+    end = rest.find(b"\r\n\r\n", 0, len(payload))
+    lines = bytes(payload[:end]).decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    target = fields["WARC-Target-URI"]
+    url = fields.get(REQUESTED, target)
+    if CACHE_ERROR in fields:
+        return url, Response(
+            {"url": target, "status": status, "error": fields[CACHE_ERROR]})
+    headers = [line.partition(": ")[::2] for line in lines[1:] if line]
+    return url, Response.from_parts(target, status, headers, payload[end + 4:])
+
+
+def compress(record, compression):
+    if compression == "zstd":
+        compressor = getattr(_zstd, "compressor", None)
+        if compressor is None:
+            # Not thread safe, one per thread.
+            compressor = _zstd.compressor = zstandard.ZstdCompressor(
+                level=ZSTD_LEVEL)
+        return compressor.compress(record)
+    return gzip.compress(record, GZIP_LEVEL, mtime=0)
+
+
+def decompress(data, compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Reading a zstd archive needs zstandard.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, 31)
+
+
+def compression_of(segment):
+    for compression, extension in EXTENSIONS.items():
+        if segment.endswith(extension):
+            return compression
+    raise ValueError(f"Not an archive segment: {segment}")
+
+
+def list_segments(directory):
+    ''' (segment, index file) paths of the archive in directory, by name. '''
+    if not os.path.isdir(directory):
+        return []
+    names = set(os.listdir(directory))
+    segments = list()
+    for name in sorted(names):
+        match = SEGMENT_NAME.match(name)
+        if not match:
+            continue
+        for extension in EXTENSIONS.values():
+            segment = name[:-len(".idx")] + extension
+            if segment in names:
+                segments.append((
+                    os.path.join(directory, segment),
+                    os.path.join(directory, name)))
+    return segments
+
+
+def read_index(path):
+    ''' (url digest, host hash, offset, length) of each complete entry. '''
+    with open(path, "rb") as file:
+        data = file.read()
+    return INDEX.iter_unpack(data[:len(data) - len(data) % INDEX.size])
+
+
+class ResponseArchive(object):
+    ''' Fetched pages, appended to the segments NAME-00000.warc.gz, ... in
+    directory (.warc.zst with zstd) as WARC response records, each
+    compressed on its own. A new segment starts once one holds
+    segment_bytes, or when the archive is opened again. Next to each
+    segment, NAME-00000.idx holds an INDEX entry per record.
+
+    Records are compressed outside of the lock and written with a single
+    os.write each, their index entry after them, so a crash never leaves
+    an entry pointing at a torn record. Processes sharing directory need
+    names of their own. '''
+    def __init__(self, directory, name="pages", compression="gzip",
+                 segment_bytes=SEGMENT_BYTES):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown archive compression {compression}.")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("A zstd archive needs the zstandard package.")
+        self.directory = directory
+        self.name = name
+        self.compression = compression
+        self.segment_bytes = segment_bytes
+        self.segment = 1 + max(
+            (int(match.group(2)) for match in map(
+                SEGMENT_NAME.match,
+                os.listdir(directory) if os.path.isdir(directory) else ())
+             if match and match.group(1) == name),
+            default=-1)
+        self.fd = None
+        self.index_fd = None
+        self.offset = 0
+        self.lock = Lock()
+
+    def _next_segment(self):
+        self._close()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{self.name}-{self.segment:05d}")
+        self.segment += 1
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        self.fd = os.open(base + EXTENSIONS[self.compression], flags, 0o644)
+        self.index_fd = os.open(base + ".idx", flags, 0o644)
+        self.offset = 0
+
+    def append(self, url, resp):
+        ''' Archives resp, the response the cache gave for url. '''
+        record = compress(encode_record(url, resp), self.compression)
+        digest, host = url_digest(url), host_hash(url)
+        with self.lock:
+            if self.fd is None or self.offset >= self.segment_bytes:
+                self._next_segment()
+            os.write(self.fd, record)
+            os.write(self.index_fd, INDEX.pack(
+                digest, host, self.offset, len(record)))
+            self.offset += len(record)
+        metrics.count("archived_bytes", len(record))
+
+    def _close(self):
+        for fd in (self.fd, self.index_fd):
+            if fd is not None:
+                os.close(fd)
+        self.fd = self.index_fd = None
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+def read_record(segment, offset, length):
+    ''' (url requested, Response) of the record at offset in segment. '''
+    with open(segment, "rb") as file:
+        file.seek(offset)
+        data = file.read(length)
+    return decode_record(decompress(data, compression_of(segment)))
+
+
+def records(directory, shard=0, shards=1):
+    ''' Yields (url requested, Response) for every record in directory, in
+    the order they were archived per segment, or only those of the hosts
+    with host_hash % shards == shard, so processes can split the archive
+    by host like the crawl processes. '''
+    for segment, index in list_segments(directory):
+        compression = compression_of(segment)
+        entries = [
+            (offset, length) for _, host, offset, length in read_index(index)
+            if host % shards == shard]
+        if not entries:
+            continue
+        with open(segment, "rb") as file:
+            for offset, length in entries:
+                file.seek(offset)
+                yield decode_record(
+                    decompress(file.read(length), compression))
+
+
+class ArchiveReader(object):
+    ''' Random access by url to the archive in directory. The index files
+    are loaded into a dict of url digest -> the segment, offset and length
+    of the url's last record, so get() is one seek and one read. '''
+    def __init__(self, directory):
+        self.segments = list()
+        self.locations = dict()
+        for segment, index in list_segments(directory):
+            number = len(self.segments)
+            self.segments.append(segment)
+            for digest, _, offset, length in read_index(index):
+                self.locations[digest] = (number, offset, length)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, url):
+        return url_digest(normalize(url)) in self.locations
+
+    def get(self, url):
+        ''' (url requested, Response) of the last record of url, or None. '''
+        location = self.locations.get(url_digest(normalize(url)))
+        if location is None:
+            return None
+        number, offset, length = location
+        return read_record(self.segments[number], offset, length)
@@ -0,0 +1,135 @@
+import re
+from urllib.parse import urlsplit, urlunsplit, urljoin, quote
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+# Last path segments a server answers like the directory itself.
+DEFAULT_DOCUMENTS = frozenset([
+    "index.html", "index.htm", "index.php", "default.htm", "default.html"])
+# Query keys that only track where a visitor came from.
+TRACKING_KEYS = frozenset([
+    "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+    "fbclid", "gclid"])
+UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+PATH_SAFE = "/%:@!$&'()*+,;=~"
+QUERY_SAFE = "%:@!$'()*+,;=~/?"
+
+# Urls that are canonical already: http(s), a lowercase host without port,
+# a path of plain characters without empty segments or escapes, maybe
+# ending in a slash, no query and no fragment. Most links of a crawl look
+# like this.
+FAST_PATH = re.compile(
+    r"https?://[a-z0-9-]+(?:\.[a-z0-9-]+)*"
+    r"(?:(?:/[A-Za-z0-9._~!$&'()*+,;=:@-]+)+/?)?")
+ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+# Characters needing an escape in a path or a query pair.
+UNSAFE_PATH = re.compile(r"[^A-Za-z0-9._~/%:@!$&'()*+,;=-]")
+UNSAFE_QUERY = re.compile(r"[^A-Za-z0-9._~%:@!$'()*+,;=/?-]")
+
+# Canonical netloc per (scheme, netloc), emptied when it gets large.
+NETLOC_CACHE_SIZE = 65536
+_netlocs = dict()
+
+
+def _unescape(match):
+    # Escaped unreserved characters stand for themselves, the rest keep
+    # their escape with upper case hex digits.
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else "%" + match.group(1).upper()
+
+
+def _canonical_netloc(scheme, netloc):
+    userinfo, at, host = netloc.rpartition("@")
+    if host.startswith("["):
+        end = host.find("]") + 1
+        host, port = host[:end], host[end + 1:]
+    else:
+        host, _, port = host.partition(":")
+    host = host.lower().rstrip(".")
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    return f"{userinfo}{at}{host}"
+
+
+def _canonical_path(path):
+    if "%" in path:
+        path = ESCAPE.sub(_unescape, path)
+    if UNSAFE_PATH.search(path):
+        path = quote(path, safe=PATH_SAFE)
+    segments = list()
+    # A directory keeps its trailing slash, relative links on its page
+    # resolve below it.
+    directory = False
+    for segment in path.split("/"):
+        directory = segment in ("", ".", "..")
+        if segment == "..":
+            if segments:
+                segments.pop()
+        elif segment and segment != ".":
+            segments.append(segment)
+    if segments and segments[-1].lower() in DEFAULT_DOCUMENTS:
+        segments.pop()
+        directory = True
+    if not segments:
+        return ""
+    return "/" + "/".join(segments) + ("/" if directory else "")
+
+
+def _canonical_query(query):
+    pairs = list()
+    for pair in query.split("&"):
+        if not pair or pair.partition("=")[0].lower() in TRACKING_KEYS:
+            continue
+        if "%" in pair:
+            pair = ESCAPE.sub(_unescape, pair)
+        if UNSAFE_QUERY.search(pair):
+            pair = quote(pair, safe=QUERY_SAFE)
+        pairs.append(pair)
+    return "&".join(sorted(pairs))
+
+
+def canonicalize(url):
+    ''' The one spelling of url used everywhere in the crawler:
+    lower case scheme and host, no default port, fragment, empty path
+    segment, dot segment or default document such as index.html,
+    unreserved characters unescaped and other escapes in upper case,
+    non-ASCII characters escaped, tracking keys dropped and the query pairs
+    sorted. A directory keeps its trailing slash, so /dir/index.html is
+    /dir/, but the site root has none. get_urlhash ignores the trailing
+    slash, /dir and /dir/ are one page to the frontier. Raises ValueError
+    for urls urlsplit rejects. '''
+    url = url.strip()
+    if (FAST_PATH.fullmatch(url) and "/." not in url
+            and url.rpartition("/")[2].lower() not in DEFAULT_DOCUMENTS):
+        return url
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = _netlocs.get((scheme, parts.netloc))
+    if netloc is None:
+        if len(_netlocs) >= NETLOC_CACHE_SIZE:
+            _netlocs.clear()
+        netloc = _netlocs[scheme, parts.netloc] = _canonical_netloc(
+            scheme, parts.netloc)
+    query = _canonical_query(parts.query) if parts.query else ""
+    return urlunsplit(
+        (scheme, netloc, _canonical_path(parts.path), query, ""))
+
+
+def canonicalize_many(hrefs, base=None):
+    ''' Canonical absolute urls of the hrefs of one page, resolved against
+    base, in page order, without duplicates or malformed urls. base is the
+    url the page was served from as the server spelled it, not its
+    canonical url, which may have lost the last segment of the path. '''
+    urls = list()
+    seen = set()
+    for href in hrefs:
+        try:
+            if base and not href.startswith(("http://", "https://")):
+                href = urljoin(base, href)
+            url = canonicalize(href)
+        except ValueError:
+            continue
+        if url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
@@ -8,12 +8,62 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.max_in_flight = int(config["LOCAL PROPERTIES"].get("INFLIGHT", 1))
+        self.max_threads = int(config["LOCAL PROPERTIES"].get("MAXTHREADS", 0))
+        self.control_interval = float(
+            config["LOCAL PROPERTIES"].get("CONTROLINTERVAL", 2.0))
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.save_format = config["LOCAL PROPERTIES"].get("SAVEFORMAT", "log")
+        self.save_batch = int(config["LOCAL PROPERTIES"].get("SAVEBATCH", 512))
+        self.save_interval = float(
+            config["LOCAL PROPERTIES"].get("SAVEINTERVAL", 1.0))
+        self.checkpoint_interval = float(
+            config["LOCAL PROPERTIES"].get("CHECKPOINT", 60.0))
+        self.queue_memory = int(
+            config["LOCAL PROPERTIES"].get("QUEUEMEMORY", 1000000))
+        self.metrics_file = config["LOCAL PROPERTIES"].get(
+            "METRICSFILE", "Logs/metrics.json").strip()
+        self.metrics_interval = float(
+            config["LOCAL PROPERTIES"].get("METRICSINTERVAL", 10.0))
+        self.metrics_port = int(config["LOCAL PROPERTIES"].get("METRICSPORT", 0))
+        self.archive_dir = config["LOCAL PROPERTIES"].get("ARCHIVE", "").strip()
+        self.archive_compression = config["LOCAL PROPERTIES"].get(
+            "ARCHIVECOMPRESSION", "gzip").strip()
+        self.archive_segment = int(
+            config["LOCAL PROPERTIES"].get("ARCHIVESEGMENT", 256 * 1024 * 1024))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.scorer = config["CRAWLER"].get("SCORER", "default").strip()
+        self.simhash_distance = int(config["CRAWLER"].get("SIMHASHDISTANCE", 3))
+        self.trap_budget = int(config["CRAWLER"].get("TRAPBUDGET", 1000))
+        self.trap_low_value = float(config["CRAWLER"].get("TRAPLOWVALUE", 0.7))
+        self.trap_samples = int(config["CRAWLER"].get("TRAPSAMPLES", 20))
+        self.trap_repeats = int(config["CRAWLER"].get("TRAPREPEATS", 3))
+        self.max_page_bytes = int(
+            config["CRAWLER"].get("MAXPAGEBYTES", 10 * 1024 * 1024))
+        self.parse_bytes = int(config["CRAWLER"].get("PARSEBYTES", 1024 * 1024))
+        self.obey_robots = config["CRAWLER"].getboolean("ROBOTS", True)
+        self.sitemaps = config["CRAWLER"].getboolean("SITEMAPS", True)
+        self.robots_expiry = float(
+            config["CRAWLER"].get("ROBOTSEXPIRY", 86400.0))
+        self.download_timeout = float(
+            config["CRAWLER"].get("DOWNLOADTIMEOUT", 60.0))
+        self.max_retries = int(config["CRAWLER"].get("MAXRETRIES", 3))
+        self.retry_delay = float(config["CRAWLER"].get("RETRYDELAY", 5.0))
+        self.retry_max_delay = float(
+            config["CRAWLER"].get("RETRYMAXDELAY", 300.0))
+        self.breaker_failures = int(
+            config["CRAWLER"].get("BREAKERFAILURES", 5))
+        self.breaker_cooldown = float(
+            config["CRAWLER"].get("BREAKERCOOLDOWN", 60.0))
+        self.breaker_limit = int(config["CRAWLER"].get("BREAKERLIMIT", 5))
+        self.host_latency_factor = float(
+            config["CRAWLER"].get("HOSTLATENCYFACTOR", 1.0))
+        self.max_host_delay = float(
+            config["CRAWLER"].get("MAXHOSTDELAY", 60.0))
 
         self.cache_server = None
\ No newline at end of file
@@ -0,0 +1,101 @@
+from urllib.parse import urljoin
+
+from lxml import html
+
+from utils.canonical import canonicalize_many
+from utils.tokenize import tokenize_from_text
+from utils.simhash import simhash
+from utils.metrics import metrics
+
+# Text nodes a browser would render, i.e. not inside script or style.
+VISIBLE_TEXT = "//text()[not(ancestor::script) and not(ancestor::style)]"
+
+
+class Document(object):
+    ''' The parsed form of one Response. The page is parsed once with lxml
+    and every view of it is computed on first use and then cached. '''
+    def __init__(self, resp, content=None):
+        self.resp = resp
+        self.url = resp.url
+        # The bytes to parse, if not the whole body.
+        self._content = content
+        self._tree = None
+        self._parse_error = None
+        self._base = None
+        self._links = None
+        self._text = None
+        self._tokens = None
+        self._signature = None
+        self._anchor_count = None
+
+    @property
+    def content(self):
+        if self._content is not None:
+            return self._content
+        return self.resp.content
+
+    @property
+    def tree(self):
+        ''' The lxml tree of the page, or None if it cannot be parsed. '''
+        if self._tree is None and self._parse_error is None:
+            try:
+                with metrics.timer("parse"):
+                    self._tree = html.fromstring(self.content)
+            except Exception as e:
+                self._parse_error = e
+        return self._tree
+
+    @property
+    def base(self):
+        ''' The url relative links resolve against: the <base href>, else
+        the url the page was served from. Not the canonical url, which
+        loses the index.html of /dir/index.html. '''
+        if self._base is None:
+            self._base = self.resp.final_url
+            tree = self.tree
+            hrefs = tree.xpath("//base/@href") if tree is not None else []
+            if hrefs and hrefs[0].strip():
+                try:
+                    self._base = urljoin(self._base, hrefs[0].strip())
+                except ValueError:
+                    pass
+        return self._base
+
+    @property
+    def links(self):
+        ''' Canonical absolute urls of the <a href>s, each once. '''
+        if self._links is None:
+            tree = self.tree
+            hrefs = tree.xpath("//a[@href]/@href") if tree is not None else []
+            self._links = canonicalize_many(hrefs, self.base)
+        return self._links
+
+    @property
+    def text(self):
+        ''' Visible text with runs of whitespace collapsed to one space. '''
+        if self._text is None:
+            tree = self.tree
+            nodes = tree.xpath(VISIBLE_TEXT) if tree is not None else []
+            self._text = " ".join("".join(nodes).split())
+        return self._text
+
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = tokenize_from_text(self.text, rtype="set")
+        return self._tokens
+
+    @property
+    def signature(self):
+        ''' 64 bit SimHash of the token set, for near-duplicate checks. '''
+        if self._signature is None:
+            self._signature = simhash(self.tokens)
+        return self._signature
+
+    @property
+    def anchor_count(self):
+        if self._anchor_count is None:
+            tree = self.tree
+            self._anchor_count = (
+                int(tree.xpath("count(//a)")) if tree is not None else 0)
+        return self._anchor_count
@@ -2,22 +2,51 @@ import requests
 import cbor
 import time
 
+from threading import local
+from requests.adapters import HTTPAdapter
+
 from utils.response import Response
+from utils.metrics import metrics
+
+# Every fetch goes to the same cache server, so each thread keeps one
+# Session whose pool keeps its connection open between requests.
+_sessions = local()
+
+def get_session():
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _sessions.session = session
+    return session
 
 def download(url, config, logger=None):
     host, port = config.cache_server
+    resp = None
     try:
-        resp = requests.get(
+        start = time.perf_counter()
+        resp = get_session().get(
         f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+        params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+        timeout=config.download_timeout or None)
+        decode = time.perf_counter()
+        metrics.observe("download", decode - start)
         if resp and resp.content:
-            return Response(cbor.loads(resp.content))
-    except (EOFError, ValueError) as e:
-        #pass
-        logger.error(f"Spacetime Response error {resp} with url {url}.")
+            metrics.count("bytes", len(resp.content))
+            response = Response(cbor.loads(resp.content))
+            response.download_seconds = decode - start
+            metrics.observe("decode", time.perf_counter() - decode)
+            return response
+    except (EOFError, ValueError, requests.RequestException) as e:
+        # Timeouts and connection errors too, the frontier retries the url.
+        if logger is not None:
+            logger.error(
+                f"Spacetime Response error {resp} with url {url}: {e}")
         return None
 
-    return Response({
+    response = Response({
         "error": f"Spacetime Response error {resp} with url {url}.",
         "status": resp.status_code,
         "url": url})
+    response.download_seconds = decode - start
+    return response
@@ -0,0 +1,107 @@
+from threading import Lock
+from collections import Counter
+
+# Reasons returned by ResponseGate.check for a response not worth parsing.
+STATUS = "status"
+EMPTY = "empty"
+CONTENT_TYPE = "content-type"
+TOO_LARGE = "too-large"
+# Not a reason to skip: the body was cut to parse_bytes before parsing.
+TRUNCATED = "truncated"
+
+# Media types handed to the HTML parser.
+HTML_TYPES = frozenset([
+    "text/html", "application/xhtml+xml", "text/xml", "application/xml"])
+# Media types servers send when they do not know, the body decides.
+UNKNOWN_TYPES = frozenset(["", "application/octet-stream", "text/plain"])
+# Leading bytes of the binary formats commonly served without a
+# Content-Type or under an extensionless url.
+BINARY_MAGIC = (
+    b"%PDF", b"PK\x03\x04", b"\x89PNG", b"GIF8", b"\xff\xd8\xff",
+    b"\x1f\x8b", b"\xd0\xcf\x11\xe0", b"ID3", b"\x00\x00\x00")
+SNIFF_BYTES = 512
+
+
+def media_type(content_type):
+    # "Text/HTML; charset=utf-8" -> "text/html"
+    return content_type.partition(";")[0].strip().lower()
+
+
+def looks_binary(prefix):
+    return prefix.startswith(BINARY_MAGIC) or b"\x00" in prefix
+
+
+class ResponseGate(object):
+    ''' Decides from the status, the headers and at most SNIFF_BYTES of the
+    body whether a response is worth parsing, before any parser runs:
+
+    status:       not 200.
+    empty:        no body.
+    content-type: a media type other than HTML, or an unknown one whose
+                  body starts like a binary file.
+    too-large:    Content-Length, or else the body, over max_bytes.
+
+    parse_bytes caps what body() hands to the parser. Counts every reason,
+    and the truncated bodies, for stats(). '''
+    def __init__(self, max_bytes=10 * 1024 * 1024, parse_bytes=1024 * 1024):
+        self.lock = Lock()
+        self.configure(max_bytes, parse_bytes)
+        self.counts = Counter()
+        self.checked = 0
+
+    def configure(self, max_bytes, parse_bytes):
+        self.max_bytes = max_bytes
+        self.parse_bytes = parse_bytes
+
+    def check(self, resp):
+        ''' None if resp should be parsed, otherwise the reason. '''
+        reason = self._reason(resp)
+        with self.lock:
+            self.checked += 1
+            if reason is not None:
+                self.counts[reason] += 1
+        return reason
+
+    def _reason(self, resp):
+        if resp.status != 200:
+            return STATUS
+        headers = resp.headers
+        kind = media_type(headers.get("Content-Type", ""))
+        if kind not in HTML_TYPES and kind not in UNKNOWN_TYPES:
+            return CONTENT_TYPE
+        length = headers.get("Content-Length")
+        if (length and length.isdigit() and self.max_bytes
+                and int(length) > self.max_bytes):
+            return TOO_LARGE
+        body = resp.body
+        if not body:
+            return EMPTY
+        if self.max_bytes and len(body) > self.max_bytes:
+            return TOO_LARGE
+        if kind in UNKNOWN_TYPES and looks_binary(
+                bytes(body[:SNIFF_BYTES])):
+            return CONTENT_TYPE
+        return None
+
+    def body(self, resp):
+        ''' The bytes of resp to parse, cut at parse_bytes. Only the part
+        kept is copied out of the response. '''
+        body = resp.body
+        if self.parse_bytes and len(body) > self.parse_bytes:
+            with self.lock:
+                self.counts[TRUNCATED] += 1
+            return bytes(body[:self.parse_bytes])
+        return resp.content
+
+    def stats(self):
+        ''' (reason, count) pairs, most frequent first. '''
+        with self.lock:
+            return self.counts.most_common()
+
+    def write_stats(self, path):
+        rows = self.stats()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("reason\tresponses\n")
+            file.write(f"checked\t{self.checked}\n")
+            for reason, count in rows:
+                file.write(f"{reason}\t{count}\n")
@@ -0,0 +1,85 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+import tldextract
+
+# Only the public suffix list bundled with tldextract is used: no network
+# fetch and no cache directory, so startup is the same on offline machines.
+_extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+# Load the suffix list now rather than on the first url of the crawl.
+_extract("www.ics.uci.edu")
+
+# full_domain: subdomain.domain.suffix, lowercased, as used to key hosts.
+# allowed: the host is inside the crawl.
+# path_prefix: when set, only paths starting with it are inside the crawl.
+HostInfo = namedtuple("HostInfo", ["full_domain", "allowed", "path_prefix"])
+
+
+def get_hostname(netloc):
+    ''' The host part of a netloc, without userinfo, port or trailing dot. '''
+    host = netloc.rpartition("@")[2]
+    if host.startswith("["):
+        host = host[:host.find("]") + 1]
+    else:
+        host = host.partition(":")[0]
+    return host.lower().rstrip(".")
+
+
+def get_full_domain(netloc):
+    extracted = _extract(netloc)
+    parts = [part for part in (
+        extracted.subdomain, extracted.domain, extracted.suffix) if part]
+    return ".".join(parts).lower()
+
+
+class HostClassifier(object):
+    ''' Bounded LRU cache from netloc to HostInfo. A crawl sees a few
+    thousand netlocs, so tldextract and the domain checks run once per
+    netloc instead of once per url. '''
+    def __init__(self, allowed_domains, allowed_paths, maxsize=65536):
+        self.allowed_domains = frozenset(allowed_domains)
+        self.allowed_paths = dict(allowed_paths)
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def classify(self, netloc):
+        with self.lock:
+            info = self.cache.get(netloc)
+            if info is not None:
+                self.hits += 1
+                self.cache.move_to_end(netloc)
+                return info
+            self.misses += 1
+        info = self._classify(netloc)
+        with self.lock:
+            self.cache[netloc] = info
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return info
+
+    def _classify(self, netloc):
+        host = get_hostname(netloc)
+        if host in self.allowed_paths:
+            return HostInfo(
+                get_full_domain(host), True, self.allowed_paths[host])
+        return HostInfo(
+            get_full_domain(host), self.is_domain_allowed(host), None)
+
+    def is_domain_allowed(self, host):
+        # Walk up the labels: a.b.ics.uci.edu, b.ics.uci.edu, ics.uci.edu...
+        while True:
+            if host in self.allowed_domains:
+                return True
+            dot = host.find(".")
+            if dot < 0:
+                return False
+            host = host[dot + 1:]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "size": len(self.cache)}
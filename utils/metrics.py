@@ -0,0 +1,230 @@
+import os
+import json
+import time
+from threading import Lock, Thread, Event, local
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency histograms count microseconds in 4 buckets per power of two, so a
+# percentile is off by at most a quarter of its value. The last bucket
+# takes everything from about 20 minutes on.
+BUCKETS = 120
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def bucket(us):
+    bits = us.bit_length()
+    if bits <= 2:
+        return us
+    return min((bits - 2) * 4 + ((us >> (bits - 3)) & 3), BUCKETS - 1)
+
+
+def bucket_bound(index):
+    ''' The microseconds just past bucket index. '''
+    if index < 4:
+        return index + 1
+    shift = index // 4 - 1
+    return (4 + index % 4 + 1) << shift
+
+
+class ThreadStats(object):
+    ''' The counters and timers of one thread, written by it alone. '''
+    __slots__ = ("counters", "timers")
+
+    def __init__(self):
+        self.counters = dict()
+        # name -> [count, total seconds, max seconds, histogram]
+        self.timers = dict()
+
+
+class Timer(object):
+    ''' with metrics.timer(name): observes the time spent in the block. '''
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class Metrics(object):
+    ''' Counters, stage timers with latency histograms, and gauges.
+
+    count() and observe() only touch a ThreadStats owned by the calling
+    thread, without a lock; the lock is taken once per thread, to register
+    its ThreadStats. snapshot() sums the ThreadStats of every thread, so a
+    reader sees each thread's numbers as of some recent point. gauges are
+    functions called at snapshot time, like the length of the queue. '''
+    def __init__(self):
+        self.local = local()
+        self.lock = Lock()
+        self.threads = list()
+        self.gauges = dict()
+        self.started = time.time()
+
+    def _stats(self):
+        stats = getattr(self.local, "stats", None)
+        if stats is None:
+            stats = self.local.stats = ThreadStats()
+            with self.lock:
+                self.threads.append(stats)
+        return stats
+
+    def count(self, name, n=1):
+        counters = self._stats().counters
+        counters[name] = counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        timers = self._stats().timers
+        timer = timers.get(name)
+        if timer is None:
+            timer = timers[name] = [0, 0.0, 0.0, [0] * BUCKETS]
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+        timer[3][bucket(int(seconds * 1e6))] += 1
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def gauge(self, name, function):
+        self.gauges[name] = function
+
+    def snapshot(self):
+        ''' {"time", "uptime", "counters", "timers", "gauges"}, each timer
+        as its count, mean, max and PERCENTILES in milliseconds. '''
+        with self.lock:
+            threads = list(self.threads)
+        counters = dict()
+        timers = dict()
+        for stats in threads:
+            # list() of a dict's items runs without releasing the GIL, so
+            # the owning thread can not change the dict under it.
+            for name, value in list(stats.counters.items()):
+                counters[name] = counters.get(name, 0) + value
+            for name, (count, total, longest, histogram) in list(
+                    stats.timers.items()):
+                merged = timers.setdefault(name, [0, 0.0, 0.0, [0] * BUCKETS])
+                merged[0] += count
+                merged[1] += total
+                merged[2] = max(merged[2], longest)
+                for index, value in enumerate(list(histogram)):
+                    merged[3][index] += value
+        gauges = dict()
+        for name, function in list(self.gauges.items()):
+            try:
+                gauges[name] = function()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        now = time.time()
+        return {
+            "time": now, "uptime": now - self.started,
+            "counters": counters,
+            "timers": dict(
+                (name, self._summary(*timer)) for name, timer in timers.items()),
+            "gauges": gauges}
+
+    @staticmethod
+    def _summary(count, total, longest, histogram):
+        summary = {
+            "count": count,
+            "mean_ms": 1000 * total / count if count else 0.0,
+            "max_ms": 1000 * longest}
+        for fraction in PERCENTILES:
+            rank = fraction * count
+            seen = 0
+            for index, value in enumerate(histogram):
+                seen += value
+                if value and seen >= rank:
+                    break
+            summary[f"p{round(100 * fraction)}_ms"] = min(
+                bucket_bound(index) / 1000, 1000 * longest)
+        return summary
+
+
+class MetricsExporter(object):
+    ''' Every interval seconds, takes a snapshot of metrics, adds the rate
+    per second of every counter since the last one, and writes it as JSON
+    to path. With a port, also serves the latest one on
+    http://127.0.0.1:<port>/. '''
+    def __init__(self, metrics, path=None, interval=10.0, port=0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self.stopped = Event()
+        self.thread = None
+        self.server = None
+        self.last = None
+        self.latest = dict()
+
+    def report(self):
+        snapshot = self.metrics.snapshot()
+        last = self.last or {"time": self.metrics.started, "counters": {}}
+        elapsed = max(snapshot["time"] - last["time"], 1e-9)
+        snapshot["rates"] = dict(
+            (name, (value - last["counters"].get(name, 0)) / elapsed)
+            for name, value in snapshot["counters"].items())
+        self.last = snapshot
+        self.latest = snapshot
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        return snapshot
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if self.port:
+            self.server = ThreadingHTTPServer(
+                ("127.0.0.1", self.port), make_handler(self))
+            self.server.daemon_threads = True
+            Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        ''' Writes a last report and stops the thread and the server. '''
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.report()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def make_handler(exporter):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(
+                exporter.latest, indent=1, sort_keys=True).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+# The metrics of this process, recorded by the crawler's hot paths.
+metrics = Metrics()
@@ -0,0 +1,75 @@
+from threading import Lock
+
+# Weight of the latest fetch in a host's mean fetch time.
+SMOOTHING = 0.2
+# A fetch over SLOWED times the fastest of its host was slowed down by
+# something else than the host, the cache server. The fastest fetch grows
+# by DRIFT with every fetch, so it follows a host that got slower for good.
+SLOWED = 2.0
+DRIFT = 1.01
+# A host's penalty doubles on every failure, up to MAX_PENALTY, and drops
+# by PENALTY_STEP on every success, down to 1.
+MAX_PENALTY = 16.0
+PENALTY_STEP = 0.25
+
+
+class HostPacer(object):
+    ''' How long to wait between two fetches from a host, stretched for
+    hosts that answer slowly or fail.
+
+    The delay is latency_factor times the host's mean fetch time, but at
+    least the floor it is given (the politeness delay), times a penalty
+    that doubles on every failed fetch and drops back additively on every
+    successful one. It is capped at max_delay, though never below the
+    floor. A latency_factor of 0 only keeps the penalty. '''
+    def __init__(self, latency_factor=1.0, max_delay=60.0):
+        self.lock = Lock()
+        self.latency_factor = latency_factor
+        self.max_delay = max_delay
+        # host -> [mean fetch time, penalty, fastest fetch].
+        self.hosts = dict()
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            # Failed before its first fetch was timed.
+            state = self.hosts[host] = [0.0, 1.0, float("inf")]
+        return state
+
+    def observe(self, host, seconds):
+        ''' Counts a fetch from host that took seconds. Returns True if it
+        was SLOWED compared to the fastest from host. '''
+        with self.lock:
+            state = self._state(host)
+            if state[2] == float("inf"):
+                state[0] = seconds
+            state[0] += SMOOTHING * (seconds - state[0])
+            state[2] = min(state[2] * DRIFT, seconds)
+            return seconds > SLOWED * state[2]
+
+    def failed(self, host):
+        with self.lock:
+            state = self._state(host)
+            state[1] = min(MAX_PENALTY, state[1] * 2)
+
+    def succeeded(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is not None:
+                state[1] = max(1.0, state[1] - PENALTY_STEP)
+
+    def delay(self, host, floor):
+        ''' Seconds to wait before the next fetch from host. '''
+        state = self.hosts.get(host)
+        if state is None:
+            return floor
+        latency, penalty, _ = state
+        delay = max(floor, self.latency_factor * latency) * penalty
+        return max(floor, min(self.max_delay, delay))
+
+    def slowed(self, floor):
+        ''' The number of hosts whose delay is over floor. '''
+        with self.lock:
+            return sum(
+                1 for host in list(self.hosts)
+                if self.delay(host, floor) > floor)
@@ -13,3 +13,58 @@ class Register(object):
         self.load_balancer = tuple()
         self.fresh = fresh
         self.invalid = False
+
+
+
+@pcc_set
+class CrawlNode(object):
+    ''' One node of a distributed crawl, written by that node alone. acks
+    holds [batch_id, sequence] for the UrlBatches it queued urls of. '''
+    node_id = primarykey(str)
+    heartbeat = dimension(float)
+    idle = dimension(bool)
+    fetched = dimension(int)
+    stopped = dimension(bool)
+    acks = dimension(list)
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.heartbeat = 0.0
+        self.idle = False
+        self.fetched = 0
+        self.stopped = False
+        self.acks = list()
+
+
+@pcc_set
+class HostPartition(object):
+    ''' The lease of one partition of the hosts: owner fetches its hosts
+    until expires, unless it renews the lease. "" while nobody owns it. '''
+    partition = primarykey(int)
+    owner = dimension(str)
+    expires = dimension(float)
+
+    def __init__(self, partition):
+        self.partition = partition
+        self.owner = ""
+        self.expires = 0.0
+
+
+@pcc_set
+class UrlBatch(object):
+    ''' The urls sender found for the hosts of partition, as [sequence,
+    url, depth, parent words], written by sender alone. It appends each
+    batch with the next sequence numbers and drops the urls once some
+    node acknowledged their sequence in CrawlNode.acks. '''
+    batch_id = primarykey(str)
+    partition = dimension(int)
+    sender = dimension(str)
+    sequence = dimension(int)
+    urls = dimension(list)
+
+    def __init__(self, sender, partition):
+        self.batch_id = f"{sender}/{partition}"
+        self.partition = partition
+        self.sender = sender
+        self.sequence = 0
+        self.urls = list()
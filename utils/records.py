@@ -0,0 +1,55 @@
+import os
+import json
+from threading import Lock
+
+
+class CrawlRecords(object):
+    ''' Append-only file with one JSON line per fetched page:
+    {"url", "status", "words", "signature", "outlinks"}.
+
+    Each line goes out in a single os.write to a file opened with O_APPEND,
+    so the crawl processes can share one file, and a crash leaves at worst
+    a torn last line, which read_records skips. '''
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.lock = Lock()
+
+    def append(self, url, status, words=0, signature=None, outlinks=0):
+        line = json.dumps({
+            "url": url, "status": status, "words": words,
+            "signature": None if signature is None else f"{signature:016x}",
+            "outlinks": outlinks}, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.fd is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self.fd = os.open(
+                    self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self.fd, line.encode("utf-8"))
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+def read_records(path, offset=0):
+    ''' Yields (record, offset just past it) for the complete lines of path
+    from byte offset on, so a reader can resume where it stopped. '''
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as file:
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b"\n"):
+                # Still being written, or torn by a crash.
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            yield record, offset
@@ -0,0 +1,93 @@
+import os
+import json
+from collections import Counter
+from urllib.parse import urlsplit
+
+from utils.canonical import canonicalize
+from utils.hosts import get_hostname
+from utils.records import read_records
+from utils.seen import SeenSet
+
+
+class CrawlReport(object):
+    ''' The crawl report, built in one pass over the crawl records and
+    updated incrementally: update() reads only the records appended since
+    the last call, and save()/load() carry the state across runs.
+
+    Memory is one SeenSet digest per unique page plus one counter per
+    subdomain of subdomain_suffix, whatever the size of the records. '''
+    def __init__(self, subdomain_suffix="ics.uci.edu"):
+        self.subdomain_suffix = subdomain_suffix
+        self.offset = 0
+        self.fetched = 0
+        self.pages = 0
+        self.longest = ("", 0)
+        self.subdomains = Counter()
+        self.seen = SeenSet()
+
+    def update(self, path):
+        ''' Adds the records appended to path since the last update. '''
+        if os.path.exists(path) and os.path.getsize(path) < self.offset:
+            # The records were started over, so is the report.
+            self.__init__(self.subdomain_suffix)
+        for record, offset in read_records(path, self.offset):
+            self.add(record)
+            self.offset = offset
+
+    def add(self, record):
+        self.fetched += 1
+        if record["status"] != 200:
+            return
+        try:
+            url = canonicalize(record["url"])
+        except ValueError:
+            url = record["url"]
+        if not self.seen.add(url):
+            return
+        self.pages += 1
+        if record["words"] > self.longest[1]:
+            self.longest = (url, record["words"])
+        host = get_hostname(urlsplit(url).netloc)
+        if (host == self.subdomain_suffix
+                or host.endswith(f".{self.subdomain_suffix}")):
+            self.subdomains[host] += 1
+
+    def save(self, path):
+        ''' Writes the state as a JSON line followed by the SeenSet. '''
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(json.dumps({
+                "subdomain_suffix": self.subdomain_suffix,
+                "offset": self.offset, "fetched": self.fetched,
+                "pages": self.pages, "longest": self.longest,
+                "subdomains": self.subdomains}).encode("utf-8") + b"\n")
+            self.seen.write(file)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            state = json.loads(file.readline())
+            seen, _ = SeenSet.from_buffer(file.read())
+        report = cls(state["subdomain_suffix"])
+        report.offset = state["offset"]
+        report.fetched = state["fetched"]
+        report.pages = state["pages"]
+        report.longest = tuple(state["longest"])
+        report.subdomains = Counter(state["subdomains"])
+        report.seen = seen
+        return report
+
+    def lines(self, top_words=()):
+        ''' The report as lines of text, with the (word, count) pairs of
+        top_words as the most common words. '''
+        yield f"Fetched pages: {self.fetched}"
+        yield f"Number of unique pages: {self.pages}"
+        yield f"Longest page: {self.longest[0]} ({self.longest[1]} words)"
+        yield "Most frequent words (count, word):"
+        for word, count in top_words:
+            yield f"{count} {word}"
+        yield (f"Subdomains of {self.subdomain_suffix} "
+               f"({len(self.subdomains)}):")
+        for host, count in sorted(self.subdomains.items()):
+            yield f"http://{host}, {count}"
@@ -1,14 +1,156 @@
 import pickle
+import struct
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# requests.Response pickles its state as a dict whose first key is the body,
+# "_content": the key as a SHORT_BINUNICODE or BINUNICODE string, maybe
+# memoized, then one bytes opcode with the body.
+CONTENT_KEYS = (b"\x8c\x08_content", b"X\x08\x00\x00\x00_content")
+# Memo opcode -> size of its argument: MEMOIZE, BINPUT, LONG_BINPUT.
+MEMO_OPCODES = {0x94: 0, ord("q"): 1, ord("r"): 4}
+# Bytes opcode -> struct of its length: SHORT_BINBYTES, BINBYTES, BINBYTES8.
+BYTES_OPCODES = {ord("C"): "<B", ord("B"): "<I", 0x8e: "<Q"}
+FRAME = 0x95
+NONE = b"N"
+
+
+def find_body(pickled):
+    ''' (opcode start, data start, data end) of the body in a pickled
+    requests.Response, or None if it is not laid out as expected. '''
+    # The first key of either encoding: headers and the body come after it
+    # and may hold the bytes of the other one, so each search stops at the
+    # key found so far instead of scanning the body.
+    at = end = -1
+    for key in CONTENT_KEYS:
+        found = pickled.find(key, 0, end if at >= 0 else len(pickled))
+        if found >= 0:
+            at, end = found, found + len(key)
+    if at < 0:
+        return None
+    at = end
+    if at < len(pickled) and pickled[at] in MEMO_OPCODES:
+        at += 1 + MEMO_OPCODES[pickled[at]]
+    if at >= len(pickled) or pickled[at] not in BYTES_OPCODES:
+        return None
+    length_format = BYTES_OPCODES[pickled[at]]
+    start = at + 1 + struct.calcsize(length_format)
+    end = start + struct.unpack_from(length_format, pickled, at + 1)[0]
+    if end > len(pickled):
+        return None
+    return at, start, end
+
+
+def without_body(pickled, span):
+    ''' The pickle with the body replaced by None, so the rest of the
+    response decodes without copying it. '''
+    opcode, _, end = span
+    head = bytearray(pickled[:opcode])
+    removed = end - opcode - len(NONE)
+    if len(head) > 10 and head[2] == FRAME:
+        # Protocol 4 frames: a body small enough to sit in the first frame
+        # shrinks it. Large bodies are written outside of any frame.
+        frame_length = struct.unpack_from("<Q", head, 3)[0]
+        if opcode < 11 + frame_length:
+            struct.pack_into("<Q", head, 3, frame_length - removed)
+    head += NONE
+    head += pickled[end:]
+    return bytes(head)
+
 
 class Response(object):
+    ''' One page from the cache server.
+
+    The pickled requests.Response is only decoded when raw_response is
+    first used. headers decodes it without the body, and body is a
+    memoryview of the page bytes inside the pickle, so status, header
+    and size checks never copy or decode the page. content copies the
+    body into bytes once, for parsers that need bytes. '''
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._pickled = resp_dict.get("response")
+        self._raw = None
+        self._head = None
+        self._headers = None
+        self._content = None
+        self._span = None
+        # Seconds utils.download waited for the cache server, if any.
+        self.download_seconds = None
+        if isinstance(self._pickled, bytes):
+            self._span = find_body(self._pickled)
+
+    @classmethod
+    def from_parts(cls, url, status, headers, body):
+        ''' A Response with its raw_response already made from its parts,
+        for pages read back from utils.archive instead of the cache. '''
+        raw = requests.Response()
+        raw.url = url
+        raw.status_code = status
+        raw.headers = CaseInsensitiveDict(headers)
+        raw._content = bytes(body)
+        resp = cls({"url": url, "status": status})
+        resp._raw = raw
+        return resp
+
+    @property
+    def raw_response(self):
+        if self._raw is None and self._pickled is not None:
+            try:
+                self._raw = pickle.loads(self._pickled)
+            except (TypeError, ValueError, EOFError, pickle.UnpicklingError):
+                self._pickled = None
+                self._span = None
+        return self._raw
+
+    def _decode_head(self):
+        # The requests.Response without its body, or the whole one.
+        if self._head is None:
+            if self._raw is None and self._span is not None:
+                try:
+                    self._head = pickle.loads(
+                        without_body(self._pickled, self._span))
+                except Exception:
+                    # Not laid out as find_body thought, decode it all.
+                    self._span = None
+            if self._head is None:
+                self._head = self.raw_response
+        return self._head
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            head = self._decode_head()
+            self._headers = (
+                head.headers if head is not None and head.headers else {})
+        return self._headers
+
+    @property
+    def final_url(self):
+        ''' The url the page was served from, after redirects and as the
+        server spelled it, or url if the cache did not say. '''
+        head = self._decode_head()
+        return head.url if head is not None and head.url else self.url
+
+    @property
+    def body(self):
+        ''' The page bytes as a memoryview, empty if there are none. '''
+        if self._raw is None and self._span is not None:
+            _, start, end = self._span
+            return memoryview(self._pickled)[start:end]
+        raw = self.raw_response
+        if raw is None or not raw.content:
+            return memoryview(b"")
+        return memoryview(raw.content)
+
+    @property
+    def content(self):
+        ''' The page bytes, b"" if there are none. '''
+        if self._content is None:
+            if self._raw is not None:
+                self._content = self._raw.content or b""
+            else:
+                self._content = bytes(self.body)
+        return self._content
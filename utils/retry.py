@@ -0,0 +1,125 @@
+import json
+import time
+import random
+from threading import Lock
+
+from utils import get_logger
+
+# Cache server statuses of a failure worth trying again: it could not
+# download the page (601) or failed itself (602).
+CACHE_FAILURES = (601, 602)
+# Longest a host's breaker stays open.
+MAX_COOLDOWN = 3600.0
+
+
+def is_transient(resp):
+    ''' True if the download failed in a way a later attempt may not:
+    no response at all (timeout, connection error, bad payload), 429,
+    a 5xx other than 501, or a cache server failure. '''
+    if not resp:
+        return True
+    status = resp.status
+    return (status == 429 or (500 <= status < 600 and status != 501)
+            or status in CACHE_FAILURES)
+
+
+class RetryPolicy(object):
+    ''' When to fetch a url again after a transient failure, and a circuit
+    breaker per host.
+
+    A url failing for the nth time is retried after min(max_delay,
+    delay * 2**(n - 1)) seconds, times a random factor between 1/2 and 1
+    so the retries of a host spread out, until it failed max_retries + 1
+    times. A host whose fetches failed breaker_failures times in a row
+    is not fetched from for breaker_cooldown seconds, doubled every time
+    it opens again, up to MAX_COOLDOWN. The first fetch after that is a
+    probe: a failure opens it again right away, a response closes it.
+    After breaker_limit openings in a row the host counts as dead and its
+    urls are dropped. 0 disables the breaker or the limit. '''
+    def __init__(self, max_retries=3, delay=5.0, max_delay=300.0,
+                 breaker_failures=5, breaker_cooldown=60.0, breaker_limit=5):
+        self.logger = get_logger("RETRY")
+        self.lock = Lock()
+        self.max_retries = max_retries
+        self.delay = delay
+        self.max_delay = max_delay
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_limit = breaker_limit
+        # url -> failures so far, max_retries + 1 once given up on.
+        self.attempts = dict()
+        # host -> [failures in a row, openings in a row, open until].
+        self.hosts = dict()
+
+    def failed(self, url, host):
+        ''' Counts a transient failure of url. Returns the seconds to wait
+        before fetching it again, or None if it is out of retries. '''
+        with self.lock:
+            attempts = self.attempts[url] = self.attempts.get(url, 0) + 1
+            state = self.hosts.get(host)
+            if state is None:
+                state = self.hosts[host] = [0, 0, 0.0]
+            state[0] += 1
+            if self.breaker_failures and state[0] >= self.breaker_failures:
+                cooldown = min(
+                    MAX_COOLDOWN, self.breaker_cooldown * 2 ** state[1])
+                state[1] += 1
+                state[2] = time.time() + cooldown
+                self.logger.warning(
+                    f"Not fetching from {host} for {cooldown:.0f}s after "
+                    f"{state[0]} failures in a row.")
+            if attempts > self.max_retries:
+                return None
+        return (min(self.max_delay, self.delay * 2 ** (attempts - 1))
+                * random.uniform(0.5, 1.0))
+
+    def succeeded(self, url, host):
+        ''' Called for a url completed some other way than failing: the
+        host responded, unless url was given up on. '''
+        with self.lock:
+            if self.attempts.pop(url, 0) > self.max_retries:
+                return
+            self.hosts.pop(host, None)
+
+    def wait(self, host):
+        ''' Seconds until the breaker of host lets a fetch through. '''
+        state = self.hosts.get(host)
+        return max(0.0, state[2] - time.time()) if state else 0.0
+
+    def is_dead(self, host):
+        state = self.hosts.get(host)
+        return bool(self.breaker_limit and state
+                    and state[1] >= self.breaker_limit)
+
+    def open_breakers(self):
+        now = time.time()
+        with self.lock:
+            return sum(1 for state in self.hosts.values() if state[2] > now)
+
+    def write(self, path):
+        ''' Saves the failure counts of urls and hosts. '''
+        with self.lock:
+            rows = [
+                {"url": url, "attempts": attempts}
+                for url, attempts in self.attempts.items()]
+            rows += [
+                {"host": host, "failures": failures, "opened": opened,
+                 "until": until}
+                for host, (failures, opened, until) in self.hosts.items()]
+        with open(path, "w", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+
+    def read(self, path):
+        ''' Loads what write() saved. '''
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if "url" in row:
+                    self.attempts[row["url"]] = row["attempts"]
+                else:
+                    self.hosts[row["host"]] = [
+                        row["failures"], row["opened"], row["until"]]
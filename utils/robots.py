@@ -0,0 +1,321 @@
+import re
+import gzip
+import json
+import time
+from collections import deque
+from threading import Lock
+
+from lxml import etree
+
+from utils import get_logger
+
+# Rules kept per host: ALLOW wins over DISALLOW on a tie.
+ALLOW = True
+DISALLOW = False
+# Crawl-delay values above this are cut to it.
+MAX_CRAWL_DELAY = 60.0
+# Sitemaps fetched per host, counting nested ones, and urls taken from each.
+MAX_SITEMAPS = 100
+MAX_SITEMAP_URLS = 50000
+# Bytes of robots.txt read, per RFC 9309 at least 500 KiB.
+MAX_ROBOTS_BYTES = 512 * 1024
+LEAF = ""
+
+
+def url_path(url):
+    ''' The path and query of an absolute url, "/" if it has none. '''
+    rest = url.partition("://")[2]
+    slash = rest.find("/")
+    question = rest.find("?")
+    if slash < 0 or 0 <= question < slash:
+        return "/" + rest[question:] if question >= 0 else "/"
+    return rest[slash:].partition("#")[0]
+
+
+class RobotsRules(object):
+    ''' The robots.txt group that applies to one user agent, compiled so
+    allowed(path) costs O(len(path)): plain path prefixes go in a
+    character trie, the few rules with * or $ are regular expressions.
+    The longest matching rule decides, ALLOW on a tie (RFC 9309). '''
+    def __init__(self, rules=(), crawl_delay=None, sitemaps=()):
+        self.trie = dict()
+        self.patterns = list()
+        for path, allow in rules:
+            if "*" in path or path.endswith("$"):
+                pattern = ".*".join(map(re.escape, path.rstrip("$").split("*")))
+                if path.endswith("$"):
+                    pattern += "$"
+                self.patterns.append((re.compile(pattern), len(path), allow))
+                continue
+            node = self.trie
+            for char in path:
+                node = node.setdefault(char, dict())
+            # Allow wins when one path is both allowed and disallowed.
+            node[LEAF] = node.get(LEAF, DISALLOW) or allow
+        self.crawl_delay = crawl_delay
+        self.sitemaps = list(sitemaps)
+
+    def allowed(self, path):
+        best_length, best = -1, ALLOW
+        node = self.trie
+        if LEAF in node:
+            best_length, best = 0, node[LEAF]
+        for length, char in enumerate(path, 1):
+            node = node.get(char)
+            if node is None:
+                break
+            if LEAF in node:
+                best_length, best = length, node[LEAF]
+        for pattern, length, allow in self.patterns:
+            if (length > best_length or (length == best_length and allow)) \
+                    and pattern.match(path):
+                best_length, best = length, allow
+        return best
+
+    @classmethod
+    def parse(cls, text, user_agent):
+        ''' The rules of the group naming a token of user_agent, or of the
+        "*" group if none does. Sitemap lines apply to every group. '''
+        agent = set(re.split(r"[\s,]+", user_agent.lower()))
+        groups = {True: list(), False: list()}
+        delays = dict()
+        sitemaps = list()
+        members = list()
+        in_rules = False
+        for line in text.splitlines():
+            key, _, value = line.partition("#")[0].partition(":")
+            key, value = key.strip().lower(), value.strip()
+            if key == "user-agent":
+                if in_rules:
+                    members, in_rules = list(), False
+                token = value.lower()
+                if token == "*":
+                    members.append(False)
+                elif token and token.split("/")[0] in agent:
+                    members.append(True)
+            elif key in ("allow", "disallow"):
+                in_rules = True
+                if value:
+                    for specific in set(members):
+                        groups[specific].append((value, key == "allow"))
+            elif key == "crawl-delay":
+                in_rules = True
+                try:
+                    for specific in set(members):
+                        delays[specific] = min(float(value), MAX_CRAWL_DELAY)
+                except ValueError:
+                    pass
+            elif key == "sitemap" and value:
+                sitemaps.append(value)
+        specific = bool(groups[True]) or True in delays
+        return cls(groups[specific], delays.get(specific), sitemaps)
+
+
+ALLOW_ALL = RobotsRules()
+DISALLOW_ALL = RobotsRules([("/", DISALLOW)])
+
+
+class ViewReader(object):
+    ''' A read-only file over a memoryview, copying out only the chunks the
+    parser asks for, never the whole body. '''
+    def __init__(self, view):
+        self.view = view
+        self.offset = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self.view) - self.offset
+        chunk = bytes(self.view[self.offset:self.offset + size])
+        self.offset += len(chunk)
+        return chunk
+
+
+def iter_sitemap(body):
+    ''' Streams ("url" or "sitemap", loc) pairs out of a sitemap or sitemap
+    index, gzipped or not, one element at a time. '''
+    source = ViewReader(body)
+    if bytes(body[:2]) == b"\x1f\x8b":
+        source = gzip.GzipFile(fileobj=source)
+    parser = etree.iterparse(
+        source, events=("end",), tag=("{*}url", "{*}sitemap"),
+        resolve_entities=False, no_network=True, recover=True)
+    try:
+        for _, element in parser:
+            loc = element.findtext("{*}loc")
+            if loc and loc.strip():
+                yield element.tag.rpartition("}")[2], loc.strip()
+            # Free what was parsed so far.
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except (etree.XMLSyntaxError, OSError, EOFError):
+        return
+
+
+class HostPolicy(object):
+    ''' The robots.txt rules of one host, when they expire and the sitemaps
+    left to fetch. '''
+    def __init__(self, rules, expires, text=""):
+        self.rules = rules
+        self.expires = expires
+        self.text = text
+        self.sitemaps = deque()
+        self.requested = set()
+
+
+class RobotsPolicy(object):
+    ''' Per host robots.txt rules and sitemaps, fetched through the frontier
+    like pages so they wait for the politeness delay and go through the
+    cache server.
+
+    The frontier asks next_url(host, url) before handing out a url of a
+    host: it is the host's robots.txt when its rules are missing or
+    expired, then the host's sitemaps, then None. The worker hands the
+    responses to process(), which stores the rules or streams the urls
+    out of a sitemap. allowed() checks a url against the cached rules,
+    allowing it while the rules of its host are not known yet. '''
+    def __init__(self, user_agent="", expiry=86400.0, retry=600.0,
+                 obey=True, sitemaps=True):
+        self.logger = get_logger("ROBOTS")
+        self.lock = Lock()
+        self.user_agent = user_agent
+        self.expiry = expiry
+        self.retry = retry
+        self.obey = obey
+        self.use_sitemaps = sitemaps
+        self.hosts = dict()
+        # Robots and sitemap url handed out -> (host, "robots" or "sitemap").
+        self.fetching = dict()
+        self.blocked = 0
+
+    def allowed(self, url, host):
+        if not self.obey:
+            return True
+        policy = self.hosts.get(host)
+        if policy is None or policy.rules.allowed(url_path(url)):
+            return True
+        with self.lock:
+            self.blocked += 1
+        return False
+
+    def crawl_delay(self, host):
+        policy = self.hosts.get(host)
+        if policy is None or not self.obey:
+            return 0.0
+        return policy.rules.crawl_delay or 0.0
+
+    def handles(self, url):
+        return url in self.fetching
+
+    def has_sitemaps(self, host):
+        policy = self.hosts.get(host)
+        return policy is not None and bool(policy.sitemaps)
+
+    def next_url(self, host, url=None):
+        ''' The robots.txt or sitemap url to fetch before the urls of host,
+        or None. url is a queued url of host, for the scheme. '''
+        with self.lock:
+            policy = self.hosts.get(host)
+            if (self.obey or self.use_sitemaps) and url is not None and (
+                    policy is None or policy.expires <= time.time()):
+                scheme = url.partition("://")[0] or "https"
+                robots_url = f"{scheme}://{host}/robots.txt"
+                self.fetching[robots_url] = (host, "robots")
+                return robots_url
+            if policy is not None and policy.sitemaps:
+                sitemap = policy.sitemaps.popleft()
+                self.fetching[sitemap] = (host, "sitemap")
+                return sitemap
+        return None
+
+    def _add_sitemap(self, policy, host, url):
+        if (self.use_sitemaps and url not in policy.requested
+                and len(policy.requested) < MAX_SITEMAPS
+                and url.partition("://")[2].partition("/")[0].lower() == host):
+            policy.requested.add(url)
+            policy.sitemaps.append(url)
+
+    def process(self, url, resp):
+        ''' Takes in the response to a url from next_url. Returns the page
+        urls found in it, a sitemap's urls are read as they are used. '''
+        with self.lock:
+            host, kind = self.fetching.get(url, (None, None))
+        if kind == "robots":
+            self._set_rules(host, resp)
+            return iter(())
+        if kind == "sitemap" and resp and resp.status == 200:
+            return self._sitemap_urls(host, url, resp)
+        return iter(())
+
+    def _set_rules(self, host, resp):
+        now = time.time()
+        text = ""
+        if resp is None or resp.status >= 600:
+            # The cache server failed, try again later without rules.
+            rules, expires = ALLOW_ALL, now + self.retry
+        elif resp.status >= 500:
+            rules, expires = DISALLOW_ALL, now + self.retry
+        elif resp.status != 200:
+            rules, expires = ALLOW_ALL, now + self.expiry
+        else:
+            text = bytes(resp.body[:MAX_ROBOTS_BYTES]).decode(
+                "utf-8", "replace")
+            rules = RobotsRules.parse(text, self.user_agent)
+            expires = now + self.expiry
+        with self.lock:
+            old = self.hosts.get(host)
+            policy = self.hosts[host] = HostPolicy(rules, expires, text)
+            if old is not None:
+                policy.requested = old.requested
+            else:
+                for sitemap in rules.sitemaps:
+                    self._add_sitemap(policy, host, sitemap)
+        self.logger.info(
+            f"Robots rules of {host}: {len(rules.sitemaps)} sitemaps, "
+            f"crawl delay {rules.crawl_delay}.")
+
+    def _sitemap_urls(self, host, url, resp):
+        count = 0
+        for kind, loc in iter_sitemap(resp.body):
+            if kind == "sitemap":
+                with self.lock:
+                    self._add_sitemap(self.hosts[host], host, loc)
+            else:
+                yield loc
+                count += 1
+                if count >= MAX_SITEMAP_URLS:
+                    break
+        self.logger.info(f"Sitemap {url} listed {count} urls.")
+
+    def done(self, url):
+        ''' Called once the robots or sitemap url is released, processed or
+        not. A robots.txt that never arrived counts as a failed fetch. '''
+        with self.lock:
+            host, kind = self.fetching.pop(url, (None, None))
+            missing = kind == "robots" and host not in self.hosts
+        if missing:
+            self._set_rules(host, None)
+
+    def write(self, path):
+        ''' Saves the robots.txt of every host and its nested sitemaps. '''
+        with self.lock:
+            rows = [
+                {"host": host, "expires": policy.expires, "text": policy.text,
+                 "sitemaps": sorted(policy.requested)}
+                for host, policy in self.hosts.items()]
+        with open(path, "w", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+
+    def read(self, path):
+        ''' Loads what write() saved. Sitemaps are not fetched again. '''
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                rules = RobotsRules.parse(row["text"], self.user_agent)
+                policy = HostPolicy(rules, row["expires"], row["text"])
+                policy.requested.update(row["sitemaps"])
+                self.hosts[row["host"]] = policy
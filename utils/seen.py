@@ -0,0 +1,198 @@
+import math
+import struct
+from array import array
+from hashlib import blake2b
+from threading import Lock
+
+# magic, number of digests, table slots, bloom filter bytes
+HEADER = struct.Struct("<8sQQQ")
+MAGIC = b"SEENSET1"
+BLOOM_HASHES = 7
+BLOOM_BITS_PER_SLOT = 5
+
+
+def url_digest(url):
+    ''' 8 byte digest of a url as a nonzero int, 0 marks an empty slot. '''
+    return int.from_bytes(
+        blake2b(url.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+def urlhash_digest(urlhash):
+    ''' The same for a hex get_urlhash value, which is already a hash. '''
+    return int(urlhash[:16], 16) or 1
+
+
+class SeenSet(object):
+    ''' Set of urls stored as 8 byte digests in an open addressing table,
+    about 16 to 32 bytes per url instead of a full string.
+
+    A Bloom filter sits in front of the table, so most lookups of unseen
+    urls are answered without probing it. The table doubles when half
+    full. write() and from_buffer() keep it in the frontier checkpoint.
+
+    Two different urls share a digest with probability about n / 2**64,
+    which is what false_positive_rate reports together with the Bloom
+    filter rate. '''
+    def __init__(self, slots=1 << 16):
+        self.lock = Lock()
+        self._allocate(1 << max(4, (slots - 1).bit_length()))
+
+    def _allocate(self, slots):
+        self.count = 0
+        self.mask = slots - 1
+        self.table = array("Q", bytes(8 * slots))
+        self.bloom_bits = slots * BLOOM_BITS_PER_SLOT
+        self.bloom = bytearray(self.bloom_bits // 8)
+
+    def _bloom_positions(self, digest):
+        # Double hashing of the two halves of the digest.
+        bits = self.bloom_bits
+        position, step = (digest & 0xFFFFFFFF) % bits, ((digest >> 32) | 1) % bits
+        for _ in range(BLOOM_HASHES):
+            yield position
+            position = (position + step) % bits
+
+    def _bloom_maybe(self, digest):
+        bloom, bits = self.bloom, self.bloom_bits
+        position, step = (digest & 0xFFFFFFFF) % bits, ((digest >> 32) | 1) % bits
+        for _ in range(BLOOM_HASHES):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + step) % bits
+        return True
+
+    def _probe(self, digest):
+        # Slot holding digest, or the empty slot where it would go.
+        table, mask = self.table, self.mask
+        slot = digest & mask
+        while table[slot] and table[slot] != digest:
+            slot = (slot + 1) & mask
+        return slot
+
+    def _insert(self, digest, slot):
+        self.table[slot] = digest
+        for position in self._bloom_positions(digest):
+            self.bloom[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+        if 2 * self.count > self.mask + 1:
+            self._grow()
+
+    def _grow(self):
+        old = self.table
+        self._allocate(2 * (self.mask + 1))
+        for digest in old:
+            if digest:
+                self._insert(digest, self._probe(digest))
+
+    def contains_digest(self, digest):
+        with self.lock:
+            if not self._bloom_maybe(digest):
+                return False
+            return self.table[self._probe(digest)] == digest
+
+    def add_digest(self, digest):
+        ''' Adds digest, True if it was not in the set yet. '''
+        with self.lock:
+            if self._bloom_maybe(digest):
+                slot = self._probe(digest)
+                if self.table[slot] == digest:
+                    return False
+            else:
+                slot = self._probe(digest)
+            self._insert(digest, slot)
+            return True
+
+    def discard_digest(self, digest):
+        ''' Removes digest, True if it was in the set. Its Bloom filter bits
+        stay set, which only costs a probe of the table. '''
+        with self.lock:
+            if not self._bloom_maybe(digest):
+                return False
+            table, mask = self.table, self.mask
+            hole = self._probe(digest)
+            if table[hole] != digest:
+                return False
+            # Shift the rest of the run back over the hole, so probes for
+            # the digests after it do not stop at an empty slot.
+            slot = (hole + 1) & mask
+            while table[slot]:
+                home = table[slot] & mask
+                if (slot - home) & mask >= (slot - hole) & mask:
+                    table[hole] = table[slot]
+                    hole = slot
+                slot = (slot + 1) & mask
+            table[hole] = 0
+            self.count -= 1
+            return True
+
+    def copy(self):
+        with self.lock:
+            seen = SeenSet.__new__(SeenSet)
+            seen.lock = Lock()
+            seen.count, seen.mask = self.count, self.mask
+            seen.table = array("Q", self.table.tobytes())
+            seen.bloom = bytearray(self.bloom)
+            seen.bloom_bits = self.bloom_bits
+            return seen
+
+    def __contains__(self, url):
+        return self.contains_digest(url_digest(url))
+
+    def add(self, url):
+        return self.add_digest(url_digest(url))
+
+    def discard(self, url):
+        return self.discard_digest(url_digest(url))
+
+    def __len__(self):
+        return self.count
+
+    def write(self, file):
+        ''' Writes the set to an open binary file. '''
+        with self.lock:
+            file.write(HEADER.pack(
+                MAGIC, self.count, self.mask + 1, len(self.bloom)))
+            file.write(self.table.tobytes())
+            file.write(self.bloom)
+
+    @classmethod
+    def _from_view(cls, view):
+        # A set whose table and bloom filter are slices of view.
+        magic, count, slots, bloom_size = HEADER.unpack_from(view)
+        end = HEADER.size + 8 * slots + bloom_size
+        if magic != MAGIC or len(view) < end:
+            raise ValueError("Not a saved SeenSet.")
+        seen = cls.__new__(cls)
+        seen.lock = Lock()
+        seen.count = count
+        seen.mask = slots - 1
+        seen.table = view[HEADER.size:HEADER.size + 8 * slots].cast("Q")
+        seen.bloom = view[HEADER.size + 8 * slots:end]
+        seen.bloom_bits = 8 * bloom_size
+        return seen, end
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0):
+        ''' Copies a set written by write() out of buffer at offset.
+        Returns the set and the offset just past it. '''
+        seen, size = cls._from_view(memoryview(buffer)[offset:])
+        seen.table = array("Q", seen.table.tobytes())
+        seen.bloom = bytearray(seen.bloom)
+        return seen, offset + size
+
+    def restore(self, other):
+        ''' Takes over the contents of other, for sets shared by name. '''
+        with self.lock:
+            self.count, self.mask = other.count, other.mask
+            self.table, self.bloom = other.table, other.bloom
+            self.bloom_bits = other.bloom_bits
+
+    def bytes_per_url(self):
+        return (8 * (self.mask + 1) + len(self.bloom)) / max(1, self.count)
+
+    def false_positive_rate(self):
+        ''' Expected share of unseen urls the Bloom filter lets through, and
+        of unseen urls wrongly reported as seen. '''
+        bloom = (1 - math.exp(
+            -BLOOM_HASHES * self.count / self.bloom_bits)) ** BLOOM_HASHES
+        return bloom, self.count / 2 ** 64
@@ -0,0 +1,140 @@
+import os
+import sys
+from array import array
+from hashlib import blake2b
+from threading import Lock
+
+BITS = 64
+# BIT_TABLES[bit] maps every byte value to 1 if it has that bit set, else 0.
+BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256))
+              for bit in range(8)]
+
+
+# Pages share most of their vocabulary, so digests are memoized. The cache
+# is simply emptied when it reaches DIGEST_CACHE_SIZE words.
+DIGEST_CACHE_SIZE = 500000
+_digests = dict()
+
+
+def token_digest(token):
+    # Stable across processes, unlike the randomized built-in hash().
+    digest = _digests.get(token)
+    if digest is None:
+        if len(_digests) >= DIGEST_CACHE_SIZE:
+            _digests.clear()
+        digest = blake2b(token.encode("utf-8"), digest_size=8).digest()
+        _digests[token] = digest
+    return digest
+
+
+def token_hash(token):
+    return int.from_bytes(token_digest(token), "little")
+
+
+def simhash(tokens):
+    ''' 64 bit SimHash of a collection of tokens: bit i is set when more than
+    half of the token hashes have bit i set. Similar token sets give
+    signatures a small Hamming distance apart. '''
+    digests = b"".join(map(token_digest, tokens))
+    half = len(digests) // 8 / 2
+    signature = 0
+    for byte in range(8):
+        # The byte-th byte of every digest, i.e. bits 8*byte to 8*byte+7.
+        column = digests[byte::8]
+        for bit, table in enumerate(BIT_TABLES):
+            if column.translate(table).count(1) > half:
+                signature |= 1 << (8 * byte + bit)
+    return signature
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex(object):
+    ''' Set of SimHash signatures answering "is there a stored signature at
+    most threshold bits away?" without scanning every signature.
+
+    The 64 bits are split into threshold + 1 bands. Two signatures within
+    threshold bits of each other agree on at least one whole band, so a
+    lookup only compares against the signatures sharing one of its bands.
+
+    Signatures are appended to a file of raw 64 bit words, so the index
+    can be rebuilt after a restart. '''
+    def __init__(self, threshold=3, path=None):
+        self.lock = Lock()
+        self.file = None
+        self.signatures = array("Q")
+        self._set_threshold(threshold)
+        if path:
+            self.open(path, threshold)
+
+    def _set_threshold(self, threshold):
+        self.threshold = threshold
+        bands = threshold + 1
+        width = BITS // bands
+        self.bands = [
+            (start, (1 << (width if band < bands - 1 else BITS - start)) - 1)
+            for band, start in enumerate(range(0, width * bands, width))]
+        self.buckets = [dict() for _ in self.bands]
+        for signature in self.signatures:
+            self._index(signature)
+
+    def open(self, path, threshold=None):
+        ''' Loads the signatures stored at path, then appends new ones to it. '''
+        with self.lock:
+            self.close()
+            self.signatures = array("Q")
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    data = file.read()
+                # Drop a partly written last signature.
+                self.signatures.frombytes(
+                    data[:len(data) - len(data) % self.signatures.itemsize])
+            self._set_threshold(
+                self.threshold if threshold is None else threshold)
+            self.file = open(path, "ab")
+
+    def _index(self, signature):
+        for (start, mask), buckets in zip(self.bands, self.buckets):
+            buckets.setdefault((signature >> start) & mask, list()).append(
+                signature)
+
+    def find(self, signature):
+        ''' A stored signature close to signature, or None. '''
+        for (start, mask), buckets in zip(self.bands, self.buckets):
+            for candidate in buckets.get((signature >> start) & mask, ()):
+                if hamming(signature, candidate) <= self.threshold:
+                    return candidate
+        return None
+
+    def add(self, signature):
+        with self.lock:
+            self._add(signature)
+
+    def _add(self, signature):
+        self.signatures.append(signature)
+        self._index(signature)
+        if self.file:
+            self.file.write(signature.to_bytes(8, sys.byteorder))
+
+    def check_and_add(self, signature):
+        ''' True if a near duplicate is already stored, else stores it. '''
+        with self.lock:
+            if self.find(signature) is not None:
+                return True
+            self._add(signature)
+            return False
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def sync(self):
+        with self.lock:
+            if self.file:
+                self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -1,9 +1,182 @@
 import re
 from collections import Counter
+from itertools import chain
 import argparse
 
 # Part A: Word Frequencies from assignment 01
 
+# Runs of word characters. Same matches as r'\b\w+\b', as a maximal run of
+# \w always has a word boundary on both sides, without testing for them.
+TOKEN_PATTERN = re.compile(r'\w+')
+# Characters of text lowercased and tokenized at a time.
+CHUNK_SIZE = 1 << 20
+# Every ASCII character that is not \w made a space, so split() cuts the
+# text at them: for ASCII text, and for utf-8 bytes of other text, where
+# non-ASCII bytes are kept and a piece with any is decoded and split again
+# with TOKEN_PATTERN, as they may not be \w.
+ASCII_TABLE = dict(
+    (code, " ") for code in range(128)
+    if not (chr(code).isalnum() or code == 95))
+SPLIT_TABLE = bytes(
+    byte if byte >= 128 or chr(byte).isalnum() or byte == 95 else 32
+    for byte in range(256))
+
+
+def load_stopwords(stopword_file):
+    with open(stopword_file, "r", encoding="utf8") as file:
+        return frozenset(line.strip() for line in file if line.strip())
+
+
+def text_chunks(text, size=CHUNK_SIZE):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def file_chunks(file, size=CHUNK_SIZE):
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def cut_at_whitespace(chunks):
+    ''' Lowercases chunks after moving their cut to a space or newline, so
+    no token is split across two and lower() sees the same neighbours as
+    on the whole text (a final sigma depends on the next character). '''
+    carry = ""
+    for chunk in chunks:
+        chunk = carry + chunk
+        cut = max(chunk.rfind(" "), chunk.rfind("\n")) + 1
+        if not cut:
+            carry = chunk
+            continue
+        carry = chunk[cut:]
+        yield chunk[:cut].lower()
+    if carry:
+        yield carry.lower()
+
+
+def split_chunk(chunk):
+    ''' The pieces of a lowercased chunk: its tokens if it is ASCII, else
+    utf-8 bytes holding one token or, next to non-ASCII characters, maybe
+    several; see words(). Four times faster than TOKEN_PATTERN.findall(). '''
+    if chunk.isascii():
+        return chunk.translate(ASCII_TABLE).split()
+    return chunk.encode("utf-8", "surrogatepass").translate(SPLIT_TABLE).split()
+
+
+def words(piece):
+    ''' The tokens in a piece from split_chunk(). '''
+    if piece.__class__ is str:
+        return (piece,)
+    if piece.isascii():
+        return (piece.decode("ascii"),)
+    return TOKEN_PATTERN.findall(piece.decode("utf-8", "surrogatepass"))
+
+
+class Tokenizer(object):
+    ''' Counts the tokens of a text or a file chunk by chunk, so memory
+    stays bounded by chunk_size and the distinct tokens, never a list of
+    every token. The pieces of split_chunk() are counted as they are and,
+    if any chunk was not ASCII, only the distinct ones are turned into
+    words. Stopwords are removed
+    from the counts at the end, which is cheaper than testing each token
+    as they are the most frequent ones.
+
+    counts() of a text equals computeWordFrequencies(tokenize_from_text())
+    of it, including the order of the words. '''
+    def __init__(self, stopwords=frozenset(), chunk_size=CHUNK_SIZE):
+        self.stopwords = frozenset(stopwords)
+        self.chunk_size = chunk_size
+
+    def chunks(self, source):
+        ''' Lowercased chunks of a str or of a file opened in text mode. '''
+        if isinstance(source, str):
+            if len(source) <= self.chunk_size:
+                return (source.lower(),)
+            return cut_at_whitespace(text_chunks(source, self.chunk_size))
+        return cut_at_whitespace(file_chunks(source, self.chunk_size))
+
+    def counts(self, source, counts=None):
+        ''' Counter of the tokens of source, added to counts if given. '''
+        pieces = Counter()
+        ascii = self._split(self.chunks(source), pieces)
+        return self._words(pieces, ascii, counts)
+
+    @staticmethod
+    def _split(chunks, pieces):
+        # Adds the pieces of chunks to pieces, True if they are all words.
+        ascii = True
+        for chunk in chunks:
+            ascii = ascii and chunk.isascii()
+            pieces.update(split_chunk(chunk))
+        return ascii
+
+    def _words(self, pieces, ascii, counts=None):
+        # Counts of the pieces to counts of the words, in the same order:
+        # a word first appears in the first piece holding it.
+        counts = Counter() if counts is None else counts
+        if ascii:
+            counts.update(pieces)
+        else:
+            for piece, count in pieces.items():
+                for word in words(piece):
+                    counts[word] += count
+        for word in self.stopwords.intersection(counts):
+            del counts[word]
+        return counts
+
+    def tokens(self, source):
+        ''' Set of the distinct tokens of source. '''
+        pieces = set()
+        if self._split(self.chunks(source), pieces):
+            tokens = pieces
+        else:
+            tokens = set()
+            for piece in pieces:
+                tokens.update(words(piece))
+        return tokens - self.stopwords if self.stopwords else tokens
+
+    def count_many(self, texts):
+        ''' Counter of the tokens of many texts together. Short texts are
+        joined with newlines up to chunk_size, so they are lowercased and
+        split once per batch instead of once per text. '''
+        pieces = Counter()
+        ascii = True
+        batch = list()
+        size = 0
+        for text in texts:
+            if len(text) > self.chunk_size:
+                ascii = self._split(self.chunks(text), pieces) and ascii
+                continue
+            batch.append(text)
+            size += len(text) + 1
+            if size >= self.chunk_size:
+                ascii = self._split(["\n".join(batch).lower()], pieces) and ascii
+                batch, size = list(), 0
+        if batch:
+            ascii = self._split(["\n".join(batch).lower()], pieces) and ascii
+        return self._words(pieces, ascii)
+
+    def document_counts(self, texts):
+        ''' Counter of the number of texts each token appears in, as
+        WordStatistics keeps, with a single update for all of them. '''
+        counts = Counter()
+        sets = list()
+        for text in texts:
+            sets.append(self.tokens(text))
+            if len(sets) >= 1000:
+                counts.update(chain.from_iterable(sets))
+                sets = list()
+        counts.update(chain.from_iterable(sets))
+        return counts
+
+
+# Without stopwords, as tokenize() and tokenize_from_text() always did.
+TOKENIZER = Tokenizer()
+
+
 # Method 1: tokenize
 # Reads a text file and returns a list or a set of tokens (words)
 
@@ -11,31 +184,26 @@ def tokenize(text_file_path, rtype=""):
     tokens = []
     try:
         with open(text_file_path, 'r', encoding="utf8") as file:
+            if rtype == "set":
+                return TOKENIZER.tokens(file)
             text = file.read().lower()  # Convert the text to lowercase to ignore capitalization
             # Use regex to extract words (alphanumeric characters)
-            tokens = re.findall(r'\b\w+\b', text)
+            tokens = TOKEN_PATTERN.findall(text)
     except FileNotFoundError:
         print(f"The file at {text_file_path} was not found.")
-
-    if rtype == "set":
-        return set(tokens)
+        if rtype == "set":
+            return set()
 
     return tokens
 
 
 def tokenize_from_text(text_content, rtype=""):
-    tokens = []
-    try:
-        text = text_content.lower()  # Convert the text to lowercase to ignore capitalization
-        # Use regex to extract words (alphanumeric characters)
-        tokens = re.findall(r'\b\w+\b', text)
-    except FileNotFoundError:
-        print(f"The file at {text_file_path} was not found.")
-
     if rtype == "set":
-        return set(tokens)
+        # Chunk by chunk, without a list of every token
+        return TOKENIZER.tokens(text_content)
 
-    return tokens
+    # Lowercase to ignore capitalization, then extract the words
+    return TOKEN_PATTERN.findall(text_content.lower())
 
 
 # Method 2: computeWordFrequencies
@@ -43,6 +211,16 @@ def tokenize_from_text(text_content, rtype=""):
 def computeWordFrequencies(tokens):
     return dict(Counter(tokens))
 
+
+def word_frequencies(text_file_path, tokenizer=TOKENIZER):
+    # computeWordFrequencies(tokenize(path)), streaming the file
+    try:
+        with open(text_file_path, 'r', encoding="utf8") as file:
+            return dict(tokenizer.counts(file))
+    except FileNotFoundError:
+        print(f"The file at {text_file_path} was not found.")
+    return {}
+
 # Method 3: printnew
 # Prints the word frequencies ordered by decreasing frequency.
 
@@ -61,20 +239,23 @@ def printnew(frequencies):
 def main():
     # Specify the path to the text file (adjust the file path as needed)
     parser = argparse.ArgumentParser(
-        description="Compute word frequencies from a text file. if there is no argv for file, it uses sample.txt")
-    parser.add_argument("file_path", help="Path to the text file",
-                        nargs="?", default="sample.txt")
+        description="Compute word frequencies from text files. if there is no argv for file, it uses sample.txt")
+    parser.add_argument("file_paths", help="Paths to the text files, counted together",
+                        nargs="*", default=["sample.txt"])
+    parser.add_argument("--stopwords", help="File of words to leave out, one per line")
     args = parser.parse_args()
 
-    text_file_path = args.file_path  # Get the file path from command-line argument
-
-    # Tokenize the file content
-    tokens = tokenize(text_file_path)
+    tokenizer = TOKENIZER
+    if args.stopwords:
+        tokenizer = Tokenizer(load_stopwords(args.stopwords))
 
-    if tokens:  # Only proceed if the list of tokens is not empty
-        # Compute word frequencies
-        frequencies = computeWordFrequencies(tokens)
+    # Stream every file into one count
+    frequencies = dict()
+    for text_file_path in args.file_paths:  # Get the file paths from command-line arguments
+        for word, count in word_frequencies(text_file_path, tokenizer).items():
+            frequencies[word] = frequencies.get(word, 0) + count
 
+    if frequencies:  # Only proceed if there are tokens
         # Print the word frequencies
         printnew(frequencies)
         #print(len(frequencies))
@@ -0,0 +1,147 @@
+import re
+from threading import Lock
+from urllib.parse import urlsplit
+
+from utils import get_logger
+from utils.hosts import get_hostname
+
+# Reasons a pattern is throttled, as reported by TrapDetector.stats.
+BUDGET = "budget"
+LOW_VALUE = "low-value"
+REPEATS = "repeats"
+
+DIGITS = re.compile(r"\d+")
+# Session ids, hashes and other opaque tokens in a path segment.
+TOKEN = re.compile(r"^(?=.*\d)[0-9a-zA-Z_-]{16,}$")
+
+
+def url_pattern(url):
+    ''' Pattern signature of url: the host, the path with digit runs
+    replaced by # (so 2024-01-31 is #-#-#), opaque tokens by * and
+    consecutive repeats of a segment collapsed to "segment+", then the
+    sorted query keys without their values. Urls a crawler trap generates
+    share one pattern. '''
+    parts = urlsplit(url)
+    segments = list()
+    for segment in parts.path.split("/"):
+        if not segment:
+            continue
+        segment = "*" if TOKEN.match(segment) else DIGITS.sub("#", segment)
+        if segments and segments[-1].rstrip("+") == segment:
+            segments[-1] = segment + "+"
+        else:
+            segments.append(segment)
+    keys = sorted({
+        pair.partition("=")[0] for pair in parts.query.split("&") if pair})
+    pattern = f"{get_hostname(parts.netloc)}/{'/'.join(segments)}"
+    if keys:
+        pattern += "?" + "&".join(keys)
+    return pattern
+
+
+def repeated_segments(url):
+    ''' Most times one path segment occurs in url, repeats or not. '''
+    segments = [segment for segment in urlsplit(url).path.split("/") if segment]
+    if not segments:
+        return 0
+    counts = dict()
+    for segment in segments:
+        counts[segment] = counts.get(segment, 0) + 1
+    return max(counts.values())
+
+
+class TrapDetector(object):
+    ''' Counts discovered, fetched and low value urls per url_pattern and
+    throttles the patterns that behave like crawler traps:
+
+    budget:    more than budget urls of the pattern were discovered.
+    low-value: after samples fetches, at least low_value_ratio of them were
+               low value (not 200, unparsable, near duplicate or thin).
+    repeats:   a single url repeats one path segment more than max_repeats
+               times, like /a/b/a/b/a/b; only that url is rejected.
+
+    admit() and record() cost one url_pattern and one dict lookup. '''
+    def __init__(self, budget=1000, low_value_ratio=0.7, samples=20,
+                 max_repeats=3):
+        # Made on first use, so importing scraper writes no log file.
+        self.logger = None
+        self.lock = Lock()
+        self.configure(budget, low_value_ratio, samples, max_repeats)
+        # pattern -> [discovered, fetched, low value, rejected]
+        self.counts = dict()
+        # pattern -> reason, for the throttled ones
+        self.throttled = dict()
+        self.repeats = 0
+
+    def configure(self, budget, low_value_ratio, samples, max_repeats=3):
+        self.budget = budget
+        self.low_value_ratio = low_value_ratio
+        self.samples = samples
+        self.max_repeats = max_repeats
+
+    def _counts(self, pattern):
+        counts = self.counts.get(pattern)
+        if counts is None:
+            counts = self.counts[pattern] = [0, 0, 0, 0]
+        return counts
+
+    def _throttle(self, pattern, reason, counts):
+        self.throttled[pattern] = reason
+        if self.logger is None:
+            self.logger = get_logger("TRAPS")
+        self.logger.warning(
+            f"Throttling {pattern} ({reason}): {counts[0]} discovered, "
+            f"{counts[1]} fetched, {counts[2]} low value.")
+
+    def admit(self, url):
+        ''' True if url may be added to the frontier, counting it. '''
+        if self.max_repeats and repeated_segments(url) > self.max_repeats:
+            with self.lock:
+                self.repeats += 1
+            return False
+        pattern = url_pattern(url)
+        with self.lock:
+            counts = self._counts(pattern)
+            if pattern not in self.throttled and counts[0] >= self.budget:
+                self._throttle(pattern, BUDGET, counts)
+            if pattern in self.throttled:
+                counts[3] += 1
+                return False
+            counts[0] += 1
+            return True
+
+    def record(self, url, low_value):
+        ''' Feedback from scraping url: whether the page was low value. '''
+        pattern = url_pattern(url)
+        with self.lock:
+            counts = self._counts(pattern)
+            counts[1] += 1
+            counts[2] += bool(low_value)
+            if (pattern not in self.throttled and counts[1] >= self.samples
+                    and counts[2] >= self.low_value_ratio * counts[1]):
+                self._throttle(pattern, LOW_VALUE, counts)
+
+    def is_wasteful(self, url):
+        ''' True if url belongs to a pattern throttled for low value, so an
+        already queued url of it is not worth fetching either. '''
+        with self.lock:
+            return self.throttled.get(url_pattern(url)) == LOW_VALUE
+
+    def stats(self):
+        ''' (pattern, reason, discovered, fetched, low value, rejected) for
+        every throttled pattern, most rejected first. '''
+        with self.lock:
+            rows = [
+                (pattern, reason, *self.counts[pattern])
+                for pattern, reason in self.throttled.items()]
+        return sorted(rows, key=lambda row: row[5], reverse=True)
+
+    def write_stats(self, path):
+        rows = self.stats()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(
+                "pattern\treason\tdiscovered\tfetched\tlow_value\trejected\n")
+            file.write(
+                f"*\t{REPEATS}\t\t\t\t{self.repeats}\n")
+            for row in rows:
+                file.write("\t".join(map(str, row)) + "\n")
@@ -0,0 +1,67 @@
+import re
+from urllib.parse import urlparse
+
+from utils.hosts import HostClassifier
+
+# Reasons returned by UrlFilter.check for a rejected url.
+MALFORMED = "malformed"
+SCHEME = "scheme"
+QUERY_KEY = "query-key"
+PATH_SEGMENT = "path-segment"
+BLOCKED_EXTENSION = "blocked-extension"
+DOMAIN = "domain"
+TODAY_PATH = "today-path"
+FILE_EXTENSION = "file-extension"
+
+
+class UrlFilter(object):
+    ''' Decides whether a url should be crawled with one urlparse call and a
+    handful of precompiled lookups, in the same order as the original
+    is_valid checks.
+
+    check(url) returns None for an accepted url, or one of the reason
+    constants above for a rejected one.
+
+    query_keys: keys rejected anywhere as "?key=" or "&key=".
+    path_segments: regex fragments rejected as a whole "/segment/".
+    blocked_extensions: rejected as the suffix of the whole url.
+    allowed_domains: hosts accepted together with all their subdomains.
+    allowed_paths: {host: path prefix} for hosts accepted only below a path.
+    file_extensions: rejected as the suffix of the url path.
+
+    The domain decisions are cached per netloc in self.hosts. '''
+    def __init__(self, schemes, query_keys, path_segments, blocked_extensions,
+                 allowed_domains, allowed_paths, file_extensions):
+        self.schemes = frozenset(schemes)
+        self.query_key_re = re.compile(
+            r"[?&](?:" + "|".join(query_keys) + r")=", re.IGNORECASE)
+        self.path_segment_re = re.compile(
+            r"/(?:" + "|".join(path_segments) + r")/", re.IGNORECASE)
+        self.blocked_extensions = frozenset(blocked_extensions)
+        self.hosts = HostClassifier(allowed_domains, allowed_paths)
+        self.file_extensions = frozenset(file_extensions)
+
+    def check(self, url):
+        try:
+            parsed = urlparse(url)
+        except ValueError:
+            return MALFORMED
+        if parsed.scheme not in self.schemes:
+            return SCHEME
+        if self.query_key_re.search(url):
+            return QUERY_KEY
+        if self.path_segment_re.search(url):
+            return PATH_SEGMENT
+        if url.rpartition(".")[2].lower() in self.blocked_extensions:
+            return BLOCKED_EXTENSION
+        if not parsed.netloc:
+            return DOMAIN
+        host = self.hosts.classify(parsed.netloc)
+        if host.path_prefix is not None:
+            if not parsed.path.startswith(host.path_prefix):
+                return TODAY_PATH
+        elif not host.allowed:
+            return DOMAIN
+        if parsed.path.rpartition(".")[2].lower() in self.file_extensions:
+            return FILE_EXTENSION
+        return None
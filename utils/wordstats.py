@@ -0,0 +1,119 @@
+import os
+import heapq
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from threading import Lock
+
+from utils.tokenize import load_stopwords
+
+
+def read_run(path):
+    ''' Yields (word, count) from a run file, in the order it was written. '''
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            word, _, count = line.rstrip("\n").rpartition("\t")
+            yield word, int(count)
+
+
+def merge_runs(runs):
+    ''' Merges word-sorted (word, count) streams, summing equal words. '''
+    for word, group in groupby(heapq.merge(*runs), key=itemgetter(0)):
+        yield word, sum(count for _, count in group)
+
+
+class WordStatistics(object):
+    ''' Number of pages each word appears in, stopwords excluded.
+
+    Counts are aggregated in memory. Every flush_every pages they are written
+    to a word-sorted run file in directory and the memory is freed. close()
+    merges the runs into the single file words.tsv, which later crawls keep
+    adding to. '''
+    MERGED = "words.tsv"
+
+    def __init__(self, directory, stopword_file, flush_every=1000):
+        self.directory = directory
+        self.stopwords = load_stopwords(stopword_file)
+        self.flush_every = flush_every
+        self.counts = Counter()
+        self.pages = 0
+        self.runs = 0
+        self.lock = Lock()
+
+    def add(self, tokens):
+        ''' Counts one page given the set of its tokens. '''
+        with self.lock:
+            self.counts.update(
+                token for token in tokens if token not in self.stopwords)
+            self.pages += 1
+            if self.pages % self.flush_every == 0:
+                self._flush()
+
+    def _run_files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith("words.run"))
+
+    def flush(self):
+        ''' Writes the counts in memory to a new run file, leaving the
+        merge to a later close(), possibly by another process. '''
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.counts:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            path = os.path.join(self.directory, f"words.run{self.runs:06d}")
+            self.runs += 1
+            try:
+                # Exclusive, as crawl processes share the directory.
+                file = open(path, "x", encoding="utf-8")
+                break
+            except FileExistsError:
+                continue
+        with file:
+            file.writelines(
+                f"{word}\t{count}\n" for word, count in sorted(self.counts.items()))
+        self.counts.clear()
+
+    def _streams(self):
+        # Every sorted source of counts: merged file, runs and memory.
+        streams = [read_run(path) for path in self._run_files()]
+        merged = os.path.join(self.directory, self.MERGED)
+        if os.path.exists(merged):
+            streams.append(read_run(merged))
+        streams.append(iter(sorted(self.counts.items())))
+        return streams
+
+    def items(self):
+        ''' Yields (word, count) in word order over everything counted. '''
+        with self.lock:
+            streams = self._streams()
+        return merge_runs(streams)
+
+    def top(self, k=50):
+        ''' The k most frequent words as (word, count), most frequent first. '''
+        return heapq.nlargest(k, self.items(), key=itemgetter(1))
+
+    def close(self):
+        ''' Folds the runs and the counts in memory into words.tsv. '''
+        with self.lock:
+            runs = self._run_files()
+            streams = self._streams()
+            if not runs and not self.counts:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            merged = os.path.join(self.directory, self.MERGED)
+            tmp = f"{merged}.tmp"
+            with open(tmp, "w", encoding="utf-8") as file:
+                file.writelines(
+                    f"{word}\t{count}\n" for word, count in merge_runs(streams))
+            os.replace(tmp, merged)
+            for path in runs:
+                os.remove(path)
+            self.counts.clear()